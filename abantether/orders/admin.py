@@ -1,6 +1,12 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
 
-from abantether.orders.models import Order, Wallet
+from abantether.orders.connections import get_redis_client
+from abantether.orders.models import (
+    Order, ReconciliationDiscrepancy, ReconciliationRun, SettlementBatch, Wallet, WalletBalanceSnapshot, WalletLedgerEntry,
+)
+from abantether.orders.services import WalletBalanceCache
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -8,4 +14,42 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
-    pass
+    def save_model(self, request, obj, form, change):
+        if not (change and 'balance' in form.changed_data):
+            return super().save_model(request, obj, form, change)
+        # The form's initial balance was read when the wallet was loaded: apply
+        # the edit as a delta, so debits made since are kept, and record that delta
+        delta = obj.balance - form.initial['balance']
+        with transaction.atomic():
+            Wallet.objects.filter(pk=obj.pk).update(balance=F('balance') + delta)
+            WalletLedgerEntry.objects.create(user_id=obj.user_id, kind=WalletLedgerEntry.CREDIT, amount=delta)
+            other_fields = [name for name in form.changed_data if name != 'balance']
+            if other_fields:
+                obj.save(update_fields=other_fields)
+            obj.refresh_from_db(fields=['balance'])
+        transaction.on_commit(
+            lambda: WalletBalanceCache(get_redis_client()).invalidate(obj.user_id), robust=True
+        )
+
+@admin.register(WalletLedgerEntry)
+class WalletLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'kind', 'amount', 'order', 'created_at']
+    list_filter = ['kind']
+
+@admin.register(WalletBalanceSnapshot)
+class WalletBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['user', 'balance', 'last_entry_id', 'created_at']
+
+@admin.register(SettlementBatch)
+class SettlementBatchAdmin(admin.ModelAdmin):
+    list_display = ['coin_name', 'amount', 'value', 'order_count', 'status', 'created_at', 'settled_at']
+    list_filter = ['coin_name', 'status']
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'incremental', 'users_checked', 'discrepancy_count']
+
+@admin.register(ReconciliationDiscrepancy)
+class ReconciliationDiscrepancyAdmin(admin.ModelAdmin):
+    list_display = ['run', 'user', 'kind', 'expected', 'actual']
+    list_filter = ['kind']
@@ -0,0 +1,92 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+from functools import total_ordering
+from typing import Optional
+
+
+@total_ordering
+class FixedPoint:
+    """An exact decimal quantity stored as an integer number of base units.
+
+    Arithmetic between values of the same type is plain integer arithmetic.
+    Conversions from Decimal are exact unless a rounding mode is given, and
+    conversions back to Decimal are always exact, so values round-trip
+    through the matching model field without loss.
+    """
+    DECIMAL_PLACES = 0
+    __slots__ = ('units',)
+
+    def __init__(self, units: int = 0):
+        self.units = int(units)
+
+    @classmethod
+    def scale(cls) -> int:
+        return 10 ** cls.DECIMAL_PLACES
+
+    @classmethod
+    def from_decimal(cls, value, rounding: Optional[str] = None) -> 'FixedPoint':
+        """Convert a Decimal (or int/str); raise ValueError if it would need rounding and none is given"""
+        scaled = Decimal(value).scaleb(cls.DECIMAL_PLACES)
+        units = scaled.to_integral_value(rounding=rounding or ROUND_HALF_EVEN)
+        if rounding is None and units != scaled:
+            raise ValueError(f"{value} has more than {cls.DECIMAL_PLACES} decimal places")
+        return cls(int(units))
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.units).scaleb(-self.DECIMAL_PLACES)
+
+    def _check(self, other) -> 'FixedPoint':
+        if type(other) is not type(self):
+            raise TypeError(f"Cannot combine {type(self).__name__} with {type(other).__name__}")
+        return other
+
+    def __add__(self, other):
+        return type(self)(self.units + self._check(other).units)
+
+    def __radd__(self, other):
+        # Lets sum() start from 0
+        if other == 0:
+            return self
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        return type(self)(self.units - self._check(other).units)
+
+    def __neg__(self):
+        return type(self)(-self.units)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.units == other.units
+
+    def __lt__(self, other):
+        return self.units < self._check(other).units
+
+    def __hash__(self):
+        return hash((type(self), self.units))
+
+    def __bool__(self):
+        return bool(self.units)
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self}')"
+
+
+class Amount(FixedPoint):
+    """Coin quantity, matching Order.amount (8 decimal places)"""
+    DECIMAL_PLACES = 8
+    __slots__ = ()
+
+    def value_at(self, price: Decimal, rounding: str = ROUND_HALF_EVEN) -> 'Money':
+        """Fiat value of this amount, rounded to Money's 2 decimal places.
+
+        Half-even matches how Wallet.balance rounded values on save().
+        """
+        return Money.from_decimal(self.to_decimal() * price, rounding=rounding)
+
+
+class Money(FixedPoint):
+    """Fiat value, matching Wallet.balance (2 decimal places)"""
+    DECIMAL_PLACES = 2
+    __slots__ = ()
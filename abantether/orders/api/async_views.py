@@ -0,0 +1,223 @@
+import csv
+import json
+import re
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from ..models import Order, Wallet
+from ..services import AsyncOrderService
+from ..updates import order_events
+from .idempotency import AsyncIdempotencyCache
+from .pagination import OrderCursorPagination
+from .serializers import OrderCreateSerializer, OrderSerializer
+
+
+def json_response(data, status=status.HTTP_200_OK) -> JsonResponse:
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+class AsyncAPIView(View):
+    """Async Django view that authenticates like the DRF API views.
+
+    DRF views are sync only, so these views answer with plain JsonResponses
+    in the same formats as OrderViewSet. Async views cannot run inside
+    ATOMIC_REQUESTS; the service opens its own transaction instead.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # CSRF is enforced by DRF's SessionAuthentication, as for the DRF views
+        return transaction.non_atomic_requests(csrf_exempt(super().as_view(**initkwargs)))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            self.user = await sync_to_async(self._authenticate)(request)
+        except exceptions.APIException as e:
+            return json_response({'detail': e.detail}, status=e.status_code)
+        return await super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def _authenticate(request):
+        user = Request(
+            request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        ).user
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        return user
+
+
+class AsyncOrderListView(AsyncAPIView):
+    async def get(self, request, *args, **kwargs):
+        return json_response(await sync_to_async(self._page)(request))
+
+    def _page(self, request) -> dict:
+        paginator = OrderCursorPagination()
+        orders = paginator.paginate_queryset(Order.objects.filter(user=self.user), Request(request))
+        return paginator.get_paginated_response(OrderSerializer(orders, many=True).data).data
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return json_response({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+        order_service = AsyncOrderService()
+        return await AsyncIdempotencyCache(order_service.redis_client).run(
+            request, data, lambda: self._create(data, order_service)
+        )
+
+    async def _create(self, data, order_service: AsyncOrderService) -> JsonResponse:
+        serializer = OrderCreateSerializer(data=data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            order = await order_service.create_order(
+                user=self.user,
+                coin_name=serializer.validated_data['coin_name'],
+                amount=serializer.validated_data['amount'],
+            )
+        except (ValidationError, Wallet.DoesNotExist) as e:
+            return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return json_response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncOrderDetailView(AsyncAPIView):
+    async def get(self, request, pk, *args, **kwargs):
+        try:
+            order = await Order.objects.filter(user=self.user).aget(pk=pk)
+        except Order.DoesNotExist:
+            return json_response({'detail': 'No Order matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        return json_response(OrderSerializer(order).data)
+
+
+class AsyncOrderEventsView(AsyncAPIView):
+    """Server-Sent Events stream of the user's order status changes.
+
+    Replaces polling the order detail endpoint: one event is sent whenever
+    settlement completes or fails one of the user's orders. Browsers resume
+    from the Last-Event-ID header on reconnect; other clients can pass
+    ?last_event_id= instead.
+    """
+    EVENT_ID = re.compile(r'\d+-\d+')
+
+    async def get(self, request, *args, **kwargs):
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id and not self.EVENT_ID.fullmatch(last_event_id):
+            return json_response({'detail': 'Invalid Last-Event-ID'}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(
+            order_events(self.user.pk, last_event_id), content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class _Echo:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+class AsyncOrderExportView(AsyncAPIView):
+    """The user's whole order history as CSV or JSON lines (?format=csv|jsonl).
+
+    Rows are read from a values() query CHUNK_SIZE at a time and written out
+    as each chunk arrives, without serializers, so memory stays flat however
+    many orders the user has. The rows are read asynchronously under ASGI and
+    with a sync iterator under WSGI. ?created_after= (inclusive) and
+    ?created_before= (exclusive) take ISO dates or datetimes.
+    """
+    FIELDS = ['id', 'coin_name', 'amount', 'status', 'created_at', 'updated_at']
+    CHUNK_SIZE = 2000
+    CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+    # Decimals as exact strings and datetimes as in the API
+    _encoder = DjangoJSONEncoder()
+
+    async def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.CONTENT_TYPES:
+            return json_response(
+                {'detail': f"format must be one of {', '.join(self.CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        orders = Order.objects.filter(user=self.user)
+        for param, lookup in [('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')]:
+            if param in request.GET:
+                value = self._parse_time(request.GET[param])
+                if value is None:
+                    return json_response(
+                        {'detail': f"{param} must be an ISO date or datetime"}, status=status.HTTP_400_BAD_REQUEST,
+                    )
+                orders = orders.filter(**{lookup: value})
+
+        rows = orders.values(*self.FIELDS)
+        if isinstance(request, ASGIRequest):
+            content = self._astream(rows.aiterator(chunk_size=self.CHUNK_SIZE), export_format)
+        else:
+            # WSGI would buffer an async iterator whole; it reads a sync one as it goes
+            content = self._stream(rows.iterator(chunk_size=self.CHUNK_SIZE), export_format)
+        response = StreamingHttpResponse(content, content_type=self.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
+    @staticmethod
+    def _parse_time(value: str):
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None and parse_date(value) is not None:
+                parsed = datetime.combine(parse_date(value), time.min)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _format(self, writer, export_format: str, row: dict) -> str:
+        if export_format == 'jsonl':
+            return json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+        return writer.writerow([
+            self._encoder.default(value) if isinstance(value, datetime) else value for value in row.values()
+        ])
+
+    def _stream(self, rows, export_format: str):
+        writer = csv.writer(_Echo())
+        if export_format == 'csv':
+            yield writer.writerow(self.FIELDS)
+        # One write per fetched chunk rather than per row
+        buffer = []
+        for row in rows:
+            buffer.append(self._format(writer, export_format, row))
+            if len(buffer) >= self.CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+    async def _astream(self, rows, export_format: str):
+        writer = csv.writer(_Echo())
+        if export_format == 'csv':
+            yield writer.writerow(self.FIELDS)
+        buffer = []
+        async for row in rows:
+            buffer.append(self._format(writer, export_format, row))
+            if len(buffer) >= self.CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
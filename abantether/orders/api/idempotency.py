@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyCache:
+    """Replay cache for POST requests that carry an Idempotency-Key header.
+
+    The first request with a key claims it in Redis and runs; its response
+    is kept for IDEMPOTENCY_KEY_TTL seconds and returned as is to every
+    retry, without running the view again. A retry that arrives while the
+    first request is still running waits for its response. Keys are scoped
+    per user, and reusing a key for a different request is rejected.
+    """
+    HEADER = 'Idempotency-Key'
+    KEY = 'idempotency:{}:{}'
+    MAX_KEY_LENGTH = 255
+    # How long a claimed key blocks retries if its request never finishes
+    LOCK_TTL = 30.0
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def run(self, request, handler: Callable[[], Response]) -> Response:
+        key = request.headers.get(self.HEADER)
+        if key is None:
+            return handler()
+        if not self._valid_key(key):
+            return Response(**self._invalid_key())
+
+        cache_key = self.KEY.format(request.user.pk, key)
+        fingerprint = self._fingerprint(request, request.data)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            if self._claim(cache_key, fingerprint):
+                return self._run_and_store(cache_key, fingerprint, handler)
+
+            replay = self._replay(self.redis_client.get(cache_key), fingerprint)
+            if replay:
+                return Response(**replay)
+
+            if time.monotonic() >= deadline:
+                return Response(**self._in_progress())
+            time.sleep(self.POLL_INTERVAL)
+
+    def _valid_key(self, key: str) -> bool:
+        return 0 < len(key) <= self.MAX_KEY_LENGTH
+
+    # The responses below are returned as keyword arguments of a Response
+
+    def _invalid_key(self) -> dict:
+        return {
+            'data': {'error': f"{self.HEADER} must be 1 to {self.MAX_KEY_LENGTH} characters"},
+            'status': status.HTTP_400_BAD_REQUEST,
+        }
+
+    def _in_progress(self) -> dict:
+        return {
+            'data': {'error': f"A request with this {self.HEADER} is still in progress"},
+            'status': status.HTTP_409_CONFLICT,
+        }
+
+    def _replay(self, stored: Optional[str], fingerprint: str) -> Optional[dict]:
+        """Response to a retry given the stored entry of its key, if the retry is to be answered now"""
+        if not stored:
+            return None
+        stored = json.loads(stored)
+        if stored['fingerprint'] != fingerprint:
+            return {
+                'data': {'error': f"{self.HEADER} was already used for a different request"},
+                'status': status.HTTP_422_UNPROCESSABLE_ENTITY,
+            }
+        if 'status' in stored:
+            return {'data': stored['data'], 'status': stored['status'], 'headers': {'Idempotent-Replayed': 'true'}}
+        return None
+
+    @staticmethod
+    def _fingerprint(request, data) -> str:
+        body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+        return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+    def _claim(self, cache_key: str, fingerprint: str) -> bool:
+        return bool(self.redis_client.set(
+            cache_key, json.dumps({'fingerprint': fingerprint}),
+            nx=True, px=int(self.LOCK_TTL * 1000),
+        ))
+
+    def _run_and_store(self, cache_key: str, fingerprint: str, handler: Callable[[], Response]) -> Response:
+        try:
+            response = handler()
+        except BaseException:
+            # Let a retry run the request again
+            self.redis_client.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            self.redis_client.delete(cache_key)
+            return response
+        stored = json.dumps(
+            {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+            cls=JSONEncoder,
+        )
+        # Requests are atomic, so only replay a response once its writes are
+        # committed; after a rollback the claim simply expires
+        transaction.on_commit(
+            lambda: self.redis_client.set(cache_key, stored, px=int(settings.IDEMPOTENCY_KEY_TTL * 1000)),
+            robust=True,
+        )
+        return response
+
+
+class AsyncIdempotencyCache(IdempotencyCache):
+    """IdempotencyCache for the async views, on a redis.asyncio client.
+
+    Async views run outside ATOMIC_REQUESTS, so the handler has committed
+    its writes when it returns and its response is stored right away.
+    """
+
+    async def run(self, request, data, handler: Callable[[], Awaitable[JsonResponse]]) -> JsonResponse:
+        key = request.headers.get(self.HEADER)
+        if key is None:
+            return await handler()
+        if not self._valid_key(key):
+            return self._response(**self._invalid_key())
+
+        cache_key = self.KEY.format(request.user.pk, key)
+        fingerprint = self._fingerprint(request, data)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            if await self._claim(cache_key, fingerprint):
+                return await self._run_and_store(cache_key, fingerprint, handler)
+
+            replay = self._replay(await self.redis_client.get(cache_key), fingerprint)
+            if replay:
+                return self._response(**replay)
+
+            if time.monotonic() >= deadline:
+                return self._response(**self._in_progress())
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    @staticmethod
+    def _response(data, status: int, headers: dict = None) -> JsonResponse:
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False, headers=headers)
+
+    async def _claim(self, cache_key: str, fingerprint: str) -> bool:
+        return bool(await self.redis_client.set(
+            cache_key, json.dumps({'fingerprint': fingerprint}),
+            nx=True, px=int(self.LOCK_TTL * 1000),
+        ))
+
+    async def _run_and_store(self, cache_key: str, fingerprint: str, handler) -> JsonResponse:
+        try:
+            response = await handler()
+        except BaseException:
+            await self.redis_client.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            await self.redis_client.delete(cache_key)
+            return response
+        stored = json.dumps({
+            'fingerprint': fingerprint, 'status': response.status_code, 'data': json.loads(response.content),
+        })
+        try:
+            await self.redis_client.set(cache_key, stored, px=int(settings.IDEMPOTENCY_KEY_TTL * 1000))
+        except Exception:
+            # The writes are committed; a retry after the claim expires runs again
+            logger.exception("Storing the response for %s failed", cache_key)
+        return response
@@ -1,30 +1,42 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
 
-from ..models import Order
+from ..connections import redis_clients
+from ..models import Order, Wallet
 from ..services import OrderService
+from .idempotency import IdempotencyCache
+from .pagination import OrderCursorPagination
 from .serializers import OrderCreateSerializer, OrderSerializer
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+    MAX_BULK_ORDERS = 100
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
 
     def get_serializer_class(self):
-        if self.action == 'create':
+        if self.action in ('create', 'bulk'):
             return OrderCreateSerializer
         return OrderSerializer
 
     def create(self, request, *args, **kwargs):
+        order_service = OrderService()
+        return IdempotencyCache(order_service.redis_client).run(
+            request, lambda: self._create(request, order_service)
+        )
+
+    def _create(self, request, order_service):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         try:
-            order_service = OrderService()
             order = order_service.create_order(
                 user=request.user,
                 coin_name=serializer.validated_data['coin_name'],
@@ -39,3 +51,56 @@ class OrderViewSet(viewsets.ModelViewSet):
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        order_service = OrderService()
+        return IdempotencyCache(order_service.redis_client).run(
+            request, lambda: self._bulk(request, order_service)
+        )
+
+    def _bulk(self, request, order_service):
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.MAX_BULK_ORDERS)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            results = order_service.create_orders(
+                user=request.user,
+                items=serializer.validated_data,
+            )
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = [
+            {'index': result['index'], 'status': 'created', 'order': OrderSerializer(result['order']).data}
+            if 'order' in result else
+            {'index': result['index'], 'status': 'rejected', 'error': result['error']}
+            for result in results
+        ]
+        created = any('order' in result for result in results)
+        return Response(
+            data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
+
+class RedisPoolStatsView(APIView):
+    """Connection pool usage of the worker process that serves the request"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(redis_clients.pool_stats())
+
+
+class WalletView(APIView):
+    """Balance of the user's wallet and the value reserved by their pending orders"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            return Response(OrderService().wallet_cache.get(request.user))
+        except Wallet.DoesNotExist:
+            return Response({'detail': 'No Wallet matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,189 @@
+"""Archival of settled orders to gzip JSONL files, see the archive_orders command.
+
+Each cutoff date gets its own directory holding numbered part files and a
+manifest.json listing every part with its row count, id range and sha256.
+A part is written to a temporary file, renamed into place and recorded in
+the manifest before any of its orders are deleted, and the deletes happen
+in short transactions of chunk_size orders. Only the ids read back from the
+part file are deleted, so an order that settled after its part was written
+stays for a later run. A run that crashes anywhere in between is resumed by
+running it again with the same cutoff, which unfinished_cutoff finds:
+unfinished deletes are redone and streaming continues after the last
+recorded part.
+
+Orders are deleted without touching the append-only ledger, whose entries
+keep their order ids. Failed orders stay until a refund references them,
+so reconciliation can still report their unrefunded debits.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, time as dt_time, timezone
+from itertools import islice
+from typing import Callable, Iterator, List, Optional
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from .models import Order, WalletLedgerEntry
+
+ARCHIVED_STATUSES = [Order.COMPLETED, Order.FAILED]
+
+
+class OrderArchiver:
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, output_dir: str, cutoff: date, chunk_size: int = 2000, file_rows: int = 100000,
+                 log: Callable[[str], None] = None):
+        self.cutoff = cutoff
+        self.directory = os.path.join(output_dir, f'orders-before-{cutoff.isoformat()}')
+        self.chunk_size = chunk_size
+        self.file_rows = file_rows
+        self.log = log or (lambda message: None)
+        self.fields = [field.attname for field in Order._meta.concrete_fields]
+
+    def queryset(self):
+        refunded = WalletLedgerEntry.objects.filter(order_id=OuterRef('id'), kind=WalletLedgerEntry.REFUND)
+        return Order.objects.filter(
+            Q(status=Order.COMPLETED) | Q(Exists(refunded), status=Order.FAILED),
+            created_at__lt=datetime.combine(self.cutoff, dt_time.min, tzinfo=timezone.utc),
+        ).order_by('id')
+
+    def run(self) -> dict:
+        """Archive and delete every settled order created before the cutoff; returns the manifest"""
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = self._load_manifest()
+        started = time.monotonic()
+        archived = 0
+
+        # Finish the deletes of a part written by a crashed run
+        for part in manifest['parts']:
+            if not part['deleted']:
+                self._delete_part(manifest, part)
+
+        while True:
+            last_id = manifest['parts'][-1]['last_id'] if manifest['parts'] else 0
+            part = self._write_part(len(manifest['parts']) + 1, last_id)
+            if part is None:
+                break
+            manifest['parts'].append(part)
+            self._save_manifest(manifest)
+            self._delete_part(manifest, part)
+            archived += part['rows']
+            self.log(
+                f"{part['name']}: {part['rows']} orders, "
+                f"{archived / max(time.monotonic() - started, 1e-9):.0f} rows/s overall"
+            )
+
+        manifest['finished'] = True
+        self._save_manifest(manifest)
+        elapsed = time.monotonic() - started
+        self.log(f"Archived {archived} orders in {elapsed:.1f}s ({archived / max(elapsed, 1e-9):.0f} rows/s)")
+        return manifest
+
+    def _write_part(self, number: int, after_id: int) -> Optional[dict]:
+        name = f'part-{number:05d}.jsonl.gz'
+        path = os.path.join(self.directory, name)
+        rows = 0
+        first_id = last_id = None
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as out:
+            for row in self._rows(after_id):
+                out.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')))
+                out.write('\n')
+                rows += 1
+                first_id = first_id or row['id']
+                last_id = row['id']
+        if not rows:
+            os.remove(path + '.tmp')
+            return None
+        self._fsync(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return {
+            'name': name,
+            'rows': rows,
+            'first_id': first_id,
+            'last_id': last_id,
+            'bytes': os.path.getsize(path),
+            'sha256': file_sha256(path),
+            'deleted': False,
+        }
+
+    def _rows(self, after_id: int) -> Iterator[dict]:
+        # A server-side cursor on PostgreSQL, so memory stays flat whatever the part size
+        queryset = self.queryset().filter(id__gt=after_id).values(*self.fields)[:self.file_rows]
+        return queryset.iterator(chunk_size=self.chunk_size)
+
+    def _delete_part(self, manifest: dict, part: dict) -> None:
+        """Delete the orders in the part file in short transactions of chunk_size orders"""
+        # The cutoff bound lets PostgreSQL prune the partitions of newer orders
+        queryset = Order.objects.filter(created_at__lt=datetime.combine(self.cutoff, dt_time.min, tzinfo=timezone.utc))
+        with gzip.open(os.path.join(self.directory, part['name']), 'rt', encoding='utf-8') as archived:
+            ids = (json.loads(line)['id'] for line in archived)
+            while True:
+                chunk = list(islice(ids, self.chunk_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    # A plain DELETE: the collector would null the ledger entries' order ids
+                    queryset.filter(id__in=chunk)._raw_delete(queryset.db)
+        part['deleted'] = True
+        self._save_manifest(manifest)
+
+    def _load_manifest(self) -> dict:
+        path = os.path.join(self.directory, self.MANIFEST)
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                return json.load(manifest_file)
+        return {
+            'cutoff': self.cutoff.isoformat(),
+            'statuses': ARCHIVED_STATUSES,
+            'fields': self.fields,
+            'format': 'jsonl+gzip',
+            'finished': False,
+            'parts': [],
+        }
+
+    def _save_manifest(self, manifest: dict) -> None:
+        path = os.path.join(self.directory, self.MANIFEST)
+        with open(path + '.tmp', 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        self._fsync(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _fsync(path: str) -> None:
+        with open(path, 'rb') as written:
+            os.fsync(written.fileno())
+
+
+def unfinished_cutoff(output_dir: str) -> Optional[date]:
+    """Cutoff of an archive run in output_dir that has not finished, if any"""
+    if not os.path.isdir(output_dir):
+        return None
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name, OrderArchiver.MANIFEST)
+        if name.startswith('orders-before-') and os.path.exists(path):
+            with open(path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if not manifest.get('finished', False):
+                return date.fromisoformat(manifest['cutoff'])
+    return None
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as archive_file:
+        for block in iter(lambda: archive_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(directory: str) -> List[str]:
+    """Names of the parts in an archive directory whose checksum does not match its manifest"""
+    with open(os.path.join(directory, OrderArchiver.MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+    return [
+        part['name'] for part in manifest['parts']
+        if file_sha256(os.path.join(directory, part['name'])) != part['sha256']
+    ]
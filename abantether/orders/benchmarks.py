@@ -0,0 +1,248 @@
+"""Benchmarks for the order pipeline.
+
+Run them with ``python manage.py benchmark_orders``. Each scenario returns a
+flat dict of metrics; names ending in ``_ms`` are latencies (lower is
+better) and names ending in ``_per_sec`` are throughputs (higher is better).
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, List, Optional
+from unittest.mock import patch
+import json
+import platform
+import time
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from .amounts import Amount
+from .codec import PendingOrderCodec
+from .models import Order, SettlementBatch, Wallet
+from .partitions import coin_partition
+from .prices import CoinPriceService, PriceProvider
+from .services import OrderService
+
+BENCHMARK_COIN = 'BENCH'
+BENCHMARK_PRICE = Decimal('4.00')
+
+
+class FixedPriceProvider(PriceProvider):
+    def fetch_price(self, coin_name: str) -> Optional[Decimal]:
+        return BENCHMARK_PRICE if coin_name == BENCHMARK_COIN else None
+
+
+def percentiles(samples: List[float], prefix: str) -> dict:
+    """p50/p95/p99 of samples given in seconds, reported in milliseconds"""
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 4)
+
+    return {
+        f'{prefix}_p50_ms': pick(0.50),
+        f'{prefix}_p95_ms': pick(0.95),
+        f'{prefix}_p99_ms': pick(0.99),
+    }
+
+
+def timed(func: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class OrderBenchmarks:
+    """Order pipeline scenarios against the current database and a Redis client.
+
+    Pass the pooled client for a real Redis, or the in-process InMemoryRedis.
+    Every scenario creates its own users and cleans up the orders, settlement
+    batches and Redis keys it made.
+    """
+
+    def __init__(self, redis_client, repeat: int = 200):
+        self.redis_client = redis_client
+        self.repeat = repeat
+        self._users = 0
+
+    def order_service(self) -> OrderService:
+        order_service = OrderService()
+        order_service.redis_client = self.redis_client
+        order_service.coin_price_service = CoinPriceService(
+            provider=FixedPriceProvider(), redis_client=self.redis_client
+        )
+        return order_service
+
+    def run(self, backlog_sizes: List[int], history_sizes: List[int], codec_size: int = 0) -> dict:
+        CoinPriceService.clear_local_cache()
+        results = {}
+        if codec_size:
+            results.update(self.member_codec(codec_size))
+        results.update(self.create_order_throughput())
+        for size in backlog_sizes:
+            results.update(self.pending_backlog(size))
+        for size in history_sizes:
+            results.update(self.order_list_latency(size))
+        results.update(self.api_create_latency())
+        return results
+
+    def create_order_throughput(self) -> dict:
+        order_service = self.order_service()
+        user = self._create_user(balance=Decimal('1000000.00'))
+        # Stay below the exchange threshold so no settlement is triggered
+        samples = timed(
+            lambda: order_service.create_order(user, BENCHMARK_COIN, Decimal('0.01')),
+            self.repeat,
+        )
+        self._cleanup()
+        return {
+            'create_order.ops_per_sec': round(len(samples) / sum(samples), 2),
+            **percentiles(samples, 'create_order'),
+        }
+
+    def pending_backlog(self, size: int) -> dict:
+        """Threshold check and settlement cost with `size` orders pending"""
+        order_service = self.order_service()
+        user = self._create_user()
+        now = time.time()
+
+        def fill():
+            orders = [
+                Order(
+                    id=-(i + 1), user=user, coin_name=BENCHMARK_COIN,
+                    amount=Decimal('0.00000001'), created_at=datetime.fromtimestamp(now + i, tz=timezone.utc),
+                )
+                for i in range(size)
+            ]
+            order_service._add_pending_orders_to_redis(orders)
+
+        # Only the value limit may flush the backlog, whatever its size
+        policies = {**settings.SETTLEMENT_FLUSH_POLICIES, BENCHMARK_COIN: {'max_orders': size + 2}}
+        with override_settings(SETTLEMENT_FLUSH_POLICIES=policies):
+            fill()
+            check = timed(lambda: order_service.settle_pending_orders(BENCHMARK_COIN), self.repeat)
+
+            settle = []
+            for _ in range(max(1, self.repeat // 20)):
+                self._cleanup()
+                fill()
+                # Push the backlog over the threshold with one more order
+                order_service._add_pending_orders_to_redis([
+                    Order(id=0, user=user, coin_name=BENCHMARK_COIN, amount=Decimal('10'),
+                          created_at=datetime.fromtimestamp(now + size, tz=timezone.utc)),
+                ])
+                settle += timed(lambda: order_service.settle_pending_orders(BENCHMARK_COIN), 1)
+        self._cleanup()
+
+        return {
+            **percentiles(check, f'pending_check.{size}'),
+            **percentiles(settle, f'pending_settle.{size}'),
+        }
+
+    def order_list_latency(self, size: int) -> dict:
+        user = self._create_user()
+        Order.objects.bulk_create(
+            (Order(user=user, coin_name=BENCHMARK_COIN, amount=Decimal('1')) for _ in range(size)),
+            batch_size=1000,
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        samples = timed(lambda: client.get('/api/orders/'), self.repeat)
+        self._cleanup()
+        return percentiles(samples, f'order_list.{size}')
+
+    def api_create_latency(self) -> dict:
+        user = self._create_user(balance=Decimal('1000000.00'))
+        client = APIClient()
+        client.force_authenticate(user)
+        # Views build their own OrderService; point it at the benchmark's Redis and prices
+        with (
+            patch('abantether.orders.services.get_redis_client', return_value=self.redis_client),
+            override_settings(COIN_PRICE_PROVIDER='abantether.orders.benchmarks.FixedPriceProvider'),
+        ):
+            samples = timed(
+                lambda: client.post(
+                    '/api/orders/', {'coin_name': BENCHMARK_COIN, 'amount': '0.01'}, format='json'
+                ),
+                self.repeat,
+            )
+        self._cleanup()
+        return percentiles(samples, 'api_create_order')
+
+    def member_codec(self, size: int) -> dict:
+        """Memory per member and decode throughput of JSON vs compact members"""
+        formats = {
+            'json': [json.dumps({'id': i, 'amount': f'{Decimal(i) / 10 ** 8:.8f}'}) for i in range(size)],
+            'v1': [PendingOrderCodec.encode(i, Amount(i)) for i in range(size)],
+        }
+        results = {}
+        for name, members in formats.items():
+            key = f'benchmark_members:{name}'
+            self.redis_client.delete(key)
+            for start in range(0, size, 10000):
+                self.redis_client.zadd(key, {member: i for i, member in enumerate(members[start:start + 10000], start)})
+            if hasattr(self.redis_client, 'memory_usage'):
+                bytes_per_member = self.redis_client.memory_usage(key, samples=0) / size
+            else:
+                # In-process stand-in: only the member payload can be measured
+                bytes_per_member = sum(len(member.encode()) for member in members) / size
+            self.redis_client.delete(key)
+
+            start = time.perf_counter()
+            for member in members:
+                PendingOrderCodec.decode(member)
+            elapsed = time.perf_counter() - start
+
+            results[f'member_codec.{name}.bytes_per_member'] = round(bytes_per_member, 2)
+            results[f'member_codec.{name}.decode_per_sec'] = round(size / elapsed, 2)
+        return results
+
+    def _create_user(self, balance: Decimal = Decimal('0.00')):
+        self._users += 1
+        user = get_user_model().objects.create_user(
+            username=f'benchmark-{self._users}-{time.time_ns()}', password=None
+        )
+        Wallet.objects.create(user=user, balance=balance)
+        return user
+
+    def _cleanup(self) -> None:
+        Order.objects.filter(coin_name=BENCHMARK_COIN).delete()
+        SettlementBatch.objects.filter(coin_name=BENCHMARK_COIN).delete()
+        self.redis_client.delete(
+            OrderService._pending_orders_key(BENCHMARK_COIN),
+            OrderService._pending_totals_key(BENCHMARK_COIN),
+        )
+        self.redis_client.zrem(OrderService._flush_deadlines_key(coin_partition(BENCHMARK_COIN)), BENCHMARK_COIN)
+
+
+def environment() -> dict:
+    return {
+        'timestamp': datetime.now().astimezone().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed by more than tolerance"""
+    regressions = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if name.endswith('_per_sec'):
+            change = (previous - value) / previous
+        elif name.endswith('_ms'):
+            change = (value - previous) / previous
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(f'{name}: {previous} -> {value} ({change:+.0%})')
+    return regressions
+
@@ -0,0 +1,39 @@
+from typing import Tuple
+import json
+from .amounts import Amount
+
+
+class PendingOrderCodec:
+    """Encode pending-order members of the pending_orders:{coin} sorted sets.
+
+    Version 1 members look like ``1:<id hex>:<amount units hex>`` where the
+    amount is in Amount base units, e.g. ``1:2a:5f5e100`` for order 42
+    of 1 coin. Members stay text because the shared Redis client decodes
+    responses. Version 0 members are the original JSON objects
+    (``{"id": 42, "amount": "1.00000000"}``) and are still decoded. Sets
+    written before the running totals existed only settle once the
+    rebuild_pending_totals command has recomputed their pending_totals hash.
+    """
+    VERSION = 1
+    PREFIX = '1:'
+
+    @classmethod
+    def encode(cls, order_id: int, amount: Amount) -> str:
+        return f"{cls.PREFIX}{order_id:x}:{amount.units:x}"
+
+    @classmethod
+    def decode(cls, member: str) -> Tuple[int, Amount]:
+        """Return (order id, amount) for a member of any version"""
+        if member.startswith(cls.PREFIX):
+            _, order_id, amount_units = member.split(':')
+            return int(order_id, 16), Amount(int(amount_units, 16))
+        if member.startswith('{'):
+            data = json.loads(member)
+            return data['id'], Amount.from_decimal(data['amount'])
+        raise ValueError(f"Unknown pending order member: {member!r}")
+
+    @classmethod
+    def decode_id(cls, member: str) -> int:
+        if member.startswith(cls.PREFIX):
+            return int(member[2:member.index(':', 2)], 16)
+        return cls.decode(member)[0]
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+
+class RedisClientRegistry:
+    """Process-wide registry of pooled Redis clients, keyed by URL.
+
+    Clients are created lazily on first use, so importing this module (or
+    forking a preloaded gunicorn master) never opens a connection. Each
+    client sits on a bounded BlockingConnectionPool: when every connection
+    is busy, callers wait up to REDIS_POOL_TIMEOUT instead of opening more.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def get(self, url: str = None) -> redis.Redis:
+        url = url or settings.REDIS_URL
+        self._reset_after_fork()
+        client = self._clients.get(url)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(url)
+                if client is None:
+                    client = redis.Redis(connection_pool=self._build_pool(url))
+                    self._clients[url] = client
+        return client
+
+    def pool_stats(self) -> dict:
+        """Return in-use and idle connection counts for every pool in this process"""
+        stats = {}
+        for url, client in list(self._clients.items()):
+            pool = client.connection_pool
+            created = len(pool._connections)
+            idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+            stats[url] = {
+                'pid': os.getpid(),
+                'max_connections': pool.max_connections,
+                'created': created,
+                'in_use': created - idle,
+                'idle': idle,
+            }
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.connection_pool.disconnect()
+            self._clients = {}
+
+    def _reset_after_fork(self) -> None:
+        # Connections must never be shared across processes
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._clients = {}
+                    self._pid = os.getpid()
+
+    @staticmethod
+    def _build_pool(url: str, pool_class=redis.BlockingConnectionPool):
+        return pool_class.from_url(
+            url,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            decode_responses=True,
+        )
+
+
+class AsyncRedisClientRegistry:
+    """Pooled redis.asyncio clients, keyed by event loop and URL.
+
+    Async connections belong to the loop that opened them, so every loop
+    (one per ASGI worker process) gets its own pool with the same limits as
+    the sync clients. Pools are dropped together with their loop.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self, url: str = None) -> redis.asyncio.Redis:
+        url = url or settings.REDIS_URL
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(url)
+        if client is None:
+            pool = RedisClientRegistry._build_pool(url, pool_class=redis.asyncio.BlockingConnectionPool)
+            client = clients[url] = redis.asyncio.Redis(connection_pool=pool)
+        return client
+
+
+redis_clients = RedisClientRegistry()
+async_redis_clients = AsyncRedisClientRegistry()
+
+
+def get_redis_client(url: str = None) -> redis.Redis:
+    return redis_clients.get(url)
+
+
+def get_async_redis_client(url: str = None) -> redis.asyncio.Redis:
+    """Pooled async client for the running event loop"""
+    return async_redis_clients.get(url)
@@ -0,0 +1,35 @@
+from decimal import Decimal, ROUND_CEILING
+from django.conf import settings
+from .amounts import Amount
+
+
+class FlushPolicy:
+    """When a coin's pending batch is sent to the exchange.
+
+    A batch is flushed as soon as any limit is reached: its value, the age
+    of its oldest order or its number of orders. Defaults come from
+    settings and can be overridden per coin in SETTLEMENT_FLUSH_POLICIES.
+    """
+
+    def __init__(self, min_value: Decimal, max_age: float, max_orders: int):
+        self.min_value = Decimal(min_value)
+        self.max_age = float(max_age)
+        self.max_orders = int(max_orders)
+
+    @classmethod
+    def for_coin(cls, coin_name: str, min_value: Decimal) -> 'FlushPolicy':
+        policy = {
+            'min_value': min_value,
+            'max_age': settings.SETTLEMENT_FLUSH_MAX_AGE,
+            'max_orders': settings.SETTLEMENT_FLUSH_MAX_ORDERS,
+        }
+        policy.update(settings.SETTLEMENT_FLUSH_POLICIES.get(coin_name, {}))
+        return cls(**policy)
+
+    def min_amount(self, price: Decimal) -> Amount:
+        """Smallest pending amount worth sending to the exchange at price"""
+        return Amount.from_decimal(self.min_value / price, rounding=ROUND_CEILING)
+
+    def is_ready(self, amount: Amount, count: int, price: Decimal) -> bool:
+        """Whether the value or count limit is reached; age is checked by the settlement workers"""
+        return count >= self.max_orders or amount >= self.min_amount(price)
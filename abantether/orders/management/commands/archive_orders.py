@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from abantether.orders.archive import OrderArchiver, unfinished_cutoff, verify
+
+
+class Command(BaseCommand):
+    help = "Move settled orders older than a cutoff into gzip JSONL files and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help="Directory for the archive files")
+        cutoff = parser.add_mutually_exclusive_group()
+        cutoff.add_argument(
+            '--before', type=date.fromisoformat,
+            help="Archive orders created before this date (YYYY-MM-DD); rerun with the same date to resume",
+        )
+        cutoff.add_argument(
+            '--older-than-days', type=int, default=90,
+            help="Archive orders created before this many days ago; an unfinished run in --output is resumed instead",
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows per fetch and per delete")
+        parser.add_argument('--file-rows', type=int, default=100000, help="Orders per archive file")
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only check the checksums of an existing archive for the cutoff",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options['before']
+        if cutoff is None:
+            # A run resumed on a later day keeps the cutoff it started with
+            cutoff = unfinished_cutoff(options['output'])
+            if cutoff is not None:
+                self.stdout.write(f"Resuming the unfinished archive of orders before {cutoff}")
+            else:
+                cutoff = timezone.now().date() - timedelta(days=options['older_than_days'])
+        archiver = OrderArchiver(
+            options['output'], cutoff,
+            chunk_size=options['chunk_size'], file_rows=options['file_rows'], log=self.stdout.write,
+        )
+        if options['verify']:
+            corrupt = verify(archiver.directory)
+            if corrupt:
+                raise CommandError(f"Checksum mismatch: {', '.join(corrupt)}")
+            self.stdout.write("All archive files match their checksums")
+            return
+
+        manifest = archiver.run()
+        self.stdout.write(f"{len(manifest['parts'])} archive files in {archiver.directory}")
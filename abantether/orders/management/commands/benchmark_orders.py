@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from abantether.orders.benchmarks import OrderBenchmarks, compare_to_baseline, environment
+from abantether.orders.connections import get_redis_client
+from abantether.orders.memory_redis import InMemoryRedis
+
+
+def sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the order pipeline and optionally compare against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--redis', default='mock',
+            help="'mock' for the in-process stand-in, or a redis:// URL for a real server",
+        )
+        parser.add_argument('--repeat', type=int, default=200, help="Samples per measurement")
+        parser.add_argument('--backlog-sizes', type=sizes, default=[100, 1000, 10000])
+        parser.add_argument('--history-sizes', type=sizes, default=[100, 1000, 10000])
+        parser.add_argument(
+            '--codec-size', type=int, default=100000,
+            help="Members per set for the pending member codec comparison (0 to skip)",
+        )
+        parser.add_argument('--output', help="Write results as JSON to this file")
+        parser.add_argument('--baseline', help="Fail if results regressed against this JSON file")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed relative regression per metric (0.25 = 25%%)",
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Reuse the benchmark database between runs",
+        )
+
+    def handle(self, *args, **options):
+        if options['redis'] == 'mock':
+            redis_client = InMemoryRedis()
+        else:
+            redis_client = get_redis_client(options['redis'])
+
+        # Run in a throwaway test database, never against real data
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            benchmarks = OrderBenchmarks(redis_client, repeat=options['repeat'])
+            results = benchmarks.run(
+                options['backlog_sizes'], options['history_sizes'], codec_size=options['codec_size']
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'environment': {**environment(), 'redis': options['redis']},
+            'results': results,
+        }
+        for name, value in results.items():
+            self.stdout.write(f"{name:40} {value}")
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)['results']
+            regressions = compare_to_baseline(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError("Benchmark regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,35 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from abantether.orders.services import WalletLedgerService
+
+
+class Command(BaseCommand):
+    help = "Roll new wallet ledger entries into balance snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and compact every N seconds; runs once when omitted",
+        )
+
+    def handle(self, *args, **options):
+        ledger_service = WalletLedgerService()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while True:
+            written = ledger_service.compact()
+            self.stdout.write(f"Wrote {written} wallet balance snapshots")
+            if not options['interval']:
+                break
+            for _ in range(options['interval']):
+                if not self.running:
+                    return
+                time.sleep(1)
+
+    def stop(self, *args):
+        self.running = False
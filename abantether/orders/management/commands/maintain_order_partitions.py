@@ -0,0 +1,71 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from abantether.orders import order_partitions
+
+
+class Command(BaseCommand):
+    help = "Create the upcoming monthly order partitions and detach old ones into the archive schema"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.ORDER_PARTITIONS_AHEAD,
+            help="Create partitions up to this many months from now",
+        )
+        parser.add_argument(
+            '--detach-older-than', type=int, default=None, metavar='MONTHS',
+            help="Detach partitions whose orders are all older than this many months; nothing is detached when omitted",
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Change nothing and fail unless the partitions cover next month, for monitoring",
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and maintain the partitions every N seconds; runs once when omitted",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Order partitions need PostgreSQL")
+
+        if options['check']:
+            missing = order_partitions.missing_partitions(connection, 1)
+            if missing:
+                raise CommandError(f"Missing order partitions, inserts into them will fail: {', '.join(missing)}")
+            self.stdout.write("Order partitions cover next month")
+            return
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while True:
+            self.maintain(options)
+            if not options['interval']:
+                break
+            for _ in range(options['interval']):
+                if not self.running:
+                    return
+                time.sleep(1)
+
+    def maintain(self, options):
+        created = order_partitions.create_partitions(connection, options['months_ahead'])
+        self.stdout.write(f"Order partitions up to date: {', '.join(created) or 'none needed'}")
+
+        if options['detach_older_than'] is not None:
+            before = order_partitions.add_months(
+                order_partitions.month_start(timezone.now().date()), -options['detach_older_than']
+            )
+            detached = order_partitions.detach_partitions(connection, before)
+            self.stdout.write(
+                f"Detached {len(detached)} partitions into {order_partitions.ARCHIVE_SCHEMA}: {', '.join(detached)}"
+            )
+
+    def stop(self, *args):
+        self.running = False
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from abantether.orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = "Recompute the running totals of every coin's pending order set from its members"
+
+    def handle(self, *args, **options):
+        rebuilt = OrderService().rebuild_pending_totals()
+        for coin_name, count in sorted(rebuilt.items()):
+            self.stdout.write(f"{coin_name}: {count} pending orders")
+        self.stdout.write(f"Rebuilt the pending totals of {len(rebuilt)} coins")
@@ -0,0 +1,24 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from abantether.orders.reconciliation import WalletReconciler
+
+
+class Command(BaseCommand):
+    help = "Check that wallet balances match their ledgers and failed orders were refunded"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Check every wallet instead of only those with activity since the last run",
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes checking batches in parallel")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Users per aggregate query")
+
+    def handle(self, *args, **options):
+        run = WalletReconciler(
+            workers=options['workers'], batch_size=options['batch_size'], log=self.stdout.write,
+        ).run(incremental=not options['full'])
+        for discrepancy in run.discrepancies.select_related('user'):
+            self.stdout.write(str(discrepancy))
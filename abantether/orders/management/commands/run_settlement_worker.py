@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from abantether.orders.settlement import SettlementWorker
+
+
+class Command(BaseCommand):
+    help = "Consume settlement events and settle pending order batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', help="Consumer name, defaults to <hostname>-<pid>")
+        parser.add_argument('--block-ms', type=int, default=5000, help="How long to block waiting for events")
+        parser.add_argument('--count', type=int, default=100, help="Max events read per round trip")
+        parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port")
+
+    def handle(self, *args, **options):
+        worker = SettlementWorker(
+            consumer_name=options['consumer'],
+            block_ms=options['block_ms'],
+            count=options['count'],
+        )
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+
+        self.stdout.write(f"Settlement worker {worker.consumer_name} started")
+        worker.run()
+        self.stdout.write(f"Settlement worker {worker.consumer_name} stopped")
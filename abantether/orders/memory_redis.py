@@ -0,0 +1,333 @@
+"""In-process stand-in for the parts of redis-py the orders app uses.
+
+It backs the test suite and ``benchmark_orders --redis mock``, so neither
+needs a Redis server. Lua scripts are replaced by Python emulations of the
+same behaviour, which test_redis_scripts checks against the real scripts.
+"""
+import asyncio
+import redis
+from abantether.orders.prices import RELEASE_LOCK_SCRIPT
+from abantether.orders.services import CLAIM_BATCH_SCRIPT, STORE_WALLET_BALANCE_SCRIPT
+from abantether.orders.settlement import RELEASE_LEASES_SCRIPT, RENEW_LEASES_SCRIPT
+
+
+def _claim_batch(redis_instance, keys, args):
+    pending_orders_key, pending_totals_key, batch_orders_key, batch_totals_key, deadlines_key = keys
+    min_units, max_orders, now, max_age, coin_name = args
+    amount = redis_instance.hget(pending_totals_key, 'amount')
+    if not amount or int(amount) <= 0:
+        redis_instance.zrem(deadlines_key, coin_name)
+        return None
+    count = int(redis_instance.hget(pending_totals_key, 'count') or 0)
+    if int(amount) < int(min_units) and count < int(max_orders):
+        oldest = redis_instance.zrange(pending_orders_key, 0, 0, withscores=True)
+        deadline = oldest and oldest[0][1] + float(max_age)
+        if not deadline or deadline > float(now):
+            if deadline:
+                redis_instance.zadd(deadlines_key, {coin_name: deadline})
+            return None
+    redis_instance.rename(pending_orders_key, batch_orders_key)
+    redis_instance.rename(pending_totals_key, batch_totals_key)
+    redis_instance.zrem(deadlines_key, coin_name)
+    members = redis_instance.zrange(batch_orders_key, 0, -1, withscores=True)
+    return [amount, [str(value) for member in members for value in member]]
+
+
+def _renew_leases(redis_instance, keys, args):
+    return [int(redis_instance.get(key) == args[0]) for key in keys]
+
+
+def _release_leases(redis_instance, keys, args):
+    held = [key for key in keys if redis_instance.get(key) == args[0]]
+    redis_instance.delete(*held)
+    return len(held)
+
+
+def _release_lock(redis_instance, keys, args):
+    if redis_instance.get(keys[0]) != args[0]:
+        return 0
+    return redis_instance.delete(keys[0])
+
+
+def _store_wallet_balance(redis_instance, keys, args):
+    balance_key, version_key = keys
+    if int(redis_instance.get(version_key) or 0) != int(args[1]):
+        return 0
+    redis_instance.set(balance_key, args[0])
+    return 1
+
+
+# Python stand-ins for the Lua scripts the services register
+SCRIPT_EMULATIONS = {
+    CLAIM_BATCH_SCRIPT: _claim_batch,
+    RENEW_LEASES_SCRIPT: _renew_leases,
+    RELEASE_LEASES_SCRIPT: _release_leases,
+    RELEASE_LOCK_SCRIPT: _release_lock,
+    STORE_WALLET_BALANCE_SCRIPT: _store_wallet_balance,
+}
+
+
+class InMemoryRedis:
+    def __init__(self):
+        self.data = {}
+        self.published = []
+        # (loop, queue) of every AsyncInMemoryPubSub listening to this instance
+        self.subscribers = []
+
+    def ping(self):
+        return True
+
+    def set(self, name, value, nx=False, px=None):
+        if nx and name in self.data:
+            return None
+        self.data[name] = value
+        return True
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def incr(self, name, amount=1):
+        self.data[name] = str(int(self.data.get(name, 0)) + amount)
+        return int(self.data[name])
+
+    def expire(self, name, time):
+        return name in self.data
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        receivers = [(loop, queue) for loop, queue, channels in self.subscribers if channel in channels]
+        for loop, queue in receivers:
+            loop.call_soon_threadsafe(queue.put_nowait, {'type': 'message', 'channel': channel, 'data': message})
+        return len(receivers)
+
+    def zadd(self, name, mapping, nx=False):
+        if name not in self.data:
+            self.data[name] = {}
+        added = {member: score for member, score in mapping.items() if not (nx and member in self.data[name])}
+        self.data[name].update(added)
+        return len(added)
+
+    def zscore(self, name, member):
+        return self.data.get(name, {}).get(member)
+
+    def zrange(self, name, start, end, withscores=False):
+        members = sorted(self.data.get(name, {}).items(), key=lambda item: item[1])
+        members = members[start:None if end == -1 else end + 1]
+        return members if withscores else [member for member, _ in members]
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        members = [member for member, score in self.zrange(name, 0, -1, withscores=True) if float(min) <= score <= float(max)]
+        return members if num is None else members[start:start + num]
+
+    def zremrangebyscore(self, name, min, max):
+        members = self.zrangebyscore(name, min, max)
+        for member in members:
+            del self.data[name][member]
+        return len(members)
+
+    def zrem(self, name, *members):
+        return sum(self.data.get(name, {}).pop(member, None) is not None for member in members)
+
+    def hincrby(self, name, key, amount=1):
+        if name not in self.data:
+            self.data[name] = {}
+        self.data[name][key] = str(int(self.data[name].get(key, 0)) + amount)
+        return int(self.data[name][key])
+
+    def hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    def hmget(self, name, *keys):
+        return [self.hget(name, key) for key in keys]
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip('*') if match else ''
+        return [name for name in list(self.data) if name.startswith(prefix)]
+
+    def delete(self, *names):
+        deleted = [name for name in names if name in self.data]
+        for name in deleted:
+            del self.data[name]
+        return len(deleted)
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        stream = self.data.setdefault(name, {'entries': [], 'groups': {}})
+        entry_id = f"{len(stream['entries']) + 1}-0"
+        stream['entries'].append((entry_id, dict(fields)))
+        return entry_id
+
+    def xgroup_create(self, name, groupname, id='$', mkstream=False):
+        stream = self.data.setdefault(name, {'entries': [], 'groups': {}})
+        last = 0 if id == '0' else len(stream['entries'])
+        stream['groups'].setdefault(groupname, {'last': last, 'pending': {}})
+        return True
+
+    def xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False):
+        response = []
+        for name, last_id in streams.items():
+            group = self.data[name]['groups'][groupname]
+            if last_id == '>':
+                entries = self.data[name]['entries'][group['last']:][:count]
+                group['last'] += len(entries)
+                group['pending'].update(entries)
+            else:
+                entries = list(group['pending'].items())[:count]
+            if entries or last_id != '>':
+                response.append([name, entries])
+        return response
+
+    def xrange(self, name, min='-', max='+', count=None):
+        after = min[1:] if min.startswith('(') else None
+        entries = [
+            entry for entry in self.data.get(name, {'entries': []})['entries']
+            if after is None or int(entry[0].split('-')[0]) > int(after.split('-')[0])
+        ]
+        return entries[:count]
+
+    def xrevrange(self, name, max='+', min='-', count=None):
+        return list(reversed(self.xrange(name)))[:count]
+
+    def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id='0-0', count=None, justid=False):
+        # Pending entries are not tracked per consumer here, so there is nothing to move
+        return ['0-0', [], []]
+
+    def xack(self, name, groupname, *ids):
+        pending = self.data[name]['groups'][groupname]['pending']
+        return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    def rename(self, src, dst):
+        self.data[dst] = self.data.pop(src)
+        return True
+
+    def register_script(self, script):
+        return InMemoryScript(self, script)
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def transaction(self, func, *watches, **kwargs):
+        pipe = InMemoryPipeline(self)
+        pipe.watching = True
+        func(pipe)
+        return pipe.execute()
+
+
+class InMemoryScript:
+    def __init__(self, redis_instance, script):
+        self.redis_instance = redis_instance
+        self.emulation = SCRIPT_EMULATIONS[script]
+
+    def __call__(self, keys=(), args=()):
+        return self.emulation(self.redis_instance, list(keys), list(args))
+
+
+class InMemoryPipeline:
+    def __init__(self, redis_instance):
+        self.redis_instance = redis_instance
+        self.commands = []
+        # Commands run immediately between watch() and multi(), as in redis-py
+        self.watching = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.commands = []
+        return False
+
+    def __getattr__(self, name):
+        # Queue any command the InMemoryRedis supports and run it on execute()
+        command = getattr(self.redis_instance, name)
+        if self.watching:
+            return command
+
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def watch(self, *names):
+        self.watching = True
+
+    def multi(self):
+        self.watching = False
+        return self
+
+    def execute(self):
+        results = []
+        for cmd, args, kwargs in self.commands:
+            results.append(getattr(self.redis_instance, cmd)(*args, **kwargs))
+        self.commands = []
+        return results
+
+
+class AsyncInMemoryRedis:
+    """redis.asyncio stand-in backed by a InMemoryRedis"""
+
+    def __init__(self, redis_instance=None, socket_timeout=None):
+        self.redis_instance = redis_instance or InMemoryRedis()
+        self.socket_timeout = socket_timeout
+
+    def __getattr__(self, name):
+        command = getattr(self.redis_instance, name)
+
+        async def call(*args, **kwargs):
+            return command(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return AsyncInMemoryPipeline(self.redis_instance)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return AsyncInMemoryPubSub(self.redis_instance, self.socket_timeout)
+
+
+class AsyncInMemoryPubSub:
+    def __init__(self, redis_instance, socket_timeout=None):
+        self.redis_instance = redis_instance
+        self.socket_timeout = socket_timeout
+        self.queue = asyncio.Queue()
+        self.channels = set()
+        self.subscriber = (asyncio.get_running_loop(), self.queue, self.channels)
+
+    async def __aenter__(self):
+        self.redis_instance.subscribers.append(self.subscriber)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.redis_instance.subscribers.remove(self.subscriber)
+        return False
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    async def listen(self):
+        # Like redis-py, reads without a timeout of their own fail after socket_timeout
+        while True:
+            try:
+                yield await asyncio.wait_for(self.queue.get(), self.socket_timeout)
+            except asyncio.TimeoutError:
+                raise redis.TimeoutError("Timeout reading from socket")
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AsyncInMemoryPipeline(InMemoryPipeline):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.commands = []
+        return False
+
+    async def execute(self):
+        return super().execute()
@@ -0,0 +1,97 @@
+"""Prometheus metrics for the order hot path.
+
+Stage timers are pre-bound label children, so recording a sample is a
+perf_counter pair and one histogram observe. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR (see config/gunicorn.py) and every worker writes
+its samples to shared files that the /metrics view aggregates.
+"""
+import hmac
+import os
+from decimal import Decimal
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+ORDER_STAGE_SECONDS = Histogram(
+    'order_stage_seconds',
+    'Time spent in each stage of order creation and settlement',
+    ['stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+# Includes the time spent waiting for the wallet row lock
+WALLET_DEBIT_SECONDS = ORDER_STAGE_SECONDS.labels('wallet_debit')
+ORDER_INSERT_SECONDS = ORDER_STAGE_SECONDS.labels('order_insert')
+LEDGER_INSERT_SECONDS = ORDER_STAGE_SECONDS.labels('ledger_insert')
+REDIS_ENQUEUE_SECONDS = ORDER_STAGE_SECONDS.labels('redis_enqueue')
+THRESHOLD_EVALUATION_SECONDS = ORDER_STAGE_SECONDS.labels('threshold_evaluation')
+EXCHANGE_BUY_SECONDS = ORDER_STAGE_SECONDS.labels('exchange_buy')
+
+ORDERS_CREATED = Counter('orders_created_total', 'Orders accepted', ['coin'])
+ORDERS_REJECTED = Counter('orders_rejected_total', 'Orders rejected', ['reason'])
+REDIS_ROUND_TRIPS = Counter('order_redis_round_trips_total', 'Redis round trips made by the order service', ['operation'])
+EXCHANGE_BUYS = Counter('exchange_buys_total', 'Exchange buys by outcome', ['coin', 'outcome'])
+WALLET_CACHE_READS = Counter('wallet_cache_reads_total', 'Wallet balance reads by cache result', ['result'])
+
+# Set once per worker by abantether.orders.warmup; one series per live worker
+WORKER_STARTUP_SECONDS = Gauge(
+    'worker_startup_seconds', 'Seconds from fork until the worker was warmed up', multiprocess_mode='liveall'
+)
+WORKER_MEMORY_BYTES = Gauge(
+    'worker_memory_bytes', 'Worker memory after warm-up (rss, pss, uss)', ['kind'], multiprocess_mode='liveall'
+)
+
+
+class PendingBacklogCollector:
+    """Pending order count and value per coin, read from Redis at scrape time.
+
+    The running totals already live in Redis, so nothing is tracked per
+    process and the numbers are the same whichever worker is scraped.
+    """
+
+    def collect(self):
+        from .services import OrderService
+
+        count = GaugeMetricFamily('pending_backlog_orders', 'Pending orders per coin', labels=['coin'])
+        value = GaugeMetricFamily('pending_backlog_value', 'Value of pending orders per coin', labels=['coin'])
+        order_service = OrderService()
+        prefix = order_service._pending_totals_key('')
+        for key in order_service.redis_client.scan_iter(match=f'{prefix}*', count=1000):
+            coin_name = key[len(prefix):]
+            amount, orders = order_service._get_pending_totals(coin_name)
+            count.add_metric([coin_name], orders)
+            price = order_service.coin_price_service.get_coin_price(coin_name)
+            if price is not None:
+                value.add_metric([coin_name], float(amount.value_at(Decimal(price)).to_decimal()))
+        yield count
+        yield value
+
+
+def build_registry() -> CollectorRegistry:
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultRegistryCollector())
+    registry.register(PendingBacklogCollector())
+    return registry
+
+
+class _DefaultRegistryCollector:
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def metrics_view(request):
+    """Prometheus exposition, for staff users or a `Bearer METRICS_TOKEN` header"""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    authorized = (
+        (token and hmac.compare_digest(authorization, f'Bearer {token}'))
+        or (request.user.is_authenticated and request.user.is_staff)
+    )
+    if not authorized:
+        return HttpResponse(status=401 if not request.user.is_authenticated else 403)
+    return HttpResponse(generate_latest(build_registry()), content_type=CONTENT_TYPE_LATEST)
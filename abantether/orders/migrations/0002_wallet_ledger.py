@@ -0,0 +1,57 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def snapshot_existing_balances(apps, schema_editor):
+    """Existing balances become each wallet's opening snapshot"""
+    Wallet = apps.get_model('orders', 'Wallet')
+    WalletBalanceSnapshot = apps.get_model('orders', 'WalletBalanceSnapshot')
+    WalletBalanceSnapshot.objects.bulk_create(
+        (
+            WalletBalanceSnapshot(user_id=user_id, balance=balance, last_entry_id=0)
+            for user_id, balance in Wallet.objects.values_list('user_id', 'balance').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('last_entry_id', models.BigIntegerField(db_index=True, default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_entry_id'], name='orders_snapshot_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('debit', 'Debit'), ('credit', 'Credit'), ('refund', 'Refund')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.order')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='orders_ledger_user_id_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Build the history index without blocking order inserts
+    atomic = False
+
+    dependencies = [
+        ('orders', '0002_wallet_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], include=('coin_name', 'amount', 'status'), name='orders_order_user_created_idx'),
+        ),
+        # The composite index above makes the plain user_id index redundant
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
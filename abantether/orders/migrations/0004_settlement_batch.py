@@ -0,0 +1,46 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Index the new column without blocking order inserts
+    atomic = False
+
+    dependencies = [
+        ('orders', '0003_order_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coin_name', models.CharField(max_length=10)),
+                ('amount', models.DecimalField(decimal_places=8, max_digits=18)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('order_count', models.PositiveIntegerField()),
+                ('exchange_reference', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coin_name', '-created_at'], name='orders_batch_coin_created_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.settlementbatch'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['batch'], name='orders_order_batch_idx'),
+        ),
+    ]
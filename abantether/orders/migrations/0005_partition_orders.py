@@ -0,0 +1,41 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from abantether.orders import order_partitions
+
+
+def partition_orders(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    order_partitions.partition_table(
+        schema_editor, apps.get_model('orders', 'Order'), months_ahead=settings.ORDER_PARTITIONS_AHEAD
+    )
+
+
+def unpartition_orders(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    order_partitions.unpartition_table(schema_editor, apps.get_model('orders', 'Order'))
+
+
+class Migration(migrations.Migration):
+
+    # The order table is checked and indexed concurrently before it is swapped
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_settlement_batch'),
+    ]
+
+    operations = [
+        # Foreign keys cannot reference a partitioned table
+        migrations.AlterField(
+            model_name='walletledgerentry',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.order'),
+        ),
+        migrations.RunPython(partition_orders, unpartition_orders),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_partition_orders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('incremental', models.BooleanField(default=False)),
+                ('ledger_checkpoint', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('users_checked', models.PositiveIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('balance_mismatch', 'Balance mismatch'), ('unrefunded_failures', 'Unrefunded failures')], max_length=20)),
+                ('expected', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('actual', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='orders.reconciliationrun')),
+            ],
+        ),
+    ]
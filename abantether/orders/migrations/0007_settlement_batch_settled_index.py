@@ -0,0 +1,21 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:54
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Build the index without blocking settlement
+    atomic = False
+
+    dependencies = [
+        ('orders', '0006_reconciliation'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='settlementbatch',
+            index=models.Index(fields=['status', 'settled_at'], name='orders_batch_settled_idx'),
+        ),
+    ]
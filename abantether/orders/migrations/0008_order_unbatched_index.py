@@ -0,0 +1,43 @@
+# Generated by Django 5.0.9 on 2026-10-18 07:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+from abantether.orders import order_partitions
+
+UNBATCHED_INDEX = models.Index(
+    condition=models.Q(('batch__isnull', True), ('status', 'pending')), fields=['created_at'],
+    name='orders_order_unbatched_idx',
+)
+
+
+def add_unbatched_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_index(apps.get_model('orders', 'Order'), UNBATCHED_INDEX)
+        return
+    order_partitions.create_index(
+        schema_editor.connection, UNBATCHED_INDEX.name,
+        "(created_at) WHERE status = 'pending' AND batch_id IS NULL",
+    )
+
+
+def remove_unbatched_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('orders', 'Order'), UNBATCHED_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # The partitions are indexed concurrently
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_settlement_batch_settled_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(add_unbatched_index, remove_unbatched_index)],
+            state_operations=[migrations.AddIndex(model_name='order', index=UNBATCHED_INDEX)],
+        ),
+    ]
@@ -2,6 +2,39 @@ from django.db import models
 from django.conf import settings
 
 
+class SettlementBatch(models.Model):
+    """One exchange buy covering every order claimed from a coin's pending set"""
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    coin_name = models.CharField(max_length=10)
+    amount = models.DecimalField(max_digits=18, decimal_places=8)
+    value = models.DecimalField(max_digits=18, decimal_places=2)
+    order_count = models.PositiveIntegerField()
+    # Claim id of the batch in Redis, sent to the exchange as the client order id
+    exchange_reference = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['coin_name', '-created_at'], name='orders_batch_coin_created_idx'),
+            # Incremental reconciliation looks up recently failed batches
+            models.Index(fields=['status', 'settled_at'], name='orders_batch_settled_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.coin_name} - {self.amount} - {self.status}'
+
+
 class Order(models.Model):
     PENDING = 'pending'
     COMPLETED = 'completed'
@@ -13,15 +46,35 @@ class Order(models.Model):
         (FAILED, 'Failed'),
     ]
 
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Lookups by user are served by the (user, -created_at, -id) index below
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     coin_name = models.CharField(max_length=10)
     amount = models.DecimalField(max_digits=18, decimal_places=8)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Indexed by orders_order_batch_idx below
+    batch = models.ForeignKey(
+        SettlementBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name='orders', db_index=False
+    )
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['batch'], name='orders_order_batch_idx'),
+            # Only orders waiting for a batch, for the settlement workers' sweep
+            models.Index(
+                fields=['created_at'], condition=models.Q(status='pending', batch__isnull=True),
+                name='orders_order_unbatched_idx',
+            ),
+            # Covers the order history list (keyset pagination per user);
+            # INCLUDE allows index-only scans on PostgreSQL
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                include=['coin_name', 'amount', 'status'],
+                name='orders_order_user_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.amount} - {self.status}'
@@ -31,5 +84,100 @@ class Wallet(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=18, decimal_places=2)
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # The opening balance is the first entry of the wallet's ledger
+        if adding and self.balance:
+            WalletLedgerEntry.objects.create(
+                user_id=self.user_id,
+                kind=WalletLedgerEntry.CREDIT,
+                amount=self.balance,
+            )
+
     def __str__(self):
         return f'{self.user} - {self.balance}'
+
+
+class WalletLedgerEntry(models.Model):
+    """Append-only record of every change to a user's wallet balance"""
+    DEBIT = 'debit'
+    CREDIT = 'credit'
+    REFUND = 'refund'
+
+    KIND_CHOICES = [
+        (DEBIT, 'Debit'),
+        (CREDIT, 'Credit'),
+        (REFUND, 'Refund'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed: debits are negative
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    # Not enforced by the database: foreign keys cannot reference the
+    # partitioned order table (see order_partitions)
+    order = models.ForeignKey(
+        Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', db_constraint=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='orders_ledger_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.kind} - {self.amount}'
+
+
+class WalletBalanceSnapshot(models.Model):
+    """Balance of a wallet including every ledger entry up to last_entry_id"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    balance = models.DecimalField(max_digits=18, decimal_places=2)
+    last_entry_id = models.BigIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-last_entry_id'], name='orders_snapshot_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.balance} @ {self.last_entry_id}'
+
+
+class ReconciliationRun(models.Model):
+    """One pass of the wallet reconciliation job (see reconciliation.py)"""
+    incremental = models.BooleanField(default=False)
+    # Ledger entries up to this id and batches failed from started_at on are covered by the run
+    ledger_checkpoint = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    users_checked = models.PositiveIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.started_at} - {self.users_checked} users - {self.discrepancy_count} discrepancies'
+
+
+class ReconciliationDiscrepancy(models.Model):
+    """A wallet that did not reconcile, as found by a run"""
+    # The balance differs from the sum of the wallet's ledger entries
+    BALANCE_MISMATCH = 'balance_mismatch'
+    # Failed orders were debited but not refunded
+    UNREFUNDED_FAILURES = 'unrefunded_failures'
+
+    KIND_CHOICES = [
+        (BALANCE_MISMATCH, 'Balance mismatch'),
+        (UNREFUNDED_FAILURES, 'Unrefunded failures'),
+    ]
+
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='discrepancies')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    expected = models.DecimalField(max_digits=18, decimal_places=2)
+    actual = models.DecimalField(max_digits=18, decimal_places=2)
+
+    def __str__(self):
+        return f'{self.user} - {self.kind}: expected {self.expected}, found {self.actual}'
@@ -0,0 +1,228 @@
+"""Monthly range partitions of the order table (PostgreSQL only).
+
+orders_order is partitioned by created_at, one partition per calendar month
+named orders_order_pYYYY_MM, so the history list and the settlement updates
+work on small per-partition indexes and queries bounded by created_at only
+visit the partitions they need. Partitions are created ahead of time by the
+maintain_order_partitions command; old ones can be detached into
+ARCHIVE_SCHEMA, where they stay queryable without weighing on the live table.
+
+There is no DEFAULT partition: PostgreSQL cannot detach partitions
+concurrently while one exists. Order inserts past the last partition fail
+instead, which missing_partitions lets monitoring catch well before.
+
+A partitioned table's primary key must include the partition key, so the
+database key is (id, created_at). Ids still come from a single identity
+sequence and Django keeps treating id as the primary key.
+"""
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+from django.db import transaction
+from django.utils import timezone
+
+TABLE = 'orders_order'
+# Rows from before partitioning stay in the original table, attached as the first partition
+LEGACY_PARTITION = 'orders_order_legacy'
+ARCHIVE_SCHEMA = 'orders_archive'
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _bound(month: date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def list_partitions(connection) -> List[Tuple[str, Optional[datetime], bool]]:
+    """(name, upper bound, detach pending) of every partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound, detach_pending in rows:
+        upper = _UPPER_BOUND.search(bound)
+        partitions.append((name, datetime.fromisoformat(upper.group(1)) if upper else None, detach_pending))
+    return sorted(partitions, key=lambda partition: partition[1] or datetime.max.replace(tzinfo=dt_timezone.utc))
+
+
+def _missing_months(connection, months_ahead: int, today: date = None) -> List[date]:
+    this_month = month_start(today or timezone.now().date())
+    last_upper = max((upper for _, upper, _ in list_partitions(connection) if upper), default=None)
+    month = this_month if last_upper is None else max(this_month, last_upper.date())
+    months = []
+    while month < add_months(this_month, months_ahead + 1):
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def missing_partitions(connection, months_ahead: int, today: date = None) -> List[str]:
+    """Names of the partitions up to months_ahead months from now that do not exist yet"""
+    return [partition_name(month) for month in _missing_months(connection, months_ahead, today)]
+
+
+def create_partitions(connection, months_ahead: int, today: date = None) -> List[str]:
+    """Create the monthly partitions up to months_ahead months from now; returns the new ones"""
+    created = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Every web container runs this on start
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [TABLE])
+        for month in _missing_months(connection, months_ahead, today):
+            name = partition_name(month)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})"
+            )
+            created.append(name)
+    return created
+
+
+def detach_partitions(connection, before: date) -> List[str]:
+    """Move the partitions holding only orders from before the given month into ARCHIVE_SCHEMA.
+
+    Partitions are detached concurrently, so order inserts and reads go on
+    meanwhile; this cannot run inside a transaction. A detach interrupted
+    by a crash is finished on the next run.
+    """
+    detached = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        for name, upper, detach_pending in list_partitions(connection):
+            if upper is None or upper.date() > month_start(before):
+                continue
+            mode = 'FINALIZE' if detach_pending else 'CONCURRENTLY'
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name} {mode}")
+            cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+            detached.append(name)
+    return detached
+
+
+def create_index(connection, name: str, definition: str) -> None:
+    """Build an index of the partitioned table without blocking writes.
+
+    definition is what follows the table name, e.g. "(created_at) WHERE ...".
+    Partitioned tables cannot be indexed concurrently, so the parent index
+    is created empty on the table only, each partition is indexed
+    concurrently and attached to it; once all are attached the parent index
+    becomes valid. Partitions created later get the index automatically.
+    Cannot run inside a transaction; rerunning finishes an interrupted build.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {TABLE} {definition}")
+        for partition, _, detach_pending in list_partitions(connection):
+            if detach_pending:
+                continue
+            partition_index = f"{partition}_{name.removeprefix(TABLE + '_')}"
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {definition}")
+            cursor.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+
+
+def partition_table(schema_editor, model, months_ahead: int) -> None:
+    """Turn the existing order table into a partitioned one without copying it.
+
+    The old table becomes the first partition, bounded by the start of next
+    month. Its bound and new primary key are checked and built up front
+    under weak locks; the swap itself then only touches catalogs.
+    """
+    connection = schema_editor.connection
+    boundary = _bound(add_months(month_start(timezone.now().date()), 1))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {LEGACY_PARTITION}_bound "
+            f"CHECK (created_at IS NOT NULL AND created_at < {boundary}) NOT VALID"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} VALIDATE CONSTRAINT {LEGACY_PARTITION}_bound")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {LEGACY_PARTITION}_key ON {TABLE} (id, created_at)"
+        )
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_PARTITION}")
+        # Free the index names for the partitioned table's own indexes
+        for index in model._meta.indexes:
+            cursor.execute(f"ALTER INDEX {index.name} RENAME TO {index.name}_legacy")
+        cursor.execute(
+            f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {TABLE}_pkey, "
+            f"ADD CONSTRAINT {LEGACY_PARTITION}_pkey PRIMARY KEY USING INDEX {LEGACY_PARTITION}_key"
+        )
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {LEGACY_PARTITION}")
+        next_id = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)")
+        # Same foreign keys under the same names; attaching merges them with the old table's
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [LEGACY_PARTITION],
+        )
+        for name, definition in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        for index in model._meta.indexes:
+            schema_editor.execute(index.create_sql(model, schema_editor))
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY_PARTITION} FOR VALUES FROM (MINVALUE) TO ({boundary})"
+        )
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {LEGACY_PARTITION}_bound")
+        create_partitions(connection, months_ahead)
+
+
+def unpartition_table(schema_editor, model) -> None:
+    """Turn the partitioned order table back into a plain one; the reverse of partition_table.
+
+    Unlike partitioning, this copies every order into a new table while
+    the order table is locked, so plan for downtime. Partitions already
+    detached into ARCHIVE_SCHEMA are not copied; attach them again first
+    if their orders should come back.
+    """
+    connection = schema_editor.connection
+    plain = f'{TABLE}_plain'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"CREATE TABLE {plain} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING STORAGE)")
+        cursor.execute(f"INSERT INTO {plain} SELECT * FROM {TABLE}")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {plain}")
+        next_id = cursor.fetchone()[0]
+        # Drops every attached partition, the legacy one included, with their indexes
+        cursor.execute(f"DROP TABLE {TABLE}")
+        cursor.execute(f"ALTER TABLE {plain} RENAME TO {TABLE}")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)")
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        for sql in schema_editor._model_indexes_sql(model):
+            schema_editor.execute(sql)
@@ -0,0 +1,33 @@
+import bisect
+import hashlib
+import zlib
+from typing import Iterable, Optional
+from django.conf import settings
+
+
+def coin_partition(coin_name: str, partitions: int = None) -> int:
+    """Settlement partition of a coin; stable across processes and hosts"""
+    return zlib.crc32(coin_name.encode()) % (partitions or settings.SETTLEMENT_PARTITIONS)
+
+
+class HashRing:
+    """Consistent hash ring over worker ids.
+
+    Each worker is placed on the ring REPLICAS times, so adding or removing
+    one worker only moves about 1/N of the keys.
+    """
+    REPLICAS = 64
+
+    def __init__(self, nodes: Iterable[str]):
+        ring = sorted((self._hash(f'{node}#{i}'), node) for node in set(nodes) for i in range(self.REPLICAS))
+        self._hashes = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode(), usedforsecurity=False).digest()[:8], 'big')
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._nodes:
+            return None
+        return self._nodes[bisect.bisect(self._hashes, self._hash(key)) % len(self._nodes)]
@@ -0,0 +1,261 @@
+from decimal import Decimal
+from typing import Optional
+import logging
+import os
+import threading
+import time
+import uuid
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .connections import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Delete the refresh lock in KEYS[1] only while it is still held with token ARGV[1]
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Returned by the cache lookups for a coin that is not cached, as opposed to
+# one cached as unknown (None)
+_MISS = object()
+
+
+class PriceProvider:
+    """Source of truth for coin prices, e.g. an exchange price feed"""
+
+    def fetch_price(self, coin_name: str) -> Optional[Decimal]:
+        raise NotImplementedError
+
+
+class StaticPriceProvider(PriceProvider):
+    # In a real application, this would fetch from a price feed
+    COIN_PRICES = {
+        'ABAN': Decimal('4.00'),
+    }
+
+    def fetch_price(self, coin_name: str) -> Optional[Decimal]:
+        return self.COIN_PRICES.get(coin_name)
+
+
+class CoinPriceService:
+    """Coin prices behind an in-process cache and a shared Redis cache.
+
+    Lookups are served from the process cache while it is fresh, then from
+    Redis, and only then from the provider. Refreshes are single-flight:
+    one thread per process and one process per coin (through a short Redis
+    lock) calls the provider while the others wait for its result. Every new
+    price is published on TICK_CHANNEL; a listener thread applies the ticks to
+    the process cache, which then stays valid up to COIN_PRICE_MAX_STALENESS.
+    Prices older than that are never served. Coins the provider has no price
+    for are cached as unknown for COIN_PRICE_MISSING_TTL.
+    """
+    PRICE_KEY = 'coin_price:{}'
+    MISSING = 'none'
+    LOCK_KEY = 'coin_price_lock:{}'
+    TICK_CHANNEL = 'coin_price_ticks'
+    LOCK_TIMEOUT = 2.0
+    LOCK_POLL_INTERVAL = 0.01
+
+    # Shared by every instance in the process: coin -> (price, tick time, cached at)
+    _local_cache = {}
+    _refresh_locks = {}
+    _refresh_locks_guard = threading.Lock()
+    _listener = None
+
+    def __init__(self, provider: PriceProvider = None, redis_client=None):
+        self.provider = provider or import_string(settings.COIN_PRICE_PROVIDER)()
+        self.redis_client = redis_client or get_redis_client()
+
+    def get_coin_price(self, coin_name: str) -> Optional[Decimal]:
+        if settings.COIN_PRICE_TICK_LISTENER:
+            self.start_tick_listener()
+
+        price = self._get_local(coin_name)
+        if price is not _MISS:
+            return price
+        return self._refresh(coin_name)
+
+    def publish_tick(self, coin_name: str, price: Decimal, tick_time: float = None) -> None:
+        """Store a new price in Redis and invalidate every process cache"""
+        tick_time = tick_time or time.time()
+        value = f"{price}|{tick_time}"
+        with self.redis_client.pipeline() as pipe:
+            pipe.multi()
+            pipe.set(
+                self.PRICE_KEY.format(coin_name), value,
+                px=int(settings.COIN_PRICE_MAX_STALENESS * 1000),
+            )
+            pipe.publish(self.TICK_CHANNEL, f"{coin_name}|{value}")
+            pipe.execute()
+        self._set_local(coin_name, price, tick_time)
+
+    @classmethod
+    def clear_local_cache(cls) -> None:
+        cls._local_cache = {}
+
+    @classmethod
+    def apply_tick(cls, message: str) -> None:
+        coin_name, price, tick_time = message.split('|')
+        cls._set_local(coin_name, Decimal(price), float(tick_time))
+
+    def start_tick_listener(self) -> None:
+        listener = CoinPriceService._listener
+        if listener is None or listener.pid != os.getpid():
+            with self._refresh_locks_guard:
+                listener = CoinPriceService._listener
+                if listener is None or listener.pid != os.getpid():
+                    CoinPriceService._listener = PriceTickListener(self.redis_client, self.TICK_CHANNEL)
+                    CoinPriceService._listener.start()
+
+    @classmethod
+    def _listener_alive(cls) -> bool:
+        listener = cls._listener
+        return bool(listener and listener.pid == os.getpid() and listener.subscribed)
+
+    @classmethod
+    def _set_local(cls, coin_name: str, price: Decimal, tick_time: float) -> None:
+        cls._local_cache[coin_name] = (price, tick_time, time.monotonic())
+
+    def _store_missing(self, coin_name: str) -> None:
+        """Cache the coin as unknown, here and in Redis, for COIN_PRICE_MISSING_TTL"""
+        self._set_local(coin_name, None, time.time())
+        self.redis_client.set(
+            self.PRICE_KEY.format(coin_name), f"{self.MISSING}|{time.time()}",
+            px=int(settings.COIN_PRICE_MISSING_TTL * 1000),
+        )
+
+    @classmethod
+    def get_local_price(cls, coin_name: str) -> Optional[Decimal]:
+        """The fresh price in the process cache, or None when it has to be looked up"""
+        price = cls._get_local(coin_name)
+        return None if price is _MISS else price
+
+    @classmethod
+    def _get_local(cls, coin_name: str):
+        """The cached price, None for a coin cached as unknown, or _MISS"""
+        cached = cls._local_cache.get(coin_name)
+        if cached is None:
+            return _MISS
+        price, tick_time, cached_at = cached
+        if price is None:
+            return None if time.monotonic() - cached_at <= settings.COIN_PRICE_MISSING_TTL else _MISS
+        if time.time() - tick_time > settings.COIN_PRICE_MAX_STALENESS:
+            return _MISS
+        # While ticks are pushed to us, the entry is only bounded by staleness
+        if not cls._listener_alive() and time.monotonic() - cached_at > settings.COIN_PRICE_LOCAL_TTL:
+            return _MISS
+        return price
+
+    def _get_shared(self, coin_name: str):
+        """Like _get_local, from Redis"""
+        value = self.redis_client.get(self.PRICE_KEY.format(coin_name))
+        if not value:
+            return _MISS
+        price, tick_time = value.split('|')
+        if price == self.MISSING:
+            # Redis expires it after COIN_PRICE_MISSING_TTL
+            self._set_local(coin_name, None, float(tick_time))
+            return None
+        if time.time() - float(tick_time) > settings.COIN_PRICE_MAX_STALENESS:
+            return _MISS
+        self._set_local(coin_name, Decimal(price), float(tick_time))
+        return Decimal(price)
+
+    def _refresh(self, coin_name: str) -> Optional[Decimal]:
+        with self._refresh_lock(coin_name):
+            # Another thread may have refreshed while we waited for the lock
+            price = self._get_local(coin_name)
+            if price is not _MISS:
+                return price
+
+            try:
+                price = self._get_shared(coin_name)
+                if price is not _MISS:
+                    return price
+                token = self._acquire_shared_lock(coin_name)
+                if token is None:
+                    price = self._wait_for_shared(coin_name)
+                    if price is not _MISS:
+                        return price
+            except redis.RedisError:
+                logger.warning("Price cache unavailable, asking the provider for %s", coin_name, exc_info=True)
+                return self.provider.fetch_price(coin_name)
+
+            try:
+                price = self.provider.fetch_price(coin_name)
+                try:
+                    if price is None:
+                        self._store_missing(coin_name)
+                    else:
+                        self.publish_tick(coin_name, price)
+                except redis.RedisError:
+                    logger.warning("Could not publish %s price", coin_name, exc_info=True)
+                return price
+            finally:
+                if token is not None:
+                    self._release_shared_lock(coin_name, token)
+
+    @classmethod
+    def _refresh_lock(cls, coin_name: str) -> threading.Lock:
+        with cls._refresh_locks_guard:
+            return cls._refresh_locks.setdefault(coin_name, threading.Lock())
+
+    def _acquire_shared_lock(self, coin_name: str) -> Optional[str]:
+        """Take the coin's refresh lock; returns its token, or None if another process holds it"""
+        token = uuid.uuid4().hex
+        # Expires on its own so a crashed refresher never blocks the others
+        acquired = self.redis_client.set(
+            self.LOCK_KEY.format(coin_name), token,
+            nx=True, px=int(self.LOCK_TIMEOUT * 1000),
+        )
+        return token if acquired else None
+
+    def _release_shared_lock(self, coin_name: str, token: str) -> None:
+        # A refresh that outlived LOCK_TIMEOUT must not release the next holder's lock
+        try:
+            release_lock = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
+            release_lock(keys=[self.LOCK_KEY.format(coin_name)], args=[token])
+        except redis.RedisError:
+            logger.warning("Could not release the %s price lock", coin_name, exc_info=True)
+
+    def _wait_for_shared(self, coin_name: str):
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(self.LOCK_POLL_INTERVAL)
+            price = self._get_shared(coin_name)
+            if price is not _MISS:
+                return price
+        return _MISS
+
+
+class PriceTickListener(threading.Thread):
+    """Apply published price ticks to this process' price cache"""
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, redis_client, channel: str):
+        super().__init__(name='coin-price-ticks', daemon=True)
+        self.redis_client = redis_client
+        self.channel = channel
+        self.pid = os.getpid()
+        self.subscribed = False
+
+    def run(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.subscribed = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        CoinPriceService.apply_tick(message['data'])
+            except Exception:
+                # Fall back to the short local TTL until we are subscribed again
+                self.subscribed = False
+                logger.warning("Price tick listener disconnected", exc_info=True)
+                time.sleep(self.RECONNECT_DELAY)
@@ -0,0 +1,157 @@
+"""Wallet reconciliation, see the reconcile_wallets command.
+
+A wallet reconciles when its balance equals its ledger balance, the latest
+WalletBalanceSnapshot plus the entries after it as in
+WalletLedgerService.get_balance, and every debit for a failed order has
+been refunded. Users are checked in
+batches, either id ranges or lists of ids, with one aggregate query per
+batch; batches run in a process pool and the wallets that do not reconcile
+are recorded as ReconciliationDiscrepancy rows of the run.
+
+Incremental runs only recheck the users with ledger entries since the
+previous run or orders in batches failed since then, plus those it
+reported.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from typing import Callable, Iterator, List, Tuple
+
+import django
+from django.db.models import BigIntegerField, DecimalField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Order, ReconciliationDiscrepancy, ReconciliationRun, SettlementBatch, Wallet, WalletBalanceSnapshot,
+    WalletLedgerEntry,
+)
+from .services import WalletLedgerService
+
+
+def _ledger_total(**filters) -> Subquery:
+    return Subquery(
+        WalletLedgerEntry.objects.filter(user_id=OuterRef('user_id'), **filters)
+        .order_by().values('user_id').annotate(total=Sum('amount')).values('total')
+    )
+
+
+def _latest_snapshot(field: str, user_id=OuterRef('user_id')) -> Subquery:
+    return Subquery(
+        WalletBalanceSnapshot.objects.filter(user_id=user_id).order_by('-last_entry_id').values(field)[:1]
+    )
+
+
+def check_users(batch: Tuple[str, object]) -> Tuple[int, List[tuple]]:
+    """Check a batch of users, ('range', (first id, end id)) or ('users', [ids]).
+
+    Returns the number of wallets checked and the discrepancies found, as
+    (user id, kind, expected, actual). Everything is read in one statement,
+    so balances and ledger entries come from the same snapshot.
+    """
+    kind, users = batch
+    wallets = Wallet.objects.all()
+    if kind == 'range':
+        wallets = wallets.filter(user_id__gte=users[0], user_id__lt=users[1])
+    else:
+        wallets = wallets.filter(user_id__in=users)
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    snapshot_entry_id = Coalesce(
+        _latest_snapshot('last_entry_id', OuterRef(OuterRef('user_id'))), Value(0, output_field=BigIntegerField())
+    )
+    rows = wallets.annotate(
+        ledger=Coalesce(_latest_snapshot('balance'), zero) + Coalesce(_ledger_total(id__gt=snapshot_entry_id), zero),
+        failed_debits=Coalesce(
+            _ledger_total(kind=WalletLedgerEntry.DEBIT, order__status=Order.FAILED), zero
+        ),
+        refunds=Coalesce(_ledger_total(kind=WalletLedgerEntry.REFUND), zero),
+    ).values_list('user_id', 'balance', 'ledger', 'failed_debits', 'refunds')
+
+    checked = 0
+    discrepancies = []
+    for user_id, balance, ledger, failed_debits, refunds in rows.iterator():
+        checked += 1
+        if balance != ledger:
+            discrepancies.append((user_id, ReconciliationDiscrepancy.BALANCE_MISMATCH, ledger, balance))
+        # Debits are negative, refunds positive
+        if refunds < -failed_debits:
+            discrepancies.append((user_id, ReconciliationDiscrepancy.UNREFUNDED_FAILURES, -failed_debits, refunds))
+    return checked, discrepancies
+
+
+class WalletReconciler:
+    # Ledger entries and settlements this recent may belong to transactions
+    # still in flight; incremental runs look back this far past the checkpoint
+    CHECKPOINT_LAG = WalletLedgerService.COMPACTION_LAG
+
+    def __init__(self, workers: int = 1, batch_size: int = 10000, log: Callable[[str], None] = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def run(self, incremental: bool = True) -> ReconciliationRun:
+        previous = ReconciliationRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+        started_at = timezone.now()
+        run = ReconciliationRun.objects.create(
+            incremental=incremental and previous is not None,
+            started_at=started_at,
+            ledger_checkpoint=WalletLedgerEntry.objects.filter(
+                created_at__lt=started_at - self.CHECKPOINT_LAG,
+            ).aggregate(last=Max('id'))['last'] or 0,
+        )
+        batches = self._changed_users(previous) if run.incremental else self._user_ranges()
+
+        started = time.monotonic()
+        for checked, discrepancies in self._check(batches):
+            run.users_checked += checked
+            run.discrepancy_count += len(discrepancies)
+            ReconciliationDiscrepancy.objects.bulk_create([
+                ReconciliationDiscrepancy(run=run, user_id=user_id, kind=kind, expected=expected, actual=actual)
+                for user_id, kind, expected, actual in discrepancies
+            ])
+        elapsed = time.monotonic() - started
+
+        run.finished_at = timezone.now()
+        run.save(update_fields=['users_checked', 'discrepancy_count', 'finished_at'])
+        self.log(
+            f"Checked {run.users_checked} wallets in {elapsed:.1f}s "
+            f"({run.users_checked / max(elapsed, 1e-9):.0f}/s), {run.discrepancy_count} discrepancies"
+        )
+        return run
+
+    def _user_ranges(self) -> Iterator[tuple]:
+        bounds = Wallet.objects.aggregate(first=Min('user_id'), last=Max('user_id'))
+        if bounds['first'] is None:
+            return
+        for start in range(bounds['first'], bounds['last'] + 1, self.batch_size):
+            yield 'range', (start, start + self.batch_size)
+
+    def _changed_users(self, previous: ReconciliationRun) -> Iterator[tuple]:
+        since = previous.started_at - self.CHECKPOINT_LAG
+        users = set(
+            WalletLedgerEntry.objects.filter(id__gt=previous.ledger_checkpoint)
+            .values_list('user_id', flat=True).distinct()
+        )
+        # Completed orders cannot unbalance a wallet; orders failed outside a batch are left to full runs
+        failed_batches = SettlementBatch.objects.filter(status=SettlementBatch.FAILED, settled_at__gte=since)
+        users.update(
+            Order.objects.filter(batch__in=failed_batches).values_list('user_id', flat=True).distinct()
+        )
+        users.update(previous.discrepancies.values_list('user_id', flat=True))
+        users = sorted(users)
+        for start in range(0, len(users), self.batch_size):
+            yield 'users', users[start:start + self.batch_size]
+
+    def _check(self, batches: Iterator[tuple]) -> Iterator[Tuple[int, List[tuple]]]:
+        if self.workers <= 1:
+            yield from map(check_users, batches)
+            return
+        # Spawned workers set Django up and open their own connections;
+        # forked ones would share the parent's
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        ) as executor:
+            for future in as_completed([executor.submit(check_users, batch) for batch in batches]):
+                yield future.result()
+
@@ -1,120 +1,715 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
 from typing import List
 import json
-import redis
+import logging
+import time
+import uuid
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum
 from django.core.exceptions import ValidationError
-from .models import Order, Wallet
+from django.utils import timezone
+from . import metrics
+from .amounts import Amount, Money
+from .codec import PendingOrderCodec
+from .connections import get_async_redis_client, get_redis_client
+from .flush import FlushPolicy
+from .models import Order, SettlementBatch, Wallet, WalletBalanceSnapshot, WalletLedgerEntry
+from .partitions import coin_partition
+from .prices import CoinPriceService
+from .updates import OrderUpdateStream
 
+logger = logging.getLogger(__name__)
 
-class CoinPriceService:
-    # In a real application, this would fetch from a price feed
-    COIN_PRICES = {
-        'ABAN': Decimal('4.00'),
-    }
+# Atomically claim a coin's pending batch once its flush policy is met.
+# The pending set and its running totals are renamed to per-batch keys in one
+# step, so orders added afterwards land in a fresh set and a batch can only be
+# claimed by a single worker. The coin's flush deadline is dropped with the
+# claim, or moved to match the oldest order when the batch is not due yet.
+# The claimed members come with their scores, the orders' creation times.
+# KEYS: pending orders, pending totals, batch orders, batch totals, flush deadlines
+# ARGV: min amount (base units), max orders, now, max age (seconds), coin
+CLAIM_BATCH_SCRIPT = """
+local amount = redis.call('HGET', KEYS[2], 'amount')
+if not amount or tonumber(amount) <= 0 then
+    redis.call('ZREM', KEYS[5], ARGV[5])
+    return nil
+end
+local due = tonumber(amount) >= tonumber(ARGV[1])
+    or tonumber(redis.call('HGET', KEYS[2], 'count') or '0') >= tonumber(ARGV[2])
+if not due then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    local deadline = oldest[2] and tonumber(oldest[2]) + tonumber(ARGV[4])
+    if not deadline or deadline > tonumber(ARGV[3]) then
+        if deadline then
+            redis.call('ZADD', KEYS[5], deadline, ARGV[5])
+        end
+        return nil
+    end
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+redis.call('RENAME', KEYS[2], KEYS[4])
+redis.call('ZREM', KEYS[5], ARGV[5])
+return {amount, redis.call('ZRANGE', KEYS[3], 0, -1, 'WITHSCORES')}
+"""
+
+# Cache a wallet balance read from the database, unless a debit bumped the
+# wallet's version since the reader fetched it.
+# KEYS: cached balance, version; ARGV: balance (JSON), version read, ttl (ms)
+STORE_WALLET_BALANCE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+return 1
+"""
+
+
+class WalletLedgerService:
+    """Append-only wallet history with periodic balance snapshots.
+
+    A balance is the user's latest snapshot plus every ledger entry after
+    its last_entry_id. The compactor rolls new entries into fresh snapshots
+    so rebuilding a balance only reads the entries since the last run.
+    """
+    # Entries younger than this are left for the next compaction so that a
+    # transaction still holding a lower entry id can commit first
+    COMPACTION_LAG = timedelta(seconds=60)
+    COMPACTION_BATCH_SIZE = 1000
+
+    def record(self, entries: List[WalletLedgerEntry]) -> List[WalletLedgerEntry]:
+        return WalletLedgerEntry.objects.bulk_create(entries, batch_size=self.COMPACTION_BATCH_SIZE)
+
+    def get_balance(self, user) -> Decimal:
+        snapshot = (
+            WalletBalanceSnapshot.objects.filter(user=user)
+            .order_by('-last_entry_id')
+            .values('balance', 'last_entry_id')
+            .first()
+        ) or {'balance': Decimal('0'), 'last_entry_id': 0}
+        delta = WalletLedgerEntry.objects.filter(
+            user=user, id__gt=snapshot['last_entry_id']
+        ).aggregate(total=Sum('amount'))['total']
+        return snapshot['balance'] + (delta or Decimal('0'))
+
+    @transaction.atomic
+    def compact(self) -> int:
+        """Snapshot every wallet with entries since the last run; returns snapshots written"""
+        last_compacted_id = WalletBalanceSnapshot.objects.aggregate(
+            last=Max('last_entry_id')
+        )['last'] or 0
+        # Walks the primary key backwards over the last COMPACTION_LAG of entries only
+        cutoff_id = (
+            WalletLedgerEntry.objects.filter(created_at__lt=timezone.now() - self.COMPACTION_LAG)
+            .order_by('-id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if not cutoff_id or cutoff_id <= last_compacted_id:
+            return 0
+
+        deltas = (
+            WalletLedgerEntry.objects.filter(id__gt=last_compacted_id, id__lte=cutoff_id)
+            .values('user_id')
+            .annotate(delta=Sum('amount'))
+            .order_by('user_id')
+        )
+        latest_snapshot = WalletBalanceSnapshot.objects.filter(
+            user=OuterRef('pk')
+        ).order_by('-last_entry_id')
+
+        written = 0
+        for start in range(0, len(deltas), self.COMPACTION_BATCH_SIZE):
+            chunk = {row['user_id']: row['delta'] for row in deltas[start:start + self.COMPACTION_BATCH_SIZE]}
+            previous_balances = dict(
+                get_user_model().objects.filter(pk__in=chunk)
+                .annotate(balance=Subquery(latest_snapshot.values('balance')[:1]))
+                .values_list('pk', 'balance')
+            )
+            written += len(WalletBalanceSnapshot.objects.bulk_create([
+                WalletBalanceSnapshot(
+                    user_id=user_id,
+                    balance=(previous_balances.get(user_id) or Decimal('0')) + delta,
+                    last_entry_id=cutoff_id,
+                )
+                for user_id, delta in chunk.items()
+            ]))
+        return written
 
-    @classmethod
-    def get_coin_price(cls, coin_name: str) -> Decimal:
-        return cls.COIN_PRICES.get(coin_name)
+
+class WalletBalanceCache:
+    """Per-user Redis cache of the wallet balance and reserved amount.
+
+    Every debit bumps the user's version counter and drops the cached
+    balance as its transaction commits, before the response is sent. A
+    cached balance is only served while it carries the current version, and
+    a balance loaded from the database is only stored if the version did not
+    move meanwhile, so users never read a balance older than their own last
+    write. Settling orders lowers the reserved amount without a new version;
+    that shows up within WALLET_CACHE_TTL.
+    """
+    BALANCE_KEY = 'wallet_balance:{}'
+    VERSION_KEY = 'wallet_version:{}'
+    # Outlives any cached balance, so a version is never reused while it is cached
+    VERSION_TTL = 7 * 24 * 3600
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def get(self, user) -> dict:
+        """Balance, reserved amount and version of the user's wallet; raises Wallet.DoesNotExist"""
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(self.VERSION_KEY.format(user.pk))
+            pipe.get(self.BALANCE_KEY.format(user.pk))
+            version, cached = pipe.execute()
+        version = int(version or 0)
+        if cached:
+            cached = json.loads(cached)
+            if cached['version'] == version:
+                metrics.WALLET_CACHE_READS.labels('hit').inc()
+                return cached
+
+        metrics.WALLET_CACHE_READS.labels('miss').inc()
+        balance = self._load(user, version)
+        store = self.redis_client.register_script(STORE_WALLET_BALANCE_SCRIPT)
+        store(
+            keys=[self.BALANCE_KEY.format(user.pk), self.VERSION_KEY.format(user.pk)],
+            args=[json.dumps(balance), version, int(settings.WALLET_CACHE_TTL * 1000)],
+        )
+        return balance
+
+    @staticmethod
+    def _load(user, version: int) -> dict:
+        balance = Wallet.objects.values_list('balance', flat=True).get(user=user)
+        # Orders are paid for when placed; their value stays reserved until settled
+        debited = WalletLedgerEntry.objects.filter(
+            user=user, kind=WalletLedgerEntry.DEBIT, order__status=Order.PENDING,
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        return {
+            'balance': str(Money.from_decimal(balance)),
+            'reserved': str(Money.from_decimal(-debited)),
+            'version': version,
+        }
+
+    def invalidate(self, user_id: int) -> None:
+        version_key = self.VERSION_KEY.format(user_id)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, self.VERSION_TTL)
+            pipe.delete(self.BALANCE_KEY.format(user_id))
+            pipe.execute()
 
 
 class OrderService:
     MIN_EXCHANGE_ORDER_VALUE = Decimal('10.00')
+    # Streams of "coin may be ready" events, one per partition, consumed by the settlement workers
+    SETTLEMENT_STREAM_KEY = 'settlement_events:{}'
+    SETTLEMENT_STREAM_MAXLEN = 10000
+    # Orders are linked to their settlement batch this many ids per UPDATE
+    BATCH_ASSIGN_CHUNK_SIZE = 1000
+    # Most lost orders put back in Redis per sweep
+    REQUEUE_BATCH_SIZE = 1000
+    CREATED_AT_SLACK = timedelta(milliseconds=1)
 
     def __init__(self):
-        self.coin_price_service = CoinPriceService()
-        self.redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-            decode_responses=True
-        )
+        self.redis_client = get_redis_client()
+        self.coin_price_service = CoinPriceService(redis_client=self.redis_client)
+        self.ledger_service = WalletLedgerService()
+
+    @property
+    def wallet_cache(self) -> WalletBalanceCache:
+        return WalletBalanceCache(self.redis_client)
 
     @transaction.atomic
     def create_order(self, user, coin_name: str, amount: Decimal) -> Order:
-        price = self.coin_price_service.get_coin_price(coin_name)
+        price = self._check_price(coin_name, self.coin_price_service.get_coin_price(coin_name))
+        order = self._record_order(user, coin_name, amount, price)
+
+        # Enqueue the order once the debit is committed; settlement itself runs
+        # in the settlement worker, off the request path. A failed enqueue is
+        # logged and the order is picked up by requeue_lost_orders later.
+        transaction.on_commit(lambda: self._enqueue_pending_orders([order], {coin_name: price}), robust=True)
+
+        return order
+
+    @staticmethod
+    def _check_price(coin_name: str, price: Decimal) -> Decimal:
         if not price:
+            metrics.ORDERS_REJECTED.labels('invalid_coin').inc()
             raise ValidationError(f"Invalid coin: {coin_name}")
+        return price
 
-        total_value = price * amount
+    def _record_order(self, user, coin_name: str, amount: Decimal, price: Decimal) -> Order:
+        """Debit the wallet, insert the order and its ledger entry; call inside a transaction"""
+        total_value = Amount.from_decimal(amount).value_at(price)
 
         # Check and update user's wallet
-        wallet = Wallet.objects.select_for_update().get(user=user)
-        if wallet.balance < total_value:
-            raise ValidationError("Insufficient funds")
-
-        wallet.balance -= total_value
-        wallet.save()
+        debited = self._debit_wallet(user, total_value)
 
         # Create order
-        order = Order.objects.create(
-            user=user,
-            coin_name=coin_name,
-            amount=amount,
-            status=Order.PENDING
-        )
+        with metrics.ORDER_INSERT_SECONDS.time():
+            order = Order.objects.create(
+                user=user,
+                coin_name=coin_name,
+                amount=amount,
+                status=Order.PENDING
+            )
+        with metrics.LEDGER_INSERT_SECONDS.time():
+            self.ledger_service.record([
+                WalletLedgerEntry(user=user, kind=WalletLedgerEntry.DEBIT, amount=(-debited).to_decimal(), order=order),
+            ])
+        metrics.ORDERS_CREATED.labels(coin_name).inc()
+        return order
+
+    @transaction.atomic
+    def create_orders(self, user, items: List[dict]) -> List[dict]:
+        """Place many orders with one wallet debit, one insert and one Redis pipeline.
+
+        Items with an unknown coin are rejected on their own; the rest are
+        debited together and either all succeed or all fail. Returns one
+        result per item, in input order.
+        """
+        results = []
+        orders = []
+        debits = []
+        prices = {}
+        for index, item in enumerate(items):
+            coin_name, amount = item['coin_name'], item['amount']
+            if coin_name not in prices:
+                prices[coin_name] = self.coin_price_service.get_coin_price(coin_name)
+            price = prices[coin_name]
+            if not price:
+                metrics.ORDERS_REJECTED.labels('invalid_coin').inc()
+                results.append({'index': index, 'error': f"Invalid coin: {coin_name}"})
+                continue
+            results.append({'index': index, 'order': None})
+            orders.append(Order(user=user, coin_name=coin_name, amount=amount, status=Order.PENDING))
+            debits.append(Amount.from_decimal(amount).value_at(price))
 
-        # Add order to Redis
-        self._add_pending_order_to_redis(order)
+        if not orders:
+            return results
+
+        self._debit_wallet(user, sum(debits))
+        with metrics.ORDER_INSERT_SECONDS.time():
+            orders = Order.objects.bulk_create(orders)
+        with metrics.LEDGER_INSERT_SECONDS.time():
+            self.ledger_service.record([
+                WalletLedgerEntry(user=user, kind=WalletLedgerEntry.DEBIT, amount=(-debited).to_decimal(), order=order)
+                for order, debited in zip(orders, debits)
+            ])
+        for order in orders:
+            metrics.ORDERS_CREATED.labels(order.coin_name).inc()
+
+        created = iter(orders)
+        for result in results:
+            if 'order' in result:
+                result['order'] = next(created)
+
+        transaction.on_commit(lambda: self._enqueue_pending_orders(orders, prices), robust=True)
+
+        return results
+
+    def _debit_wallet(self, user, value: Money) -> Money:
+        """Debit the wallet with a single conditional UPDATE.
+
+        The balance check and the write happen in the same statement, so the
+        row lock is only taken by the UPDATE itself and no SELECT is needed.
+        """
+        amount = value.to_decimal()
+        with metrics.WALLET_DEBIT_SECONDS.time():
+            updated = Wallet.objects.filter(user=user, balance__gte=amount).update(
+                balance=F('balance') - amount
+            )
+        if not updated:
+            if not Wallet.objects.filter(user=user).exists():
+                metrics.ORDERS_REJECTED.labels('no_wallet').inc()
+                raise Wallet.DoesNotExist("Wallet matching query does not exist.")
+            metrics.ORDERS_REJECTED.labels('insufficient_funds').inc()
+            raise ValidationError("Insufficient funds")
+        # Failing this only leaves the cached balance stale until WALLET_CACHE_TTL
+        transaction.on_commit(lambda: self.wallet_cache.invalidate(user.pk), robust=True)
+        return value
+
+    def settle_pending_orders(self, coin_name: str) -> None:
+        """Settle the coin's pending batch if ready; used by the settlement worker"""
         self._process_pending_orders(coin_name)
 
-        return order
+    def requeue_lost_orders(self, partitions) -> int:
+        """Put pending orders of the given coin partitions that Redis lost track of back in their pending set.
+
+        Orders are enqueued after their debit commits, so an order whose
+        enqueue failed, or whose batch was claimed by a worker that died
+        before recording it, stays PENDING without a batch and nothing would
+        settle it. Such orders older than SETTLEMENT_SWEEP_AGE and missing
+        from their pending set are added again; their flush deadline has
+        already passed, so the next flush settles them. Returns the number
+        of orders requeued.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.SETTLEMENT_SWEEP_AGE)
+        # Served by the small orders_order_unbatched_idx partial index
+        candidates = [
+            order for order in Order.objects.filter(status=Order.PENDING, batch__isnull=True, created_at__lt=cutoff)
+            .only('id', 'coin_name', 'amount', 'created_at').order_by('created_at')[:self.REQUEUE_BATCH_SIZE]
+            if coin_partition(order.coin_name) in partitions
+        ]
+        if not candidates:
+            return 0
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for order in candidates:
+                pipe.zscore(
+                    self._pending_orders_key(order.coin_name),
+                    PendingOrderCodec.encode(order.id, Amount.from_decimal(order.amount)),
+                )
+            lost = [order for order, score in zip(candidates, pipe.execute()) if score is None]
+        if lost:
+            logger.warning("Requeueing %d pending orders missing from Redis: %s", len(lost), [o.id for o in lost])
+            self._add_pending_orders_to_redis(lost)
+        return len(lost)
+
+    def fail_stale_batches(self, partitions) -> int:
+        """Fail the settlement batches of the given coin partitions that a worker left PENDING.
+
+        A worker that dies after recording its batch, and before the
+        exchange result, leaves the batch and its orders PENDING with nothing
+        to finish them. Batches still pending after SETTLEMENT_SWEEP_AGE are
+        marked FAILED with their orders, which puts them in front of the
+        refunds and the next reconciliation run. Returns the number of
+        batches failed.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.SETTLEMENT_SWEEP_AGE)
+        stale = [
+            batch for batch in SettlementBatch.objects.filter(
+                status=SettlementBatch.PENDING, settled_at__isnull=True, created_at__lt=cutoff,
+            ).order_by('created_at')[:self.REQUEUE_BATCH_SIZE]
+            if coin_partition(batch.coin_name) in partitions
+        ]
+        for batch in stale:
+            # The exchange may have filled the batch; its reference is the order id there
+            logger.error(
+                "Failing settlement batch %s of %s left pending since %s (exchange reference %s)",
+                batch.pk, batch.coin_name, batch.created_at, batch.exchange_reference,
+            )
+            self._finish_settlement_batch(batch, SettlementBatch.FAILED)
+        return len(stale)
 
-    def _add_pending_order_to_redis(self, order: Order) -> None:
-        """Add a pending order to Redis"""
-        pending_orders_key = f"pending_orders:{order.coin_name}"
-        order_data = {
-            'id': order.id,
-            'amount': str(order.amount)  # Convert Decimal to string for JSON serialization
+    def rebuild_pending_totals(self) -> dict:
+        """Recompute the running totals of every pending set from its members.
+
+        Sets written before the totals existed have no pending_totals hash, so
+        the claim script would never settle them, or would settle a later
+        order's totals for the whole set. Each set is rebuilt under WATCH,
+        so concurrent enqueues and claims are retried rather than lost.
+        Returns the number of pending orders per coin.
+        """
+        rebuilt = {}
+        for pending_orders_key in self.redis_client.scan_iter(match=self._pending_orders_key('*')):
+            coin_name = pending_orders_key.split(':', 1)[1]
+            pending_totals_key = self._pending_totals_key(coin_name)
+
+            def rebuild(pipe):
+                members = pipe.zrange(pending_orders_key, 0, -1, withscores=True)
+                pipe.multi()
+                pipe.delete(pending_totals_key)
+                if members:
+                    amount = sum(PendingOrderCodec.decode(member)[1] for member, _ in members)
+                    pipe.hincrby(pending_totals_key, 'amount', amount.units)
+                    pipe.hincrby(pending_totals_key, 'count', len(members))
+                    pipe.zadd(
+                        self._flush_deadlines_key(coin_partition(coin_name)),
+                        {coin_name: members[0][1] + self._flush_policy(coin_name).max_age},
+                        nx=True,
+                    )
+                rebuilt[coin_name] = len(members)
+
+            self.redis_client.transaction(rebuild, pending_orders_key)
+        return rebuilt
+
+    @staticmethod
+    def _pending_orders_key(coin_name: str) -> str:
+        return f"pending_orders:{coin_name}"
+
+    @staticmethod
+    def _pending_totals_key(coin_name: str) -> str:
+        return f"pending_totals:{coin_name}"
+
+    @staticmethod
+    def _flush_deadlines_key(partition: int) -> str:
+        return f"pending_deadlines:{partition}"
+
+    def _flush_policy(self, coin_name: str) -> FlushPolicy:
+        return FlushPolicy.for_coin(coin_name, min_value=self.MIN_EXCHANGE_ORDER_VALUE)
+
+    def _enqueue_pending_orders(self, orders: List[Order], prices: dict) -> None:
+        """Add orders to Redis and wake the settlement worker for coins whose batch is ready"""
+        with metrics.REDIS_ENQUEUE_SECONDS.time():
+            totals = self._add_pending_orders_to_redis(orders)
+            for coin_name in self._ready_coins(totals, prices):
+                self._publish_settlement_event(coin_name)
+
+    def _ready_coins(self, totals: dict, prices: dict) -> List[str]:
+        return [
+            coin_name for coin_name, (amount, count) in totals.items()
+            if self._flush_policy(coin_name).is_ready(amount, count, prices[coin_name])
+        ]
+
+    def _publish_settlement_event(self, coin_name: str) -> None:
+        metrics.REDIS_ROUND_TRIPS.labels('publish').inc()
+        self.redis_client.xadd(**self._settlement_event(coin_name))
+
+    def _settlement_event(self, coin_name: str) -> dict:
+        return {
+            'name': self._settlement_stream_key(coin_partition(coin_name)),
+            'fields': {'coin': coin_name},
+            'maxlen': self.SETTLEMENT_STREAM_MAXLEN,
+            'approximate': True,
         }
 
-        # Use Redis transaction to ensure atomicity
+    @classmethod
+    def _settlement_stream_key(cls, partition: int) -> str:
+        return cls.SETTLEMENT_STREAM_KEY.format(partition)
+
+    def _add_pending_order_to_redis(self, order: Order) -> tuple[Amount, int]:
+        """Add a pending order to Redis and return the coin's new pending (amount, count)"""
+        return self._add_pending_orders_to_redis([order])[order.coin_name]
+
+    def _add_pending_orders_to_redis(self, orders: List[Order]) -> dict:
+        """Add pending orders to Redis in one round trip.
+
+        Returns the new pending (amount, count) of every coin touched.
+        """
+        # Use Redis transaction so the sets and their running totals never drift apart
         with self.redis_client.pipeline() as pipe:
             pipe.multi()
-            # Add order to sorted set with timestamp as score for order preservation
-            pipe.zadd(pending_orders_key, {json.dumps(order_data): order.created_at.timestamp()})
-            pipe.execute()
+            coins = self._queue_pending_orders(pipe, orders)
+            results = pipe.execute()
+        metrics.REDIS_ROUND_TRIPS.labels('enqueue').inc()
+        return self._pending_totals_from_results(coins, results)
 
-    def _process_pending_orders(self, coin_name: str) -> None:
-        """Process pending orders from Redis"""
-        pending_orders_key = f"pending_orders:{coin_name}"
+    def _queue_pending_orders(self, pipe, orders: List[Order]) -> List[str]:
+        """Queue the commands adding orders to their pending sets; returns the coins in queue order"""
+        members = {}
+        amounts = {}
+        oldest = {}
+        for order in orders:
+            amount = Amount.from_decimal(order.amount)
+            member = PendingOrderCodec.encode(order.id, amount)
+            # Timestamp as score for order preservation
+            members.setdefault(order.coin_name, {})[member] = order.created_at.timestamp()
+            amounts[order.coin_name] = amounts.get(order.coin_name, 0) + amount
+            oldest[order.coin_name] = min(oldest.get(order.coin_name, float('inf')), order.created_at.timestamp())
 
-        # Get all pending orders for this coin
-        pending_orders_data = self.redis_client.zrange(pending_orders_key, 0, -1)
+        for coin_name, mapping in members.items():
+            pending_totals_key = self._pending_totals_key(coin_name)
+            pipe.zadd(self._pending_orders_key(coin_name), mapping)
+            pipe.hincrby(pending_totals_key, 'amount', amounts[coin_name].units)
+            pipe.hincrby(pending_totals_key, 'count', len(mapping))
+            # NX keeps the deadline of the oldest order already pending
+            pipe.zadd(
+                self._flush_deadlines_key(coin_partition(coin_name)),
+                {coin_name: oldest[coin_name] + self._flush_policy(coin_name).max_age},
+                nx=True,
+            )
+        return list(members)
 
-        if not pending_orders_data:
-            return
+    @staticmethod
+    def _pending_totals_from_results(coins: List[str], results: list) -> dict:
+        # Each coin queued zadd, hincrby(amount), hincrby(count), zadd(deadline)
+        return {
+            coin_name: (Amount(results[i * 4 + 1]), int(results[i * 4 + 2]))
+            for i, coin_name in enumerate(coins)
+        }
+
+    def _get_pending_totals(self, coin_name: str) -> tuple[Amount, int]:
+        """Return the (amount, count) of pending orders for a coin in one read"""
+        amount_units, count = self.redis_client.hmget(
+            self._pending_totals_key(coin_name), 'amount', 'count'
+        )
+        return Amount(amount_units or 0), int(count or 0)
+
+    @staticmethod
+    def _batch_orders_key(coin_name: str, batch_id: str) -> str:
+        return f"pending_batch:{coin_name}:{batch_id}"
+
+    @staticmethod
+    def _batch_totals_key(coin_name: str, batch_id: str) -> str:
+        return f"pending_batch_totals:{coin_name}:{batch_id}"
+
+    def _claim_batch(self, coin_name: str, batch_id: str, policy: FlushPolicy, price: Decimal):
+        """Move the pending set into a per-batch key if the flush policy is met.
+
+        Returns (amount, members, created range) for the claimed batch, or
+        None when there is nothing to settle or another worker already
+        claimed it. The created range bounds the creation times of the
+        claimed orders.
+        """
+        claim_batch = self.redis_client.register_script(CLAIM_BATCH_SCRIPT)
+        metrics.REDIS_ROUND_TRIPS.labels('claim').inc()
+        claimed = claim_batch(
+            keys=[
+                self._pending_orders_key(coin_name),
+                self._pending_totals_key(coin_name),
+                self._batch_orders_key(coin_name, batch_id),
+                self._batch_totals_key(coin_name, batch_id),
+                self._flush_deadlines_key(coin_partition(coin_name)),
+            ],
+            args=[policy.min_amount(price).units, policy.max_orders, time.time(), policy.max_age, coin_name],
+        )
+        if not claimed:
+            return None
+        amount_units, members_with_scores = claimed
+        scores = [float(score) for score in members_with_scores[1::2]]
+        # Scores are float timestamps; widen the range past their rounding
+        created_range = (
+            datetime.fromtimestamp(min(scores), tz=dt_timezone.utc) - self.CREATED_AT_SLACK,
+            datetime.fromtimestamp(max(scores), tz=dt_timezone.utc) + self.CREATED_AT_SLACK,
+        )
+        return Amount(amount_units), members_with_scores[0::2], created_range
 
-        total_amount = Decimal('0')
-        order_ids = []
+    def _process_pending_orders(self, coin_name: str) -> None:
+        """Claim and settle the pending batch for a coin if its flush policy is met"""
+        price = self.coin_price_service.get_coin_price(coin_name)
 
-        # Calculate total amount and collect order IDs
-        for order_json in pending_orders_data:
-            order_data = json.loads(order_json)
-            total_amount += Decimal(order_data['amount'])
-            order_ids.append(order_data['id'])
+        batch_id = uuid.uuid4().hex
+        with metrics.THRESHOLD_EVALUATION_SECONDS.time():
+            claimed = self._claim_batch(coin_name, batch_id, self._flush_policy(coin_name), price)
+        if claimed is None:
+            return
+
+        amount, pending_orders_data, created_range = claimed
+        total_value = amount.value_at(price).to_decimal()
+        order_ids = [PendingOrderCodec.decode_id(member) for member in pending_orders_data]
 
-        total_value = total_amount * self.coin_price_service.get_coin_price(coin_name)
+        batch = None
+        try:
+            batch = self._create_settlement_batch(coin_name, batch_id, amount, total_value, order_ids, created_range)
 
-        if total_value >= self.MIN_EXCHANGE_ORDER_VALUE:
-            try:
-                # Execute the exchange order
+            # Execute the exchange order
+            with metrics.EXCHANGE_BUY_SECONDS.time():
                 self._buy_from_exchange(coin_name, total_value)
+            metrics.EXCHANGE_BUYS.labels(coin_name, 'success').inc()
+
+            # Update orders in database
+            self._finish_settlement_batch(batch, SettlementBatch.COMPLETED, created_range)
 
-                # Update orders in database
-                Order.objects.filter(id__in=order_ids).update(status=Order.COMPLETED)
+        except Exception as e:
+            metrics.EXCHANGE_BUYS.labels(coin_name, 'failure').inc()
+            # Mark orders as failed in database
+            if batch is None:
+                orders = self._claimed_orders(created_range).filter(id__in=order_ids)
+                orders.update(status=Order.FAILED)
+                self._publish_order_updates(orders, Order.FAILED)
+            else:
+                self._finish_settlement_batch(batch, SettlementBatch.FAILED, created_range)
+            raise e
 
-                # Remove processed orders from Redis
-                self.redis_client.delete(pending_orders_key)
+        finally:
+            # The batch keys only hold the claimed orders, so dropping them can
+            # never lose an order that arrived during settlement
+            self.redis_client.delete(
+                self._batch_orders_key(coin_name, batch_id),
+                self._batch_totals_key(coin_name, batch_id),
+            )
 
-            except Exception as e:
-                # Mark orders as failed in database
-                Order.objects.filter(id__in=order_ids).update(status=Order.FAILED)
-                # Remove failed orders from Redis
-                self.redis_client.delete(pending_orders_key)
-                raise e
+    @staticmethod
+    def _claimed_orders(created_range: tuple = None):
+        """Orders bounded by creation time, so that only their partitions are visited"""
+        if created_range is None:
+            return Order.objects.all()
+        return Order.objects.filter(created_at__range=created_range)
+
+    @transaction.atomic
+    def _create_settlement_batch(
+        self, coin_name: str, batch_id: str, amount: Amount, total_value: Decimal, order_ids: List[int],
+        created_range: tuple = None,
+    ) -> SettlementBatch:
+        """Record the claimed batch and link its orders to it in bounded chunks"""
+        batch = SettlementBatch.objects.create(
+            coin_name=coin_name,
+            amount=amount.to_decimal(),
+            value=total_value,
+            order_count=len(order_ids),
+            exchange_reference=batch_id,
+        )
+        for start in range(0, len(order_ids), self.BATCH_ASSIGN_CHUNK_SIZE):
+            self._claimed_orders(created_range).filter(
+                id__in=order_ids[start:start + self.BATCH_ASSIGN_CHUNK_SIZE]
+            ).update(batch=batch)
+        return batch
+
+    @transaction.atomic
+    def _finish_settlement_batch(self, batch: SettlementBatch, status: str, created_range: tuple = None) -> None:
+        """Set the batch and all of its orders to status with one indexed update each.
+
+        Only a PENDING batch is finished, so a worker that outlived its batch
+        cannot overwrite the outcome fail_stale_batches recorded.
+        """
+        settled_at = timezone.now()
+        if not SettlementBatch.objects.filter(pk=batch.pk, status=SettlementBatch.PENDING).update(
+            status=status, settled_at=settled_at
+        ):
+            logger.error("Settlement batch %s was already finished; not marking it %s", batch.pk, status)
+            return
+        batch.status = status
+        batch.settled_at = settled_at
+        # Batch and order statuses share the same values
+        orders = self._claimed_orders(created_range).filter(batch=batch)
+        orders.update(status=status)
+        self._publish_order_updates(orders, status)
+
+    def _publish_order_updates(self, orders, status: str) -> None:
+        """Tell the owners' order event streams about the new status once it is committed"""
+        updates = list(orders.values_list('id', 'user_id'))
+        transaction.on_commit(lambda: OrderUpdateStream(self.redis_client).publish(updates, status), robust=True)
 
     def _buy_from_exchange(self, coin_name: str, total_value: Decimal) -> None:
         # Implementation for external exchange interaction
         pass
+
+
+class AsyncOrderService:
+    """Order creation for the async API views.
+
+    Redis is used through redis.asyncio on the event loop. The wallet debit,
+    order insert and ledger entry still run in one sync transaction through
+    sync_to_async, because the async ORM has no transactions; the orders are
+    enqueued once that transaction has committed.
+    """
+
+    def __init__(self, order_service: OrderService = None, redis_client=None):
+        self.order_service = order_service or OrderService()
+        self.redis_client = redis_client or get_async_redis_client()
+
+    async def create_order(self, user, coin_name: str, amount: Decimal) -> Order:
+        price = self.order_service._check_price(coin_name, await self._get_coin_price(coin_name))
+        order = await sync_to_async(self._record_order)(user, coin_name, amount, price)
+        try:
+            await self._enqueue_pending_orders([order], {coin_name: price})
+        except Exception:
+            # The order is paid for; the settlement workers' sweep enqueues it later
+            logger.exception("Enqueueing order %s failed", order.pk)
+        return order
+
+    async def _get_coin_price(self, coin_name: str) -> Decimal:
+        # Fresh prices are served from the process cache without leaving the loop
+        price = CoinPriceService.get_local_price(coin_name)
+        if price is None:
+            price = await sync_to_async(self.order_service.coin_price_service.get_coin_price)(coin_name)
+        return price
+
+    def _record_order(self, user, coin_name: str, amount: Decimal, price: Decimal) -> Order:
+        with transaction.atomic():
+            return self.order_service._record_order(user, coin_name, amount, price)
+
+    async def _enqueue_pending_orders(self, orders: List[Order], prices: dict) -> None:
+        with metrics.REDIS_ENQUEUE_SECONDS.time():
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                coins = self.order_service._queue_pending_orders(pipe, orders)
+                results = await pipe.execute()
+            metrics.REDIS_ROUND_TRIPS.labels('enqueue').inc()
+            totals = self.order_service._pending_totals_from_results(coins, results)
+            for coin_name in self.order_service._ready_coins(totals, prices):
+                metrics.REDIS_ROUND_TRIPS.labels('publish').inc()
+                await self.redis_client.xadd(**self.order_service._settlement_event(coin_name))
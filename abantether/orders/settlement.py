@@ -0,0 +1,243 @@
+import logging
+import os
+import socket
+import time
+
+import redis
+from django.conf import settings
+
+from .partitions import HashRing
+from .services import OrderService
+
+logger = logging.getLogger(__name__)
+
+
+# Extend every lease in KEYS still held by ARGV[1] to ARGV[2] ms; 1 per renewed lease, else 0
+RENEW_LEASES_SCRIPT = """
+local renewed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+        renewed[i] = 1
+    else
+        renewed[i] = 0
+    end
+end
+return renewed
+"""
+
+# Delete every lease in KEYS still held by ARGV[1]
+RELEASE_LEASES_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        released = released + redis.call('DEL', key)
+    end
+end
+return released
+"""
+
+
+class SettlementWorker:
+    """Consume "coin may be ready" events and settle pending batches.
+
+    Coins are hashed into SETTLEMENT_PARTITIONS partitions, each with its own
+    Redis Stream. Live workers heartbeat into WORKERS_KEY and partitions are
+    spread over them with a consistent hash ring; a worker only reads a
+    partition while it holds that partition's lease. When a worker stops or
+    dies its heartbeat and leases expire and the ring hands its partitions to
+    the others, which first replay the events it left unacknowledged.
+
+    Leases keep each coin on one worker so workers never contend on the
+    same coins; settlement stays safe even if two workers briefly overlap,
+    because batches are claimed atomically in OrderService.
+
+    Events only cover batches that reached their value or count limit. Every
+    SETTLEMENT_FLUSH_INTERVAL the worker also reads the flush deadlines of its
+    partitions and settles the coins whose oldest order reached its max age,
+    and every SETTLEMENT_SWEEP_INTERVAL it requeues the pending orders of its
+    partitions that never made it into Redis and fails the batches a dead
+    worker left pending.
+    """
+    GROUP_NAME = 'settlement'
+    WORKERS_KEY = 'settlement_workers'
+    LEASE_KEY = 'settlement_lease:{}'
+
+    def __init__(self, order_service: OrderService = None, consumer_name: str = None,
+                 block_ms: int = 5000, count: int = 100):
+        self.order_service = order_service or OrderService()
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.count = count
+        self.partitions = settings.SETTLEMENT_PARTITIONS
+        self.lease_ttl_ms = int(settings.SETTLEMENT_LEASE_TTL * 1000)
+        # Rebalance often enough that leases are renewed well before they expire
+        self.rebalance_interval = settings.SETTLEMENT_LEASE_TTL / 3
+        self.flush_interval = settings.SETTLEMENT_FLUSH_INTERVAL
+        self.sweep_interval = settings.SETTLEMENT_SWEEP_INTERVAL
+        self.block_ms = min(block_ms, int(min(self.rebalance_interval, self.flush_interval) * 1000))
+        self.owned = set()
+        self.running = False
+        self._replay = False
+
+    @property
+    def redis_client(self):
+        return self.order_service.redis_client
+
+    def stream_key(self, partition: int) -> str:
+        return self.order_service._settlement_stream_key(partition)
+
+    def ensure_group(self, partition: int) -> None:
+        try:
+            self.redis_client.xgroup_create(self.stream_key(partition), self.GROUP_NAME, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def live_workers(self) -> list:
+        now = time.time()
+        self.redis_client.zremrangebyscore(self.WORKERS_KEY, '-inf', now)
+        return self.redis_client.zrangebyscore(self.WORKERS_KEY, now, '+inf')
+
+    def rebalance(self) -> None:
+        """Heartbeat, then release, renew and acquire leases to match the hash ring"""
+        self.redis_client.zadd(self.WORKERS_KEY, {self.consumer_name: time.time() + self.lease_ttl_ms / 1000})
+        ring = HashRing(self.live_workers())
+        wanted = {p for p in range(self.partitions) if ring.owner(str(p)) == self.consumer_name}
+
+        self._release(self.owned - wanted)
+        kept = sorted(self.owned & wanted)
+        if kept:
+            renew = self.redis_client.register_script(RENEW_LEASES_SCRIPT)
+            renewed = renew(keys=[self.LEASE_KEY.format(p) for p in kept], args=[self.consumer_name, self.lease_ttl_ms])
+            lost = {p for p, ok in zip(kept, renewed) if not int(ok)}
+            if lost:
+                logger.warning("Settlement worker %s lost partitions %s", self.consumer_name, sorted(lost))
+        else:
+            lost = set()
+        self.owned = (self.owned & wanted) - lost
+
+        # A lease still held by a previous owner is retried on the next rebalance
+        candidates = sorted(wanted - self.owned)
+        with self.redis_client.pipeline() as pipe:
+            for p in candidates:
+                pipe.set(self.LEASE_KEY.format(p), self.consumer_name, nx=True, px=self.lease_ttl_ms)
+            acquired = [p for p, ok in zip(candidates, pipe.execute()) if ok]
+        for p in acquired:
+            self.ensure_group(p)
+            self._claim_pending(p)
+        if acquired:
+            logger.info("Settlement worker %s acquired partitions %s", self.consumer_name, acquired)
+            self.owned.update(acquired)
+            self._replay = True
+
+    def _claim_pending(self, partition: int) -> None:
+        """Take over the events a previous owner read but never acknowledged"""
+        start_id = '0-0'
+        while True:
+            start_id = self.redis_client.xautoclaim(
+                self.stream_key(partition), self.GROUP_NAME, self.consumer_name,
+                min_idle_time=0, start_id=start_id, count=self.count,
+            )[0]
+            if start_id == '0-0':
+                return
+
+    def _release(self, partitions) -> None:
+        if not partitions:
+            return
+        release = self.redis_client.register_script(RELEASE_LEASES_SCRIPT)
+        release(keys=[self.LEASE_KEY.format(p) for p in partitions], args=[self.consumer_name])
+        self.owned -= set(partitions)
+
+    def run_once(self, pending: bool = False) -> int:
+        """Read one batch of events from the owned partitions, settle each coin once and ack them.
+
+        With pending=True the events this consumer read but never acked (for
+        example before a crash, or claimed from a previous owner) are replayed
+        instead of new ones.
+        """
+        if not self.owned:
+            if not pending:
+                time.sleep(self.block_ms / 1000)
+            return 0
+
+        response = self.redis_client.xreadgroup(
+            self.GROUP_NAME,
+            self.consumer_name,
+            {self.stream_key(p): '0' if pending else '>' for p in sorted(self.owned)},
+            count=self.count,
+            block=None if pending else self.block_ms,
+        )
+        entries = [(stream, entry) for stream, stream_entries in response or [] for entry in stream_entries]
+        if not entries:
+            return 0
+
+        # Many events for the same coin collapse into a single settlement;
+        # entries trimmed from the stream come back without fields
+        self._settle(dict.fromkeys(fields['coin'] for _, (_, fields) in entries if fields))
+
+        acks = {}
+        for stream, (entry_id, _) in entries:
+            acks.setdefault(stream, []).append(entry_id)
+        for stream, entry_ids in acks.items():
+            self.redis_client.xack(stream, self.GROUP_NAME, *entry_ids)
+        return len(entries)
+
+    def flush_due(self) -> int:
+        """Settle the coins of the owned partitions whose flush deadline has passed"""
+        if not self.owned:
+            return 0
+        now = time.time()
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for p in sorted(self.owned):
+                pipe.zrangebyscore(self.order_service._flush_deadlines_key(p), '-inf', now, start=0, num=self.count)
+            coins = [coin_name for due in pipe.execute() for coin_name in due]
+        self._settle(coins)
+        return len(coins)
+
+    def sweep(self) -> int:
+        """Requeue the lost pending orders and fail the stale batches of the owned partitions"""
+        if not self.owned:
+            return 0
+        swept = 0
+        try:
+            swept += self.order_service.requeue_lost_orders(self.owned)
+        except Exception:
+            logger.exception("Sweep for lost pending orders failed")
+        try:
+            swept += self.order_service.fail_stale_batches(self.owned)
+        except Exception:
+            logger.exception("Sweep for stale settlement batches failed")
+        return swept
+
+    def _settle(self, coins) -> None:
+        for coin_name in coins:
+            try:
+                self.order_service.settle_pending_orders(coin_name)
+            except Exception:
+                logger.exception("Settlement failed for %s", coin_name)
+
+    def run(self) -> None:
+        self.running = True
+        next_rebalance = next_flush = next_sweep = 0
+        try:
+            while self.running:
+                if time.monotonic() >= next_rebalance:
+                    self.rebalance()
+                    next_rebalance = time.monotonic() + self.rebalance_interval
+                if time.monotonic() >= next_flush:
+                    self.flush_due()
+                    next_flush = time.monotonic() + self.flush_interval
+                if time.monotonic() >= next_sweep:
+                    self.sweep()
+                    next_sweep = time.monotonic() + self.sweep_interval
+                if self._replay:
+                    self._replay = bool(self.run_once(pending=True))
+                else:
+                    self.run_once()
+        finally:
+            # Hand the partitions over right away instead of waiting for the leases to expire
+            self._release(set(self.owned))
+            self.redis_client.zrem(self.WORKERS_KEY, self.consumer_name)
+
+    def stop(self, *args) -> None:
+        self.running = False
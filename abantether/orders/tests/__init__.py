@@ -1,2 +1,22 @@
 from .test_order_service import OrderServiceTestCase
 from .test_multiple_orders import MultipleOrdersTestCase
+from .test_settlement_worker import SettlementWorkerTestCase
+from .test_connections import RedisClientRegistryTestCase
+from .test_wallet_ledger import WalletLedgerTestCase
+from .test_bulk_orders import BulkOrdersTestCase
+from .test_order_history import OrderHistoryTestCase
+from .test_coin_prices import CoinPriceServiceTestCase
+from .test_benchmarks import BenchmarksTestCase
+from .test_metrics import MetricsTestCase
+from .test_codec import PendingOrderCodecTestCase
+from .test_amounts import AmountTestCase
+from .test_idempotency import IdempotencyTestCase
+from .test_async_orders import AsyncOrdersTestCase
+from .test_warmup import WarmupTestCase
+from .test_wallet_balance import WalletBalanceTestCase
+from .test_order_events import OrderEventsTestCase
+from .test_order_partitions import OrderPartitionsTestCase
+from .test_archive import OrderArchiveTestCase
+from .test_order_export import OrderExportTestCase
+from .test_reconciliation import ReconciliationTestCase
+from .test_redis_scripts import RedisScriptsTestCase
@@ -0,0 +1,36 @@
+from decimal import Decimal, ROUND_CEILING
+from django.test import SimpleTestCase
+from abantether.orders.amounts import Amount, Money
+
+
+class AmountTestCase(SimpleTestCase):
+    def test_round_trip_is_lossless(self):
+        for value in ['0', '0.00000001', '1.23456789', '-3.5', '12345678901.00000001']:
+            self.assertEqual(Amount.from_decimal(Decimal(value)).to_decimal(), Decimal(value))
+
+    def test_to_decimal_has_field_precision(self):
+        self.assertEqual(str(Amount.from_decimal('1').to_decimal()), '1.00000000')
+        self.assertEqual(str(Money.from_decimal('96').to_decimal()), '96.00')
+
+    def test_inexact_conversion_needs_rounding(self):
+        with self.assertRaises(ValueError):
+            Money.from_decimal('0.005')
+
+        self.assertEqual(Money.from_decimal('0.005', rounding=ROUND_CEILING), Money(1))
+
+    def test_integer_arithmetic(self):
+        total = sum([Amount.from_decimal('0.1')] * 10)
+
+        self.assertEqual(total, Amount.from_decimal('1'))
+        self.assertEqual(total - Amount(1), Amount(99999999))
+        self.assertGreater(total, Amount.from_decimal('0.99999999'))
+
+    def test_types_do_not_mix(self):
+        with self.assertRaises(TypeError):
+            Amount(1) + Money(1)
+        self.assertNotEqual(Amount(1), Money(1))
+
+    def test_value_at_rounds_half_even(self):
+        self.assertEqual(Amount.from_decimal('0.125').value_at(Decimal('1')), Money.from_decimal('0.12'))
+        self.assertEqual(Amount.from_decimal('0.135').value_at(Decimal('1')), Money.from_decimal('0.14'))
+        self.assertEqual(Amount.from_decimal('2.5').value_at(Decimal('4.00')), Money.from_decimal('10'))
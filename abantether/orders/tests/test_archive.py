@@ -0,0 +1,153 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from abantether.orders.archive import OrderArchiver, file_sha256, unfinished_cutoff, verify
+from abantether.orders.models import Order, ReconciliationDiscrepancy, Wallet, WalletLedgerEntry
+from abantether.orders.reconciliation import WalletReconciler
+
+User = get_user_model()
+
+
+class OrderArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        self.old = datetime(2026, 1, 15, tzinfo=timezone.utc)
+        self.new = datetime(2026, 6, 15, tzinfo=timezone.utc)
+
+    def create_order(self, status, created_at):
+        order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('1'), status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def archiver(self, **kwargs):
+        return OrderArchiver(self.output, date(2026, 3, 1), chunk_size=2, file_rows=3, **kwargs)
+
+    def read_part(self, archiver, name):
+        with gzip.open(os.path.join(archiver.directory, name), 'rt') as part:
+            return [json.loads(line) for line in part]
+
+    def test_archives_and_deletes_settled_orders(self):
+        archived = [self.create_order(Order.COMPLETED, self.old) for _ in range(4)]
+        archived.append(self.create_order(Order.FAILED, self.old))
+        WalletLedgerEntry.objects.create(
+            user=self.user, kind=WalletLedgerEntry.REFUND, amount=Decimal('4.00'), order=archived[-1]
+        )
+        pending = self.create_order(Order.PENDING, self.old)
+        recent = self.create_order(Order.COMPLETED, self.new)
+        WalletLedgerEntry.objects.create(
+            user=self.user, kind=WalletLedgerEntry.DEBIT, amount=Decimal('-4.00'), order=archived[0]
+        )
+        archiver = self.archiver()
+
+        manifest = archiver.run()
+
+        self.assertEqual([part['rows'] for part in manifest['parts']], [3, 2])
+        self.assertTrue(all(part['deleted'] for part in manifest['parts']))
+        rows = self.read_part(archiver, 'part-00001.jsonl.gz') + self.read_part(archiver, 'part-00002.jsonl.gz')
+        self.assertEqual([row['id'] for row in rows], [order.id for order in archived])
+        self.assertEqual(rows[0]['amount'], '1.00000000')
+        self.assertEqual(set(rows[0]), set(manifest['fields']))
+        self.assertEqual(verify(archiver.directory), [])
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {pending.id, recent.id})
+        self.assertEqual(
+            set(WalletLedgerEntry.objects.values_list('order_id', flat=True)), {archived[0].id, archived[-1].id}
+        )
+
+    def test_keeps_unrefunded_failed_orders(self):
+        failed = self.create_order(Order.FAILED, self.old)
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        debit = WalletLedgerEntry.objects.create(
+            user=self.user, kind=WalletLedgerEntry.DEBIT, amount=Decimal('-4.00'), order=failed
+        )
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('96.00'))
+
+        manifest = self.archiver().run()
+
+        self.assertEqual(manifest['parts'], [])
+        debit.refresh_from_db()
+        self.assertEqual(debit.order_id, failed.id)
+        run = WalletReconciler().run(incremental=False)
+        self.assertEqual(
+            list(run.discrepancies.values_list('kind', flat=True)), [ReconciliationDiscrepancy.UNREFUNDED_FAILURES]
+        )
+
+    def test_resumes_after_crash_before_delete(self):
+        orders = [self.create_order(Order.COMPLETED, self.old) for _ in range(4)]
+
+        with patch.object(OrderArchiver, '_delete_part', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.archiver().run()
+        self.assertEqual(Order.objects.count(), 4)
+
+        manifest = self.archiver().run()
+
+        self.assertEqual([(part['first_id'], part['last_id']) for part in manifest['parts']], [
+            (orders[0].id, orders[2].id), (orders[3].id, orders[3].id),
+        ])
+        self.assertFalse(Order.objects.exists())
+
+    def test_keeps_orders_settled_after_their_part_was_written(self):
+        first = self.create_order(Order.COMPLETED, self.old)
+        pending = self.create_order(Order.PENDING, self.old)
+        last = self.create_order(Order.COMPLETED, self.old)
+        write_part = OrderArchiver._write_part
+
+        def write_then_settle(archiver, number, after_id):
+            part = write_part(archiver, number, after_id)
+            Order.objects.filter(pk=pending.pk).update(status=Order.COMPLETED)
+            return part
+
+        with patch.object(OrderArchiver, '_write_part', autospec=True, side_effect=write_then_settle):
+            manifest = self.archiver().run()
+
+        self.assertEqual(
+            [(part['first_id'], part['last_id'], part['rows']) for part in manifest['parts']], [(first.id, last.id, 2)]
+        )
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [pending.id])
+
+    def test_command_resumes_with_the_unfinished_cutoff(self):
+        self.create_order(Order.COMPLETED, self.old)
+        recent = self.create_order(Order.COMPLETED, self.new)
+        with patch.object(OrderArchiver, '_delete_part', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.archiver().run()
+        self.assertEqual(unfinished_cutoff(self.output), date(2026, 3, 1))
+
+        call_command('archive_orders', output=self.output, older_than_days=1, stdout=io.StringIO())
+
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [recent.id])
+        self.assertEqual(os.listdir(self.output), ['orders-before-2026-03-01'])
+        self.assertIsNone(unfinished_cutoff(self.output))
+
+    def test_rerun_writes_nothing_new(self):
+        self.create_order(Order.COMPLETED, self.old)
+        self.archiver().run()
+
+        manifest = self.archiver().run()
+
+        self.assertEqual(len(manifest['parts']), 1)
+        self.assertEqual(sorted(os.listdir(self.archiver().directory)), ['manifest.json', 'part-00001.jsonl.gz'])
+
+    def test_verify_detects_corruption(self):
+        self.create_order(Order.COMPLETED, self.old)
+        archiver = self.archiver()
+        archiver.run()
+        path = os.path.join(archiver.directory, 'part-00001.jsonl.gz')
+        checksum = file_sha256(path)
+
+        with open(path, 'ab') as part:
+            part.write(b'garbage')
+
+        self.assertNotEqual(file_sha256(path), checksum)
+        self.assertEqual(verify(archiver.directory), ['part-00001.jsonl.gz'])
@@ -0,0 +1,117 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from unittest.mock import patch
+from abantether.orders.codec import PendingOrderCodec
+from abantether.orders.models import Order, Wallet
+from abantether.orders.prices import CoinPriceService, StaticPriceProvider
+from abantether.orders.services import AsyncOrderService
+from abantether.orders.memory_redis import AsyncInMemoryRedis, InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(StaticPriceProvider, 'COIN_PRICES', new={'ABAN': Decimal('4.00')})
+class AsyncOrdersTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        CoinPriceService.clear_local_cache()
+        self.mock_redis = InMemoryRedis()
+        for target, client in [
+            ('abantether.orders.services.get_redis_client', self.mock_redis),
+            ('abantether.orders.services.get_async_redis_client', AsyncInMemoryRedis(self.mock_redis)),
+        ]:
+            patcher = patch(target, return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        self.async_client.cookies = self.client.cookies
+
+    async def test_create_order(self):
+        response = await self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'ABAN', 'amount': '1'}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['amount'], '1.00000000')
+        order = await Order.objects.aget(pk=response.json()['id'])
+        self.assertEqual(order.status, Order.PENDING)
+        wallet = await Wallet.objects.aget(user=self.user)
+        self.assertEqual(wallet.balance, Decimal('96.00'))
+        members = self.mock_redis.zrange('pending_orders:ABAN', 0, -1)
+        self.assertEqual([PendingOrderCodec.decode_id(member) for member in members], [order.id])
+
+    async def test_create_order_publishes_ready_batch(self):
+        response = await self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'ABAN', 'amount': '3'}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        streams = [key for key in self.mock_redis.data if key.startswith('settlement_events:')]
+        self.assertEqual(len(streams), 1)
+
+    async def test_create_order_rejections(self):
+        invalid_coin = await self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'NOPE', 'amount': '1'}, content_type='application/json'
+        )
+        insufficient = await self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'ABAN', 'amount': '100'}, content_type='application/json'
+        )
+        invalid_data = await self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'ABAN'}, content_type='application/json'
+        )
+
+        self.assertEqual(invalid_coin.status_code, 400)
+        self.assertEqual(insufficient.json(), {'error': "['Insufficient funds']"})
+        self.assertIn('amount', invalid_data.json())
+        self.assertFalse(await Order.objects.aexists())
+
+    async def test_idempotency_key_replays_response(self):
+        post = lambda: self.async_client.post(
+            '/api/async/orders/', {'coin_name': 'ABAN', 'amount': '1'}, content_type='application/json',
+            headers={'Idempotency-Key': 'abc'},
+        )
+
+        first = await post()
+        retry = await post()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(await Order.objects.acount(), 1)
+        wallet = await Wallet.objects.aget(user=self.user)
+        self.assertEqual(wallet.balance, Decimal('96.00'))
+
+    async def test_failed_enqueue_still_creates_order(self):
+        with patch.object(AsyncOrderService, '_enqueue_pending_orders', side_effect=ConnectionError):
+            with self.assertLogs('abantether.orders.services', 'ERROR'):
+                response = await self.async_client.post(
+                    '/api/async/orders/', {'coin_name': 'ABAN', 'amount': '1'}, content_type='application/json'
+                )
+
+        # Committed and paid for; the settlement sweep enqueues it
+        self.assertEqual(response.status_code, 201)
+        order = await Order.objects.aget(pk=response.json()['id'])
+        self.assertEqual(order.status, Order.PENDING)
+
+    async def test_list_and_retrieve(self):
+        order = await Order.objects.acreate(user=self.user, coin_name='ABAN', amount=Decimal('1'))
+        other = await User.objects.acreate(username='other')
+        other_order = await Order.objects.acreate(user=other, coin_name='ABAN', amount=Decimal('1'))
+
+        listed = await self.async_client.get('/api/async/orders/')
+        retrieved = await self.async_client.get(f'/api/async/orders/{order.id}/')
+        hidden = await self.async_client.get(f'/api/async/orders/{other_order.id}/')
+
+        self.assertEqual([item['id'] for item in listed.json()['results']], [order.id])
+        self.assertEqual(retrieved.json()['id'], order.id)
+        self.assertEqual(hidden.status_code, 404)
+
+    async def test_requires_authentication(self):
+        self.async_client.cookies.clear()
+
+        response = await self.async_client.get('/api/async/orders/')
+
+        self.assertEqual(response.status_code, 401)
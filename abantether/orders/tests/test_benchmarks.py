@@ -0,0 +1,62 @@
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from abantether.orders.benchmarks import OrderBenchmarks, compare_to_baseline, percentiles
+from abantether.orders.models import Order, SettlementBatch
+from abantether.orders.services import OrderService
+from abantether.orders.memory_redis import InMemoryRedis
+
+
+class BenchmarksTestCase(TestCase):
+    def test_scenarios_report_metrics(self):
+        benchmarks = OrderBenchmarks(InMemoryRedis(), repeat=3)
+
+        results = benchmarks.run(backlog_sizes=[5], history_sizes=[5], codec_size=100)
+
+        for name in [
+            'create_order.ops_per_sec',
+            'create_order_p99_ms',
+            'pending_check.5_p50_ms',
+            'pending_settle.5_p50_ms',
+            'order_list.5_p95_ms',
+            'api_create_order_p99_ms',
+            'member_codec.json.decode_per_sec',
+            'member_codec.v1.decode_per_sec',
+        ]:
+            self.assertIn(name, results)
+            self.assertGreater(results[name], 0)
+        self.assertFalse(Order.objects.exists())
+        self.assertLess(
+            results['member_codec.v1.bytes_per_member'],
+            results['member_codec.json.bytes_per_member'],
+        )
+
+    @override_settings(SETTLEMENT_FLUSH_MAX_ORDERS=3)
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_backlog_larger_than_max_orders_is_only_settled_by_value(self, mock_buy_from_exchange):
+        redis_client = InMemoryRedis()
+        benchmarks = OrderBenchmarks(redis_client, repeat=3)
+
+        benchmarks.pending_backlog(5)
+
+        # Once per settle round, never by the checks
+        mock_buy_from_exchange.assert_called_once()
+        self.assertFalse(SettlementBatch.objects.exists())
+        self.assertEqual([key for key, value in redis_client.data.items() if key.startswith('pending') and value], [])
+
+    def test_percentiles(self):
+        samples = [i / 1000 for i in range(1, 101)]
+
+        self.assertEqual(
+            percentiles(samples, 'x'),
+            {'x_p50_ms': 51.0, 'x_p95_ms': 96.0, 'x_p99_ms': 100.0},
+        )
+
+    def test_compare_to_baseline(self):
+        baseline = {'a.ops_per_sec': 100, 'b_p99_ms': 10, 'c_p50_ms': 10}
+        results = {'a.ops_per_sec': 70, 'b_p99_ms': 11, 'c_p50_ms': 20, 'new_p50_ms': 1}
+
+        regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('a.ops_per_sec'))
+        self.assertTrue(regressions[1].startswith('c_p50_ms'))
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from unittest.mock import patch
+from rest_framework.test import APIClient
+from abantether.orders.amounts import Amount
+from abantether.orders.models import Order, Wallet, WalletLedgerEntry
+from abantether.orders.prices import CoinPriceService, StaticPriceProvider
+from abantether.orders.services import OrderService
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(StaticPriceProvider, 'COIN_PRICES', new={'ABAN': Decimal('4.00'), 'TET': Decimal('1.00')})
+class BulkOrdersTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        CoinPriceService.clear_local_cache()
+        self.mock_redis = InMemoryRedis()
+        patcher = patch('abantether.orders.services.get_redis_client', return_value=self.mock_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_bulk(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/bulk/', items, format='json')
+
+    def test_bulk_create(self):
+        response = self.post_bulk([
+            {'coin_name': 'ABAN', 'amount': '1'},
+            {'coin_name': 'TET', 'amount': '2.5'},
+            {'coin_name': 'ABAN', 'amount': '0.5'},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['status'] for r in response.data], ['created'] * 3)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('91.50'))
+        self.assertEqual(WalletLedgerEntry.objects.filter(kind=WalletLedgerEntry.DEBIT).count(), 3)
+
+        order_service = OrderService()
+        self.assertEqual(order_service._get_pending_totals('ABAN'), (Amount.from_decimal('1.5'), 2))
+        self.assertEqual(order_service._get_pending_totals('TET'), (Amount.from_decimal('2.5'), 1))
+
+    def test_invalid_coin_is_rejected_individually(self):
+        response = self.post_bulk([
+            {'coin_name': 'NOPE', 'amount': '1'},
+            {'coin_name': 'ABAN', 'amount': '1'},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data[0], {'index': 0, 'status': 'rejected', 'error': 'Invalid coin: NOPE'})
+        self.assertEqual(response.data[1]['status'], 'created')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('96.00'))
+
+    def test_insufficient_funds_rejects_whole_batch(self):
+        response = self.post_bulk([
+            {'coin_name': 'ABAN', 'amount': '20'},
+            {'coin_name': 'ABAN', 'amount': '20'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+    def test_batch_size_is_bounded(self):
+        response = self.post_bulk([{'coin_name': 'ABAN', 'amount': '0.01'}] * 101)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+from abantether.orders.amounts import Amount
+from abantether.orders.codec import PendingOrderCodec
+
+
+class PendingOrderCodecTestCase(SimpleTestCase):
+    def test_round_trip(self):
+        member = PendingOrderCodec.encode(42, Amount(150000000))
+
+        self.assertEqual(member, '1:2a:8f0d180')
+        self.assertEqual(PendingOrderCodec.decode(member), (42, Amount.from_decimal('1.5')))
+        self.assertEqual(PendingOrderCodec.decode_id(member), 42)
+
+    def test_legacy_json(self):
+        member = '{"id": 42, "amount": "1.50000000"}'
+
+        self.assertEqual(PendingOrderCodec.decode(member), (42, Amount.from_decimal('1.5')))
+        self.assertEqual(PendingOrderCodec.decode_id(member), 42)
+
+    def test_smaller_than_json(self):
+        self.assertLess(
+            len(PendingOrderCodec.encode(123456789, Amount(123456789))),
+            len('{"id": 123456789, "amount": "1.23456789"}') / 2,
+        )
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            PendingOrderCodec.decode('9:2a:1')
@@ -0,0 +1,114 @@
+from django.test import TestCase, override_settings
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+import time
+from abantether.orders.prices import CoinPriceService, PriceProvider
+from abantether.orders.memory_redis import InMemoryRedis
+
+
+@override_settings(COIN_PRICE_LOCAL_TTL=60, COIN_PRICE_MAX_STALENESS=30)
+class CoinPriceServiceTestCase(TestCase):
+    def setUp(self):
+        CoinPriceService.clear_local_cache()
+        self.addCleanup(CoinPriceService.clear_local_cache)
+        self.mock_redis = InMemoryRedis()
+        self.provider = MagicMock(spec=PriceProvider)
+        self.provider.fetch_price.return_value = Decimal('4.00')
+        self.price_service = CoinPriceService(provider=self.provider, redis_client=self.mock_redis)
+
+    def test_price_is_cached_in_process(self):
+        self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('4.00'))
+        self.mock_redis.get = MagicMock()
+
+        self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('4.00'))
+
+        self.provider.fetch_price.assert_called_once_with('ABAN')
+        self.mock_redis.get.assert_not_called()
+
+    def test_refresh_is_published(self):
+        self.price_service.get_coin_price('ABAN')
+
+        self.assertEqual(self.mock_redis.get('coin_price:ABAN').split('|')[0], '4.00')
+        self.assertEqual(len(self.mock_redis.published), 1)
+
+    def test_shared_cache_is_used_by_other_processes(self):
+        self.price_service.publish_tick('ABAN', Decimal('5.00'))
+        CoinPriceService.clear_local_cache()
+
+        self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('5.00'))
+        self.provider.fetch_price.assert_not_called()
+
+    def test_stale_price_is_never_served(self):
+        self.price_service.publish_tick('ABAN', Decimal('5.00'), tick_time=time.time() - 31)
+
+        self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('4.00'))
+        self.provider.fetch_price.assert_called_once_with('ABAN')
+
+    @override_settings(COIN_PRICE_LOCAL_TTL=0)
+    def test_local_ttl_applies_without_tick_listener(self):
+        self.price_service.get_coin_price('ABAN')
+        self.mock_redis.get = MagicMock(wraps=self.mock_redis.get)
+
+        self.price_service.get_coin_price('ABAN')
+
+        self.mock_redis.get.assert_called_once_with('coin_price:ABAN')
+        self.provider.fetch_price.assert_called_once()
+
+    def test_tick_updates_process_cache(self):
+        self.price_service.get_coin_price('ABAN')
+
+        CoinPriceService.apply_tick(f"ABAN|4.50|{time.time()}")
+
+        self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('4.50'))
+
+    @patch.object(CoinPriceService, 'LOCK_TIMEOUT', new=0.05)
+    def test_waits_for_concurrent_refresh(self):
+        # Another process holds the refresh lock and publishes while we wait
+        self.mock_redis.set('coin_price_lock:ABAN', 'other')
+
+        def publish_while_waiting(seconds):
+            self.mock_redis.set('coin_price:ABAN', f"4.25|{time.time()}")
+
+        with patch('abantether.orders.prices.time.sleep', side_effect=publish_while_waiting):
+            self.assertEqual(self.price_service.get_coin_price('ABAN'), Decimal('4.25'))
+        self.provider.fetch_price.assert_not_called()
+
+    def test_unknown_coin(self):
+        self.provider.fetch_price.return_value = None
+
+        self.assertIsNone(self.price_service.get_coin_price('NOPE'))
+
+    def test_unknown_coin_is_cached_briefly(self):
+        self.provider.fetch_price.return_value = None
+        self.price_service.get_coin_price('NOPE')
+        CoinPriceService.clear_local_cache()
+
+        # Another process finds it in Redis without asking the provider or waiting on the lock
+        with patch.object(CoinPriceService, '_wait_for_shared') as wait_for_shared:
+            self.assertIsNone(self.price_service.get_coin_price('NOPE'))
+            self.assertIsNone(self.price_service.get_coin_price('NOPE'))
+
+        wait_for_shared.assert_not_called()
+        self.provider.fetch_price.assert_called_once_with('NOPE')
+
+    @override_settings(COIN_PRICE_MISSING_TTL=0)
+    def test_unknown_coin_is_asked_again_once_expired(self):
+        self.provider.fetch_price.return_value = None
+        self.price_service.get_coin_price('NOPE')
+        self.mock_redis.delete('coin_price:NOPE')
+        self.provider.fetch_price.return_value = Decimal('2.00')
+
+        self.assertEqual(self.price_service.get_coin_price('NOPE'), Decimal('2.00'))
+
+    def test_refresh_releases_lock(self):
+        self.price_service.get_coin_price('ABAN')
+
+        self.assertIsNone(self.mock_redis.get('coin_price_lock:ABAN'))
+
+    def test_lock_of_another_refresher_is_kept(self):
+        # Our lock expired and another process took it
+        self.mock_redis.set('coin_price_lock:ABAN', 'other')
+
+        self.price_service._release_shared_lock('ABAN', 'ours')
+
+        self.assertEqual(self.mock_redis.get('coin_price_lock:ABAN'), 'other')
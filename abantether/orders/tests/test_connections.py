@@ -0,0 +1,50 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+from abantether.orders.connections import RedisClientRegistry
+
+User = get_user_model()
+
+
+@override_settings(REDIS_URL='redis://localhost:6379/0', REDIS_MAX_CONNECTIONS=7)
+class RedisClientRegistryTestCase(TestCase):
+    def setUp(self):
+        self.registry = RedisClientRegistry()
+
+    def test_client_is_shared(self):
+        client = self.registry.get()
+
+        self.assertIs(self.registry.get(), client)
+        self.assertIsNot(self.registry.get('redis://localhost:6379/1'), client)
+
+    def test_pool_is_bounded_and_configured(self):
+        pool = self.registry.get().connection_pool
+
+        self.assertEqual(pool.max_connections, 7)
+        self.assertTrue(pool.connection_kwargs['socket_keepalive'])
+        self.assertTrue(pool.connection_kwargs['decode_responses'])
+        self.assertGreater(pool.connection_kwargs['health_check_interval'], 0)
+
+    def test_pool_stats(self):
+        self.registry.get()
+
+        stats = self.registry.pool_stats()['redis://localhost:6379/0']
+
+        self.assertEqual(stats['max_connections'], 7)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 0)
+
+    def test_new_client_after_fork(self):
+        client = self.registry.get()
+
+        with patch('abantether.orders.connections.os.getpid', return_value=-1):
+            self.assertIsNot(self.registry.get(), client)
+
+    def test_pool_stats_endpoint_is_admin_only(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/redis-pool/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/api/redis-pool/').status_code, 200)
@@ -0,0 +1,116 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+import json
+from unittest.mock import patch
+from rest_framework.test import APIClient
+from abantether.orders.api.idempotency import IdempotencyCache
+from abantether.orders.models import Order, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+class IdempotencyTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        self.mock_redis = InMemoryRedis()
+        patcher = patch('abantether.orders.services.get_redis_client', return_value=self.mock_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, data, key=None, path='/api/orders/'):
+        headers = {'Idempotency-Key': key} if key is not None else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(path, data, format='json', headers=headers)
+
+    def test_retry_replays_first_response(self, mock_get_coin_price):
+        first = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+        retry = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('96.00'))
+
+    def test_rejections_are_replayed(self, mock_get_coin_price):
+        first = self.post({'coin_name': 'ABAN', 'amount': '100'}, key='abc')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('1000.00'))
+        retry = self.post({'coin_name': 'ABAN', 'amount': '100'}, key='abc')
+
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry.data, first.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_requests_without_key_are_not_deduplicated(self, mock_get_coin_price):
+        self.post({'coin_name': 'ABAN', 'amount': '1'})
+        self.post({'coin_name': 'ABAN', 'amount': '1'})
+
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_different_request(self, mock_get_coin_price):
+        self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+        response = self.post({'coin_name': 'ABAN', 'amount': '2'}, key='abc')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self, mock_get_coin_price):
+        other = User.objects.create_user(username='other', password='12345')
+        Wallet.objects.create(user=other, balance=Decimal('100.00'))
+
+        self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+        self.client.force_authenticate(other)
+        response = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def mark_in_flight(self):
+        """Turn the stored response for key 'abc' back into an in-flight claim"""
+        cache_key = IdempotencyCache.KEY.format(self.user.pk, 'abc')
+        stored = self.mock_redis.get(cache_key)
+        self.mock_redis.data[cache_key] = json.dumps({'fingerprint': json.loads(stored)['fingerprint']})
+        return cache_key, stored
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_of_in_flight_request_does_not_run(self, mock_get_coin_price):
+        self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+        self.mark_in_flight()
+
+        response = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicate_waits_for_in_flight_result(self, mock_get_coin_price):
+        first = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+        cache_key, stored = self.mark_in_flight()
+
+        def finish(seconds):
+            # The first request completes while the retry waits
+            self.mock_redis.data[cache_key] = stored
+
+        with patch('abantether.orders.api.idempotency.time.sleep', side_effect=finish) as sleep:
+            retry = self.post({'coin_name': 'ABAN', 'amount': '1'}, key='abc')
+
+        sleep.assert_called_once()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_bulk_retry_is_replayed(self, mock_get_coin_price):
+        items = [{'coin_name': 'ABAN', 'amount': '1'}, {'coin_name': 'ABAN', 'amount': '0.5'}]
+        first = self.post(items, key='abc', path='/api/orders/bulk/')
+        retry = self.post(items, key='abc', path='/api/orders/bulk/')
+
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 2)
@@ -0,0 +1,55 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from abantether.orders.models import Order, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.mock_redis = InMemoryRedis()
+        patcher = patch('abantether.orders.services.get_redis_client', return_value=self.mock_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_stages_are_recorded(self):
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        before = self.sample('order_stage_seconds_count', stage='wallet_debit')
+        created_before = self.sample('orders_created_total', coin='ABAN')
+
+        with patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00')):
+            OrderService().create_order(self.user, 'ABAN', Decimal('1'))
+
+        self.assertEqual(self.sample('order_stage_seconds_count', stage='wallet_debit'), before + 1)
+        self.assertEqual(self.sample('orders_created_total', coin='ABAN'), created_before + 1)
+
+    def test_endpoint_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+    def test_endpoint_reports_pending_backlog(self, mock_get_coin_price):
+        order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('1.5'))
+        OrderService()._add_pending_order_to_redis(order)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('pending_backlog_orders{coin="ABAN"} 1.0', body)
+        self.assertIn('pending_backlog_value{coin="ABAN"} 6.0', body)
+        self.assertIn('order_stage_seconds_bucket', body)
@@ -3,8 +3,10 @@ from django.contrib.auth import get_user_model
 from decimal import Decimal
 from unittest.mock import patch
 from abantether.orders.models import Order, Wallet
-from abantether.orders.services import OrderService, CoinPriceService
-from abantether.orders.tests.mocks import MockRedis
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService
+from abantether.orders.settlement import SettlementWorker
+from abantether.orders.memory_redis import InMemoryRedis
 
 User = get_user_model()
 
@@ -12,8 +14,11 @@ User = get_user_model()
 class MultipleOrdersTestCase(TestCase):
     def setUp(self):
         self.order_service = OrderService()
-        self.mock_redis = MockRedis()
+        self.mock_redis = InMemoryRedis()
         self.order_service.redis_client = self.mock_redis
+        self.order_service.coin_price_service.redis_client = self.mock_redis
+        self.settlement_worker = SettlementWorker(order_service=self.order_service, consumer_name='test')
+        self.settlement_worker.rebalance()
 
         # Create three users with wallets
         self.users = []
@@ -30,13 +35,17 @@ class MultipleOrdersTestCase(TestCase):
         # Create orders for three users
         orders = []
         for user in self.users:
-            order = self.order_service.create_order(user, 'ABAN', Decimal('1'))
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.order_service.create_order(user, 'ABAN', Decimal('1'))
             orders.append(order)
 
             # Check wallet balance after each order
             wallet = Wallet.objects.get(user=user)
             self.assertEqual(wallet.balance, Decimal('96.00'))
 
+        # Settlement runs in the background worker, not in create_order
+        mock_buy_from_exchange.assert_not_called()
+        self.settlement_worker.run_once()
 
         # After the last order, _buy_from_exchange should be called once
         mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('12'))
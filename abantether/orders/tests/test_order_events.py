@@ -0,0 +1,115 @@
+import asyncio
+import json
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from unittest.mock import patch
+from abantether.orders.models import Order, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService
+from abantether.orders.memory_redis import AsyncInMemoryRedis, InMemoryRedis
+from abantether.orders.updates import OrderUpdateHub, OrderUpdateStream, order_events
+
+User = get_user_model()
+
+
+class OrderEventsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        self.mock_redis = InMemoryRedis()
+        for target, client in [
+            ('abantether.orders.services.get_redis_client', self.mock_redis),
+            ('abantether.orders.updates.get_async_redis_client', AsyncInMemoryRedis(self.mock_redis)),
+        ]:
+            patcher = patch(target, return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.stream = OrderUpdateStream(self.mock_redis)
+
+    async def collect(self, events, count):
+        chunks = []
+        try:
+            for _ in range(count):
+                chunks.append(await asyncio.wait_for(anext(events), 1))
+        finally:
+            await events.aclose()
+        return chunks
+
+    @patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_settlement_publishes_updates(self, mock_buy_from_exchange, mock_get_coin_price):
+        order_service = OrderService()
+        with self.captureOnCommitCallbacks(execute=True):
+            order = order_service.create_order(self.user, 'ABAN', Decimal('3'))
+        with self.captureOnCommitCallbacks(execute=True):
+            order_service.settle_pending_orders('ABAN')
+
+        entries = self.mock_redis.xrange(f'order_updates:{self.user.pk}')
+        self.assertEqual([fields for _, fields in entries], [{'order': order.id, 'status': Order.COMPLETED}])
+        channel, message = self.mock_redis.published[-1]
+        self.assertEqual(channel, 'order_updates')
+        self.assertEqual(
+            json.loads(message), {'user': self.user.pk, 'events': [[entries[0][0], order.id, Order.COMPLETED]]}
+        )
+
+    async def test_resumes_after_last_event_id(self):
+        self.stream.publish([(1, self.user.pk), (2, self.user.pk)], Order.COMPLETED)
+
+        chunks = await self.collect(order_events(self.user.pk, '1-0'), 2)
+
+        self.assertEqual(chunks[0], 'retry: 3000\n\n')
+        self.assertEqual(chunks[1], 'id: 2-0\nevent: order\ndata: {"id": 2, "status": "completed"}\n\n')
+
+    async def test_streams_new_updates_only(self):
+        self.stream.publish([(1, self.user.pk)], Order.COMPLETED)
+        events = order_events(self.user.pk, None)
+        await anext(events)
+
+        next_event = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.01)
+        self.stream.publish([(2, self.user.pk)], Order.FAILED)
+        self.stream.publish([(3, self.user.pk + 1)], Order.COMPLETED)
+
+        self.assertEqual(await asyncio.wait_for(next_event, 1), 'id: 2-0\nevent: order\ndata: {"id": 2, "status": "failed"}\n\n')
+        await events.aclose()
+
+    async def test_idle_stream_sends_keep_alive(self):
+        chunks = await self.collect(order_events(self.user.pk, None, heartbeat=0.01), 2)
+
+        self.assertEqual(chunks[1], ': keep-alive\n\n')
+
+    async def test_idle_hub_does_not_resync(self):
+        hub = OrderUpdateHub(AsyncInMemoryRedis(self.mock_redis, socket_timeout=0.01))
+        hub.POLL_TIMEOUT = 0.005
+        hub.RECONNECT_DELAY = 0
+        queue = hub.subscribe(self.user.pk)
+        self.addCleanup(hub.unsubscribe, self.user.pk, queue)
+        # Every subscriber resyncs once the subscription is up
+        self.assertEqual(await asyncio.wait_for(queue.get(), 1), OrderUpdateHub.RESYNC)
+
+        await asyncio.sleep(0.1)
+
+        self.assertTrue(queue.empty())
+        self.stream.publish([(1, self.user.pk)], Order.COMPLETED)
+        self.assertEqual(await asyncio.wait_for(queue.get(), 1), [['1-0', 1, Order.COMPLETED]])
+
+    def test_slow_subscriber_resyncs(self):
+        hub = OrderUpdateHub(self.mock_redis)
+        queue = asyncio.Queue(maxsize=2)
+
+        for event in range(3):
+            hub._offer(queue, [[f'{event}-0', event, Order.COMPLETED]])
+
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), OrderUpdateHub.RESYNC)
+
+    def test_view(self):
+        self.assertEqual(self.client.get('/api/async/orders/events/').status_code, 401)
+
+        self.client.force_login(self.user)
+        response = self.client.get('/api/async/orders/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        invalid = self.client.get('/api/async/orders/events/', headers={'Last-Event-ID': 'nope'})
+        self.assertEqual(invalid.status_code, 400)
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from datetime import datetime, timezone
+from decimal import Decimal
+import csv
+import io
+import json
+from abantether.orders.models import Order
+
+User = get_user_model()
+
+
+class OrderExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        other_user = User.objects.create_user(username='other', password='12345')
+        self.orders = Order.objects.bulk_create(
+            Order(user=self.user, coin_name='ABAN', amount=Decimal(i + 1)) for i in range(3)
+        )
+        for day, order in zip([1, 2, 3], self.orders):
+            Order.objects.filter(pk=order.pk).update(created_at=datetime(2026, 5, day, tzinfo=timezone.utc))
+        Order.objects.create(user=other_user, coin_name='ABAN', amount=Decimal('1'))
+        self.client.force_login(self.user)
+        self.async_client.cookies = self.client.cookies
+
+    async def export(self, query=''):
+        response = await self.async_client.get(f'/api/orders/export/{query}')
+        content = b''.join([chunk async for chunk in response.streaming_content]) if response.streaming else b''
+        return response, content.decode()
+
+    async def test_csv(self):
+        response, content = await self.export('?format=csv')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows], [order.id for order in reversed(self.orders)])
+        self.assertEqual(rows[0]['amount'], '3.00000000')
+        self.assertEqual(rows[0]['created_at'], '2026-05-03T00:00:00Z')
+
+    async def test_jsonl(self):
+        response, content = await self.export('?format=jsonl')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[-1]['amount'], '1.00000000')
+        self.assertEqual(rows[-1]['status'], Order.PENDING)
+
+    async def test_date_range(self):
+        _, content = await self.export('?format=jsonl&created_after=2026-05-02&created_before=2026-05-03T00:00:00Z')
+
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.orders[1].id])
+
+    def test_wsgi_streams_from_a_sync_iterator(self):
+        response = self.client.get('/api/orders/export/?format=csv')
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], [order.id for order in reversed(self.orders)])
+
+    async def test_asgi_streams_from_an_async_iterator(self):
+        response = await self.async_client.get('/api/orders/export/?format=jsonl')
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(len([chunk async for chunk in response.streaming_content]), 1)
+
+    async def test_invalid_parameters(self):
+        bad_format, _ = await self.export('?format=xml')
+        bad_date, _ = await self.export('?created_after=yesterday')
+
+        self.assertEqual(bad_format.status_code, 400)
+        self.assertEqual(bad_date.status_code, 400)
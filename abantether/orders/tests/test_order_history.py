@@ -0,0 +1,42 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from rest_framework.test import APIClient
+from abantether.orders.api.pagination import OrderCursorPagination
+from abantether.orders.models import Order
+
+User = get_user_model()
+
+
+class OrderHistoryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        other_user = User.objects.create_user(username='other', password='12345')
+        self.orders = Order.objects.bulk_create(
+            Order(user=self.user, coin_name='ABAN', amount=Decimal(i + 1)) for i in range(5)
+        )
+        Order.objects.create(user=other_user, coin_name='ABAN', amount=Decimal('1'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_follow_created_at_then_id(self):
+        # Same created_at for every order, so id breaks the tie
+        Order.objects.filter(user=self.user).update(created_at=self.orders[0].created_at)
+
+        ids = []
+        url = '/api/orders/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(ids, sorted((order.id for order in self.orders), reverse=True))
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get(f'/api/orders/?page_size={OrderCursorPagination.max_page_size + 1}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
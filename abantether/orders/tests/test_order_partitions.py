@@ -0,0 +1,62 @@
+from datetime import date
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from unittest.mock import MagicMock
+from abantether.orders import order_partitions
+
+
+class OrderPartitionsTestCase(TestCase):
+    def test_add_months(self):
+        self.assertEqual(order_partitions.add_months(date(2026, 11, 1), 1), date(2026, 12, 1))
+        self.assertEqual(order_partitions.add_months(date(2026, 11, 1), 3), date(2027, 2, 1))
+        self.assertEqual(order_partitions.add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+
+    def test_partition_name(self):
+        self.assertEqual(order_partitions.partition_name(date(2026, 3, 1)), 'orders_order_p2026_03')
+
+    def test_upper_bounds_are_parsed(self):
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.fetchall.return_value = [
+            ('orders_order_p2026_12', "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')", False),
+            ('orders_order_legacy', "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')", False),
+        ]
+
+        partitions = order_partitions.list_partitions(connection)
+
+        self.assertEqual([name for name, _, _ in partitions], ['orders_order_legacy', 'orders_order_p2026_12'])
+        self.assertEqual(partitions[0][1].date(), date(2026, 11, 1))
+
+    def test_missing_partitions(self):
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.fetchall.return_value = [
+            ('orders_order_legacy', "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')", False),
+            ('orders_order_p2026_11', "FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')", False),
+        ]
+
+        self.assertEqual(order_partitions.missing_partitions(connection, 0, today=date(2026, 11, 20)), [])
+        self.assertEqual(
+            order_partitions.missing_partitions(connection, 2, today=date(2026, 11, 20)),
+            ['orders_order_p2026_12', 'orders_order_p2027_01'],
+        )
+
+    def test_index_is_built_per_partition(self):
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [
+            ('orders_order_p2026_12', "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')", False),
+            ('orders_order_p2026_10', "FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')", True),
+        ]
+
+        order_partitions.create_index(connection, 'orders_order_some_idx', '(created_at)')
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list if 'pg_inherits' not in call.args[0]]
+        self.assertEqual(statements, [
+            'CREATE INDEX IF NOT EXISTS orders_order_some_idx ON ONLY orders_order (created_at)',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_order_p2026_12_some_idx ON orders_order_p2026_12 (created_at)',
+            'ALTER INDEX orders_order_some_idx ATTACH PARTITION orders_order_p2026_12_some_idx',
+        ])
+
+    def test_command_needs_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('maintain_order_partitions')
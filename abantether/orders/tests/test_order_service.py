@@ -1,12 +1,17 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from unittest.mock import patch, MagicMock
 import json
+from unittest.mock import patch, MagicMock
 from django.core.exceptions import ValidationError
-from abantether.orders.models import Order, Wallet
-from abantether.orders.services import OrderService, CoinPriceService
-from abantether.orders.tests.mocks import MockRedis
+from abantether.orders.amounts import Amount, Money
+from abantether.orders.codec import PendingOrderCodec
+from abantether.orders.models import Order, SettlementBatch, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService
+from abantether.orders.memory_redis import InMemoryRedis
 
 User = get_user_model()
 
@@ -15,14 +20,20 @@ class OrderServiceTestCase(TestCase):
         self.user = User.objects.create_user(username='testuser', password='12345')
         self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
         self.order_service = OrderService()
-        self.mock_redis = MockRedis()
+        self.mock_redis = InMemoryRedis()
         self.order_service.redis_client = self.mock_redis
+        self.order_service.coin_price_service.redis_client = self.mock_redis
+
+    def create_order(self, coin_name, amount):
+        # Orders are enqueued in Redis once the surrounding transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.order_service.create_order(self.user, coin_name, amount)
 
     @patch.object(CoinPriceService, 'get_coin_price')
     def test_create_order_success(self, mock_get_coin_price):
         mock_get_coin_price.return_value = Decimal('4.00')
 
-        order = self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
+        order = self.create_order('ABAN', Decimal('1'))
 
         self.assertEqual(order.status, Order.PENDING)
         self.assertEqual(order.amount, Decimal('1'))
@@ -31,16 +42,16 @@ class OrderServiceTestCase(TestCase):
         # Check if order was added to Redis
         pending_orders = self.mock_redis.zrange('pending_orders:ABAN', 0, -1)
         self.assertEqual(len(pending_orders), 1)
-        order_data = json.loads(pending_orders[0])
-        self.assertEqual(order_data['id'], order.id)
-        self.assertEqual(order_data['amount'], str(order.amount))
+        order_id, amount = PendingOrderCodec.decode(pending_orders[0])
+        self.assertEqual(order_id, order.id)
+        self.assertEqual(amount, Amount.from_decimal('1'))
 
     @patch.object(CoinPriceService, 'get_coin_price')
     def test_create_order_insufficient_funds(self, mock_get_coin_price):
         mock_get_coin_price.return_value = Decimal('4.00')
 
         with self.assertRaises(ValidationError):
-            self.order_service.create_order(self.user, 'ABAN', Decimal('30'))
+            self.create_order('ABAN', Decimal('30'))
 
     @patch.object(CoinPriceService, 'get_coin_price')
     @patch.object(OrderService, '_buy_from_exchange')
@@ -48,7 +59,7 @@ class OrderServiceTestCase(TestCase):
         mock_get_coin_price.return_value = Decimal('4.00')
 
         # Create an order below the threshold
-        self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
+        self.create_order('ABAN', Decimal('1'))
 
         # Check that _buy_from_exchange was not called
         mock_buy_from_exchange.assert_not_called()
@@ -63,8 +74,12 @@ class OrderServiceTestCase(TestCase):
         mock_get_coin_price.return_value = Decimal('4.00')
 
         # Create orders above the threshold
-        order1 = self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
-        order2 = self.order_service.create_order(self.user, 'ABAN', Decimal('1.5'))
+        order1 = self.create_order('ABAN', Decimal('1'))
+        order2 = self.create_order('ABAN', Decimal('1.5'))
+
+        # Settlement happens off the request path
+        mock_buy_from_exchange.assert_not_called()
+        self.order_service.settle_pending_orders('ABAN')
 
         # Check that _buy_from_exchange was called
         mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('10'))
@@ -86,16 +101,183 @@ class OrderServiceTestCase(TestCase):
         mock_buy_from_exchange.side_effect = Exception("Exchange error")
 
         # Create orders above the threshold
+        order1 = self.create_order('ABAN', Decimal('1'))
+        order2 = self.create_order('ABAN', Decimal('1.5'))
+
         with self.assertRaises(Exception):
-            order1 = self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
-            order2 = self.order_service.create_order(self.user, 'ABAN', Decimal('1.5'))
-
-            # Check that orders were updated in the database
-            order1.refresh_from_db()
-            order2.refresh_from_db()
-            self.assertEqual(order1.status, Order.FAILED)
-            self.assertEqual(order2.status, Order.FAILED)
-
-            # Check that Redis was cleared
-            pending_orders = self.mock_redis.zrange('pending_orders:ABAN', 0, -1)
-            self.assertEqual(len(pending_orders), 0)
+            self.order_service.settle_pending_orders('ABAN')
+
+        # Check that orders were updated in the database
+        order1.refresh_from_db()
+        order2.refresh_from_db()
+        self.assertEqual(order1.status, Order.FAILED)
+        self.assertEqual(order2.status, Order.FAILED)
+
+        # Check that Redis was cleared
+        pending_orders = self.mock_redis.zrange('pending_orders:ABAN', 0, -1)
+        self.assertEqual(len(pending_orders), 0)
+
+    def test_order_is_enqueued_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
+
+        self.assertEqual(self.mock_redis.zrange('pending_orders:ABAN', 0, -1), [])
+        # Wallet cache invalidation and the enqueue
+        self.assertEqual(len(callbacks), 2)
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    def test_pending_totals_track_orders(self, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+
+        self.create_order('ABAN', Decimal('0.5'))
+        self.create_order('ABAN', Decimal('0.25'))
+
+        total_amount, count = self.order_service._get_pending_totals('ABAN')
+        self.assertEqual(total_amount, Amount.from_decimal('0.75'))
+        self.assertEqual(count, 2)
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_threshold_check_does_not_read_members(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        self.mock_redis.zrange = MagicMock(wraps=self.mock_redis.zrange)
+
+        self.create_order('ABAN', Decimal('1'))
+
+        self.mock_redis.zrange.assert_not_called()
+        mock_buy_from_exchange.assert_not_called()
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_order_added_during_settlement_is_kept(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        late_order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('0.5'))
+
+        def add_late_order(coin_name, total_value):
+            self.order_service._add_pending_order_to_redis(late_order)
+
+        mock_buy_from_exchange.side_effect = add_late_order
+
+        self.create_order('ABAN', Decimal('3'))
+        self.order_service.settle_pending_orders('ABAN')
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('12'))
+        pending_orders = self.mock_redis.zrange('pending_orders:ABAN', 0, -1)
+        self.assertEqual([PendingOrderCodec.decode_id(o) for o in pending_orders], [late_order.id])
+        self.assertEqual(self.order_service._get_pending_totals('ABAN'), (Amount.from_decimal('0.5'), 1))
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_batch_can_only_be_claimed_once(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('3'))
+        self.order_service._add_pending_order_to_redis(order)
+
+        policy = self.order_service._flush_policy('ABAN')
+        first = self.order_service._claim_batch('ABAN', 'first', policy, Decimal('4.00'))
+        second = self.order_service._claim_batch('ABAN', 'second', policy, Decimal('4.00'))
+
+        self.assertEqual(first[0], Amount.from_decimal('3'))
+        self.assertEqual(len(first[1]), 1)
+        self.assertTrue(first[2][0] <= order.created_at <= first[2][1])
+        self.assertIsNone(second)
+
+    def test_debit_is_a_single_conditional_update(self):
+        with self.assertNumQueries(1):
+            self.order_service._debit_wallet(self.user, Money.from_decimal('25.00'))
+
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('75.00'))
+
+    def test_debit_exact_balance_then_insufficient(self):
+        self.order_service._debit_wallet(self.user, Money.from_decimal('100.00'))
+
+        with self.assertRaises(ValidationError):
+            self.order_service._debit_wallet(self.user, Money.from_decimal('0.01'))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('0.00'))
+
+    def test_debit_without_wallet(self):
+        other_user = User.objects.create_user(username='nowallet', password='12345')
+
+        with self.assertRaises(Wallet.DoesNotExist):
+            self.order_service._debit_wallet(other_user, Money.from_decimal('1.00'))
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_legacy_json_members_are_settled(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        legacy_order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('2'))
+        # Written before the compact codec and the running totals
+        self.mock_redis.zadd('pending_orders:ABAN', {json.dumps({'id': legacy_order.id, 'amount': '2.00000000'}): 1})
+
+        self.assertEqual(self.order_service.rebuild_pending_totals(), {'ABAN': 1})
+        order = self.create_order('ABAN', Decimal('1'))
+        self.order_service.settle_pending_orders('ABAN')
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('12'))
+        legacy_order.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(legacy_order.status, Order.COMPLETED)
+        self.assertEqual(order.status, Order.COMPLETED)
+
+    def test_rebuild_pending_totals_counts_every_member(self):
+        legacy_order = Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('2'))
+        self.mock_redis.zadd('pending_orders:ABAN', {json.dumps({'id': legacy_order.id, 'amount': '2.00000000'}): 1})
+        # A new order arriving first only counts itself
+        self.create_order('ABAN', Decimal('0.5'))
+        self.assertEqual(self.mock_redis.hget('pending_totals:ABAN', 'count'), '1')
+
+        self.order_service.rebuild_pending_totals()
+
+        self.assertEqual(self.mock_redis.hget('pending_totals:ABAN', 'amount'), str(Amount.from_decimal('2.5').units))
+        self.assertEqual(self.mock_redis.hget('pending_totals:ABAN', 'count'), '2')
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange')
+    @patch.object(OrderService, 'BATCH_ASSIGN_CHUNK_SIZE', 2)
+    def test_settlement_records_batch(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        orders = [self.create_order('ABAN', Decimal('0.5')) for _ in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.order_service.settle_pending_orders('ABAN')
+
+        # Bounded by the orders' creation times, so only their partitions are visited
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 4)
+        self.assertTrue(all('"created_at" BETWEEN' in sql for sql in updates))
+        batch = SettlementBatch.objects.get()
+        self.assertEqual(batch.coin_name, 'ABAN')
+        self.assertEqual(batch.amount, Decimal('2.5'))
+        self.assertEqual(batch.value, Decimal('10.00'))
+        self.assertEqual(batch.order_count, 5)
+        self.assertEqual(batch.status, SettlementBatch.COMPLETED)
+        self.assertIsNotNone(batch.settled_at)
+        self.assertEqual(
+            set(batch.orders.values_list('id', flat=True)), {order.id for order in orders}
+        )
+        self.assertEqual(set(batch.orders.values_list('status', flat=True)), {Order.COMPLETED})
+
+    @patch.object(CoinPriceService, 'get_coin_price')
+    @patch.object(OrderService, '_buy_from_exchange', side_effect=Exception("Exchange error"))
+    def test_failed_settlement_fails_batch(self, mock_buy_from_exchange, mock_get_coin_price):
+        mock_get_coin_price.return_value = Decimal('4.00')
+        order = self.create_order('ABAN', Decimal('3'))
+
+        with self.assertRaises(Exception):
+            self.order_service.settle_pending_orders('ABAN')
+
+        batch = SettlementBatch.objects.get()
+        order.refresh_from_db()
+        self.assertEqual(batch.status, SettlementBatch.FAILED)
+        self.assertEqual(order.batch, batch)
+        self.assertEqual(order.status, Order.FAILED)
+
+    def test_finishing_batch_is_one_update_per_table(self):
+        batch = SettlementBatch.objects.create(
+            coin_name='ABAN', amount=Decimal('1'), value=Decimal('4'), order_count=1, exchange_reference='ref'
+        )
+        Order.objects.create(user=self.user, coin_name='ABAN', amount=Decimal('1'), batch=batch)
+
+        with self.assertNumQueries(5):
+            # Savepoint, order update, batch update, order owners for the event streams, release
+            self.order_service._finish_settlement_batch(batch, SettlementBatch.COMPLETED)
@@ -0,0 +1,110 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from abantether.orders.models import (
+    Order, ReconciliationDiscrepancy, SettlementBatch, Wallet, WalletBalanceSnapshot, WalletLedgerEntry,
+)
+from abantether.orders.reconciliation import WalletReconciler
+
+User = get_user_model()
+
+
+class ReconciliationTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', password='12345') for i in range(3)]
+        for user in self.users:
+            Wallet.objects.create(user=user, balance=Decimal('100.00'))
+        self.reconciler = WalletReconciler(batch_size=2)
+
+    def debit(self, user, status):
+        order = Order.objects.create(user=user, coin_name='ABAN', amount=Decimal('1'), status=status)
+        WalletLedgerEntry.objects.create(user=user, kind=WalletLedgerEntry.DEBIT, amount=Decimal('-4.00'), order=order)
+        Wallet.objects.filter(user=user).update(balance=Decimal('96.00'))
+
+    def found(self, run):
+        return set(run.discrepancies.values_list('user_id', 'kind', 'expected', 'actual'))
+
+    def test_consistent_wallets(self):
+        self.debit(self.users[0], Order.COMPLETED)
+
+        run = self.reconciler.run()
+
+        self.assertFalse(run.incremental)
+        self.assertEqual(run.users_checked, 3)
+        self.assertEqual(run.discrepancy_count, 0)
+        self.assertIsNotNone(run.finished_at)
+
+    def test_balance_mismatch(self):
+        Wallet.objects.filter(user=self.users[1]).update(balance=Decimal('90.00'))
+
+        run = self.reconciler.run()
+
+        self.assertEqual(self.found(run), {
+            (self.users[1].pk, ReconciliationDiscrepancy.BALANCE_MISMATCH, Decimal('100.00'), Decimal('90.00')),
+        })
+
+    def test_balances_from_snapshots(self):
+        # Wallets that predate the ledger only have a snapshot of their opening balance
+        WalletLedgerEntry.objects.filter(user=self.users[0]).delete()
+        WalletBalanceSnapshot.objects.create(user=self.users[0], balance=Decimal('100.00'), last_entry_id=0)
+        self.debit(self.users[0], Order.COMPLETED)
+        # Compaction snapshots the second user's ledger; only later entries add to it
+        WalletBalanceSnapshot.objects.create(
+            user=self.users[1], balance=Decimal('100.00'),
+            last_entry_id=WalletLedgerEntry.objects.filter(user=self.users[1]).get().id,
+        )
+        WalletLedgerEntry.objects.create(user=self.users[1], kind=WalletLedgerEntry.CREDIT, amount=Decimal('5.00'))
+
+        run = self.reconciler.run()
+
+        self.assertEqual(self.found(run), {
+            (self.users[1].pk, ReconciliationDiscrepancy.BALANCE_MISMATCH, Decimal('105.00'), Decimal('100.00')),
+        })
+
+    def test_unrefunded_failures(self):
+        self.debit(self.users[2], Order.FAILED)
+
+        run = self.reconciler.run()
+
+        self.assertEqual(self.found(run), {
+            (self.users[2].pk, ReconciliationDiscrepancy.UNREFUNDED_FAILURES, Decimal('4.00'), Decimal('0.00')),
+        })
+
+        WalletLedgerEntry.objects.create(user=self.users[2], kind=WalletLedgerEntry.REFUND, amount=Decimal('4.00'))
+        Wallet.objects.filter(user=self.users[2]).update(balance=Decimal('100.00'))
+        self.assertEqual(self.reconciler.run().discrepancy_count, 0)
+
+    def test_incremental_run_checks_active_users(self):
+        # Nothing is in flight in the test, so the checkpoint needs no lag
+        self.reconciler.CHECKPOINT_LAG = timedelta(0)
+        self.reconciler.run()
+        WalletLedgerEntry.objects.create(user=self.users[1], kind=WalletLedgerEntry.CREDIT, amount=Decimal('5.00'))
+
+        run = self.reconciler.run()
+
+        self.assertTrue(run.incremental)
+        self.assertEqual(run.users_checked, 1)
+        self.assertEqual(self.found(run), {
+            (self.users[1].pk, ReconciliationDiscrepancy.BALANCE_MISMATCH, Decimal('105.00'), Decimal('100.00')),
+        })
+        # Reported users are rechecked until they reconcile
+        self.assertEqual(self.reconciler.run().users_checked, 1)
+
+    def test_incremental_run_checks_failed_batches(self):
+        self.reconciler.CHECKPOINT_LAG = timedelta(0)
+        self.debit(self.users[2], Order.PENDING)
+        self.reconciler.run()
+        batch = SettlementBatch.objects.create(
+            coin_name='ABAN', amount=Decimal('1'), value=Decimal('4.00'), order_count=1, exchange_reference='ref',
+            status=SettlementBatch.FAILED, settled_at=timezone.now(),
+        )
+        Order.objects.filter(user=self.users[2]).update(batch=batch, status=Order.FAILED)
+
+        run = self.reconciler.run()
+
+        self.assertEqual(run.users_checked, 1)
+        self.assertEqual(self.found(run), {
+            (self.users[2].pk, ReconciliationDiscrepancy.UNREFUNDED_FAILURES, Decimal('4.00'), Decimal('0.00')),
+        })
@@ -0,0 +1,146 @@
+from django.test import SimpleTestCase
+from unittest import skipUnless
+from abantether.orders.memory_redis import SCRIPT_EMULATIONS, InMemoryRedis
+from abantether.orders.prices import RELEASE_LOCK_SCRIPT
+from abantether.orders.services import CLAIM_BATCH_SCRIPT, STORE_WALLET_BALANCE_SCRIPT
+from abantether.orders.settlement import RELEASE_LEASES_SCRIPT, RENEW_LEASES_SCRIPT
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401
+except ImportError:
+    fakeredis = None
+
+CLAIM_KEYS = ['pending_orders:ABAN', 'pending_totals:ABAN', 'batch:ABAN', 'batch_totals:ABAN', 'deadlines:0']
+
+
+@skipUnless(fakeredis, "Needs fakeredis[lua] to run the Lua scripts")
+class RedisScriptsTestCase(SimpleTestCase):
+    """Run the real Lua scripts and check that InMemoryRedis emulates them"""
+
+    def setUp(self):
+        self.clients = [fakeredis.FakeRedis(decode_responses=True), InMemoryRedis()]
+
+    def run_script(self, script, keys, args):
+        """Run the script on every client; returns the results, which must all agree"""
+        results = [client.register_script(script)(keys=keys, args=args) for client in self.clients]
+        lua, emulated = results
+        self.assertEqual(self.normalize(emulated), self.normalize(lua))
+        return lua
+
+    def normalize(self, result):
+        # Redis and Python print scores differently, e.g. "100" and "100.0"
+        if isinstance(result, list):
+            return [self.normalize(item) for item in result]
+        try:
+            return float(result)
+        except (TypeError, ValueError):
+            return result
+
+    def each(self, command, *args, **kwargs):
+        return [getattr(client, command)(*args, **kwargs) for client in self.clients]
+
+    def add_pending(self, orders, amount):
+        for client in self.clients:
+            client.zadd(CLAIM_KEYS[0], orders)
+            client.hincrby(CLAIM_KEYS[1], 'amount', amount)
+            client.hincrby(CLAIM_KEYS[1], 'count', len(orders))
+
+    def claim(self, min_units=100, max_orders=10, now=1000.0, max_age=300):
+        return self.run_script(CLAIM_BATCH_SCRIPT, CLAIM_KEYS, [min_units, max_orders, now, max_age, 'ABAN'])
+
+    def test_claim_nothing_pending_drops_deadline(self):
+        self.each('zadd', CLAIM_KEYS[4], {'ABAN': 500})
+
+        self.assertIsNone(self.claim())
+
+        for deadline in self.each('zscore', CLAIM_KEYS[4], 'ABAN'):
+            self.assertIsNone(deadline)
+
+    def test_claim_below_limits_sets_deadline(self):
+        self.add_pending({'1:50': 900.5}, 50)
+
+        self.assertIsNone(self.claim())
+
+        for deadline in self.each('zscore', CLAIM_KEYS[4], 'ABAN'):
+            self.assertEqual(deadline, 1200.5)
+        for pending in self.each('zrange', CLAIM_KEYS[0], 0, -1):
+            self.assertEqual(pending, ['1:50'])
+
+    def test_claim_by_amount(self):
+        self.add_pending({'1:60': 100, '2:40': 150.25}, 100)
+        self.each('zadd', CLAIM_KEYS[4], {'ABAN': 400})
+
+        amount, members = self.claim()
+
+        self.assertEqual(amount, '100')
+        self.assertEqual(self.normalize(members), ['1:60', 100.0, '2:40', 150.25])
+        for pending, batch, totals, deadline in zip(
+            self.each('zrange', CLAIM_KEYS[0], 0, -1), self.each('zrange', CLAIM_KEYS[2], 0, -1),
+            self.each('hget', CLAIM_KEYS[3], 'count'), self.each('zscore', CLAIM_KEYS[4], 'ABAN'),
+        ):
+            self.assertEqual(pending, [])
+            self.assertEqual(batch, ['1:60', '2:40'])
+            self.assertEqual(totals, '2')
+            self.assertIsNone(deadline)
+
+    def test_claim_by_count(self):
+        self.add_pending({'1:1': 900, '2:1': 901}, 2)
+
+        amount, members = self.claim(max_orders=2)
+
+        self.assertEqual(amount, '2')
+        self.assertEqual(members[0::2], ['1:1', '2:1'])
+
+    def test_claim_by_age(self):
+        self.add_pending({'1:1': 600}, 1)
+
+        amount, members = self.claim(now=900.0)
+
+        self.assertEqual(members[0::2], ['1:1'])
+
+    def test_renew_leases_only_renews_own(self):
+        self.each('set', 'lease:0', 'me')
+        self.each('set', 'lease:1', 'other')
+
+        renewed = self.run_script(RENEW_LEASES_SCRIPT, ['lease:0', 'lease:1', 'lease:2'], ['me', 5000])
+
+        self.assertEqual(renewed, [1, 0, 0])
+        self.assertGreater(self.clients[0].pttl('lease:0'), 0)
+        self.assertEqual(self.clients[0].pttl('lease:1'), -1)
+
+    def test_release_leases_only_releases_own(self):
+        self.each('set', 'lease:0', 'me')
+        self.each('set', 'lease:1', 'other')
+
+        self.assertEqual(self.run_script(RELEASE_LEASES_SCRIPT, ['lease:0', 'lease:1'], ['me']), 1)
+
+        self.assertEqual(self.each('get', 'lease:0'), [None, None])
+        self.assertEqual(self.each('get', 'lease:1'), ['other', 'other'])
+
+    def test_release_lock_checks_token(self):
+        self.each('set', 'lock', 'other')
+
+        self.assertEqual(self.run_script(RELEASE_LOCK_SCRIPT, ['lock'], ['mine']), 0)
+        self.assertEqual(self.run_script(RELEASE_LOCK_SCRIPT, ['lock'], ['other']), 1)
+
+        self.assertEqual(self.each('get', 'lock'), [None, None])
+
+    def test_store_wallet_balance_checks_version(self):
+        keys = ['wallet_balance:1', 'wallet_version:1']
+        self.each('incr', keys[1])
+
+        self.assertEqual(self.run_script(STORE_WALLET_BALANCE_SCRIPT, keys, ['{"balance": "1"}', 0, 60000]), 0)
+        self.assertEqual(self.run_script(STORE_WALLET_BALANCE_SCRIPT, keys, ['{"balance": "2"}', 1, 60000]), 1)
+
+        self.assertEqual(self.each('get', keys[0]), ['{"balance": "2"}', '{"balance": "2"}'])
+        self.assertGreater(self.clients[0].pttl(keys[0]), 0)
+
+    def test_every_script_is_emulated(self):
+        self.assertEqual(
+            set(SCRIPT_EMULATIONS),
+            {
+                CLAIM_BATCH_SCRIPT, STORE_WALLET_BALANCE_SCRIPT, RENEW_LEASES_SCRIPT, RELEASE_LEASES_SCRIPT,
+                RELEASE_LOCK_SCRIPT,
+            },
+        )
@@ -0,0 +1,214 @@
+from django.conf import settings
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.test import override_settings
+from abantether.orders.amounts import Amount
+from abantether.orders.flush import FlushPolicy
+from abantether.orders.models import Order, SettlementBatch, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService
+from abantether.orders.partitions import HashRing
+from abantether.orders.settlement import SettlementWorker
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+class SettlementWorkerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        self.order_service = OrderService()
+        self.mock_redis = InMemoryRedis()
+        self.order_service.redis_client = self.mock_redis
+        self.order_service.coin_price_service.redis_client = self.mock_redis
+        self.worker = SettlementWorker(order_service=self.order_service, consumer_name='test')
+        # The only live worker owns every partition
+        self.worker.rebalance()
+
+    def create_order(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.order_service.create_order(self.user, 'ABAN', amount)
+
+    def test_no_event_below_threshold(self, mock_get_coin_price):
+        self.create_order(Decimal('1'))
+
+        self.assertEqual(self.worker.run_once(), 0)
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_events_for_same_coin_settle_once(self, mock_buy_from_exchange, mock_get_coin_price):
+        orders = [self.create_order(Decimal('3')) for _ in range(3)]
+
+        self.assertEqual(self.worker.run_once(), 3)
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('36'))
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(self.worker.run_once(pending=True), 0)
+
+    @patch.object(OrderService, '_buy_from_exchange', side_effect=Exception("Exchange error"))
+    def test_failed_settlement_is_acked(self, mock_buy_from_exchange, mock_get_coin_price):
+        order = self.create_order(Decimal('3'))
+
+        with self.assertLogs('abantether.orders.settlement', level='ERROR'):
+            self.assertEqual(self.worker.run_once(), 1)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.FAILED)
+        self.assertEqual(self.worker.run_once(pending=True), 0)
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_unacked_events_are_replayed(self, mock_buy_from_exchange, mock_get_coin_price):
+        self.create_order(Decimal('3'))
+        # Simulate a crash between settling and acknowledging the event
+        with patch.object(self.mock_redis, 'xack'):
+            self.worker.run_once()
+
+        self.assertEqual(self.worker.run_once(pending=True), 1)
+        self.assertEqual(self.worker.run_once(pending=True), 0)
+        mock_buy_from_exchange.assert_called_once()
+
+    def test_partitions_are_split_between_workers(self, mock_get_coin_price):
+        other = SettlementWorker(order_service=self.order_service, consumer_name='other')
+        other.rebalance()
+        # The first worker releases the partitions the ring moved, then the other takes them
+        self.worker.rebalance()
+        other.rebalance()
+
+        self.assertTrue(self.worker.owned)
+        self.assertTrue(other.owned)
+        self.assertFalse(self.worker.owned & other.owned)
+        self.assertEqual(self.worker.owned | other.owned, set(range(self.worker.partitions)))
+
+    def test_dead_worker_partitions_are_reassigned(self, mock_get_coin_price):
+        other = SettlementWorker(order_service=self.order_service, consumer_name='other')
+        other.rebalance()
+        self.worker.rebalance()
+        other.rebalance()
+
+        # The other worker dies: its heartbeat and leases expire
+        self.mock_redis.zrem(SettlementWorker.WORKERS_KEY, 'other')
+        self.mock_redis.delete(*[SettlementWorker.LEASE_KEY.format(p) for p in other.owned])
+        self.worker.rebalance()
+
+        self.assertEqual(self.worker.owned, set(range(self.worker.partitions)))
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_worker_only_reads_owned_partitions(self, mock_buy_from_exchange, mock_get_coin_price):
+        self.create_order(Decimal('3'))
+        self.worker._release(set(self.worker.owned))
+
+        self.assertEqual(self.worker.run_once(pending=True), 0)
+        mock_buy_from_exchange.assert_not_called()
+
+    def test_hash_ring_moves_few_keys(self, mock_get_coin_price):
+        keys = [str(i) for i in range(1000)]
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+
+        moved = [key for key in keys if before.owner(key) != after.owner(key)]
+
+        self.assertTrue(all(after.owner(key) == 'd' for key in moved))
+        self.assertLess(len(moved), 400)
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_young_batch_below_threshold_waits(self, mock_buy_from_exchange, mock_get_coin_price):
+        self.create_order(Decimal('1'))
+
+        self.assertEqual(self.worker.flush_due(), 0)
+        mock_buy_from_exchange.assert_not_called()
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_old_batch_is_flushed_by_age(self, mock_buy_from_exchange, mock_get_coin_price):
+        with override_settings(SETTLEMENT_FLUSH_POLICIES={'ABAN': {'max_age': 0}}):
+            order = self.create_order(Decimal('1'))
+
+            self.assertEqual(self.worker.run_once(), 0)
+            self.assertEqual(self.worker.flush_due(), 1)
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('4'))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(self.worker.flush_due(), 0)
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_batch_is_flushed_by_count(self, mock_buy_from_exchange, mock_get_coin_price):
+        with override_settings(SETTLEMENT_FLUSH_POLICIES={'ABAN': {'max_orders': 2}}):
+            self.create_order(Decimal('1'))
+            self.assertEqual(self.worker.run_once(), 0)
+            self.create_order(Decimal('1'))
+            self.assertEqual(self.worker.run_once(), 1)
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('8'))
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_longer_max_age_moves_deadline(self, mock_buy_from_exchange, mock_get_coin_price):
+        with override_settings(SETTLEMENT_FLUSH_POLICIES={'ABAN': {'max_age': 0}}):
+            self.create_order(Decimal('1'))
+        # The deadline was written under the old policy; the claim pushes it back
+        self.assertEqual(self.worker.flush_due(), 1)
+        self.assertEqual(self.worker.flush_due(), 0)
+        mock_buy_from_exchange.assert_not_called()
+
+    @patch.object(OrderService, '_buy_from_exchange')
+    def test_lost_orders_are_requeued(self, mock_buy_from_exchange, mock_get_coin_price):
+        # The debit commits but the enqueue fails; the request itself succeeds
+        with patch.object(OrderService, '_add_pending_orders_to_redis', side_effect=ConnectionError):
+            with self.assertLogs(level='ERROR'):
+                order = self.create_order(Decimal('1'))
+        self.assertEqual(self.worker.sweep(), 0)
+
+        Order.objects.filter(pk=order.pk).update(
+            created_at=timezone.now() - timedelta(seconds=settings.SETTLEMENT_SWEEP_AGE + 1)
+        )
+        self.assertEqual(self.worker.sweep(), 1)
+        # Back in its pending set, and already due
+        self.assertEqual(self.worker.sweep(), 0)
+        self.assertEqual(self.worker.flush_due(), 1)
+
+        mock_buy_from_exchange.assert_called_once_with('ABAN', Decimal('4'))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+
+    def test_stale_pending_batches_are_failed(self, mock_get_coin_price):
+        order = self.create_order(Decimal('1'))
+        # The worker recorded the batch and died before the exchange answered
+        batch = self.worker.order_service._create_settlement_batch(
+            'ABAN', 'ref', Amount.from_decimal(Decimal('1')), Decimal('4'), [order.id]
+        )
+        self.assertEqual(self.worker.sweep(), 0)
+
+        SettlementBatch.objects.filter(pk=batch.pk).update(
+            created_at=timezone.now() - timedelta(seconds=settings.SETTLEMENT_SWEEP_AGE + 1)
+        )
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(self.worker.sweep(), 1)
+        self.assertEqual(self.worker.sweep(), 0)
+
+        batch.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(batch.status, SettlementBatch.FAILED)
+        self.assertIsNotNone(batch.settled_at)
+        self.assertEqual(order.status, Order.FAILED)
+
+        # The original worker comes back too late and cannot overwrite the outcome
+        with self.assertLogs(level='ERROR'):
+            self.worker.order_service._finish_settlement_batch(batch, SettlementBatch.COMPLETED)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, SettlementBatch.FAILED)
+
+    def test_flush_policy_overrides(self, mock_get_coin_price):
+        with override_settings(SETTLEMENT_FLUSH_POLICIES={'ABAN': {'min_value': '50', 'max_orders': 3}}):
+            policy = FlushPolicy.for_coin('ABAN', min_value=Decimal('10'))
+            default = FlushPolicy.for_coin('TET', min_value=Decimal('10'))
+
+        self.assertEqual(policy.min_value, Decimal('50'))
+        self.assertEqual(policy.max_orders, 3)
+        self.assertEqual(default.min_value, Decimal('10'))
+        self.assertEqual(default.max_orders, settings.SETTLEMENT_FLUSH_MAX_ORDERS)
@@ -0,0 +1,93 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from unittest.mock import patch
+from rest_framework.test import APIClient
+from abantether.orders.models import Order, Wallet
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService, WalletBalanceCache
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+class WalletBalanceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        self.mock_redis = InMemoryRedis()
+        patcher = patch('abantether.orders.services.get_redis_client', return_value=self.mock_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_wallet(self):
+        return self.client.get('/api/wallet/')
+
+    def place_order(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {'coin_name': 'ABAN', 'amount': amount}, format='json')
+
+    def test_returns_balance_and_reserved(self, mock_get_coin_price):
+        self.place_order('1')
+
+        response = self.get_wallet()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'balance': '96.00', 'reserved': '4.00', 'version': 1})
+
+    def test_settled_orders_are_not_reserved(self, mock_get_coin_price):
+        self.place_order('1')
+        Order.objects.update(status=Order.COMPLETED)
+
+        self.assertEqual(self.get_wallet().data['reserved'], '0.00')
+
+    def test_served_from_cache(self, mock_get_coin_price):
+        self.get_wallet()
+
+        with patch.object(WalletBalanceCache, '_load') as load:
+            response = self.get_wallet()
+        load.assert_not_called()
+        self.assertEqual(response.data['balance'], '100.00')
+
+    def test_reader_sees_own_debit(self, mock_get_coin_price):
+        self.assertEqual(self.get_wallet().data['balance'], '100.00')
+
+        self.place_order('1')
+
+        response = self.get_wallet()
+        self.assertEqual(response.data['balance'], '96.00')
+        self.assertEqual(response.data['version'], 1)
+
+    def test_stale_read_is_not_cached(self, mock_get_coin_price):
+        # A read that loaded the balance before a debit committed must not be stored
+        cache = WalletBalanceCache(self.mock_redis)
+        load = WalletBalanceCache._load
+
+        def load_then_debit(user, version):
+            balance = load(user, version)
+            cache.invalidate(user.pk)
+            return balance
+
+        with patch.object(WalletBalanceCache, '_load', side_effect=load_then_debit):
+            cache.get(self.user)
+
+        self.assertIsNone(self.mock_redis.get(cache.BALANCE_KEY.format(self.user.pk)))
+
+    def test_bulk_orders_invalidate(self, mock_get_coin_price):
+        self.get_wallet()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderService().create_orders(self.user, [
+                {'coin_name': 'ABAN', 'amount': Decimal('1')},
+                {'coin_name': 'ABAN', 'amount': Decimal('2')},
+            ])
+
+        self.assertEqual(self.get_wallet().data, {'balance': '88.00', 'reserved': '12.00', 'version': 1})
+
+    def test_no_wallet(self, mock_get_coin_price):
+        Wallet.objects.all().delete()
+
+        self.assertEqual(self.get_wallet().status_code, 404)
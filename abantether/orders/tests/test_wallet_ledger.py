@@ -0,0 +1,88 @@
+from django.test import RequestFactory, TestCase
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from decimal import Decimal
+from datetime import timedelta
+from unittest.mock import patch
+from abantether.orders.models import Wallet, WalletBalanceSnapshot, WalletLedgerEntry
+from abantether.orders.prices import CoinPriceService
+from abantether.orders.services import OrderService, WalletLedgerService
+from abantether.orders.memory_redis import InMemoryRedis
+
+User = get_user_model()
+
+
+@patch.object(WalletLedgerService, 'COMPACTION_LAG', new=timedelta(0))
+class WalletLedgerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+        self.ledger_service = WalletLedgerService()
+        self.order_service = OrderService()
+        self.order_service.redis_client = InMemoryRedis()
+        self.order_service.coin_price_service.redis_client = self.order_service.redis_client
+
+    def test_opening_balance_is_credited(self):
+        entry = WalletLedgerEntry.objects.get(user=self.user)
+
+        self.assertEqual(entry.kind, WalletLedgerEntry.CREDIT)
+        self.assertEqual(entry.amount, Decimal('100.00'))
+
+    @patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+    def test_order_debit_is_recorded(self, mock_get_coin_price):
+        order = self.order_service.create_order(self.user, 'ABAN', Decimal('1.5'))
+
+        entry = WalletLedgerEntry.objects.get(user=self.user, kind=WalletLedgerEntry.DEBIT)
+        self.assertEqual(entry.amount, Decimal('-6.00'))
+        self.assertEqual(entry.order, order)
+        self.assertEqual(self.ledger_service.get_balance(self.user), Decimal('94.00'))
+
+    @patch.object(CoinPriceService, 'get_coin_price', return_value=Decimal('4.00'))
+    def test_balance_from_snapshot_and_later_entries(self, mock_get_coin_price):
+        self.order_service.create_order(self.user, 'ABAN', Decimal('1'))
+        self.assertEqual(self.ledger_service.compact(), 1)
+        self.order_service.create_order(self.user, 'ABAN', Decimal('2'))
+
+        snapshot = WalletBalanceSnapshot.objects.get(user=self.user)
+        self.assertEqual(snapshot.balance, Decimal('96.00'))
+        self.assertEqual(self.ledger_service.get_balance(self.user), Decimal('88.00'))
+        self.assertEqual(self.ledger_service.get_balance(self.user), Wallet.objects.get(user=self.user).balance)
+
+        with self.assertNumQueries(2):
+            self.ledger_service.get_balance(self.user)
+
+    def test_compact_only_touches_wallets_with_new_entries(self):
+        other_user = User.objects.create_user(username='other', password='12345')
+        Wallet.objects.create(user=other_user, balance=Decimal('50.00'))
+        self.assertEqual(self.ledger_service.compact(), 2)
+
+        self.ledger_service.record([
+            WalletLedgerEntry(user=other_user, kind=WalletLedgerEntry.REFUND, amount=Decimal('5.00')),
+        ])
+
+        self.assertEqual(self.ledger_service.compact(), 1)
+        self.assertEqual(self.ledger_service.compact(), 0)
+        self.assertEqual(self.ledger_service.get_balance(other_user), Decimal('55.00'))
+        self.assertEqual(self.ledger_service.get_balance(self.user), Decimal('100.00'))
+
+    @patch('abantether.orders.admin.get_redis_client')
+    def test_admin_balance_edit_keeps_concurrent_debits(self, get_redis_client):
+        get_redis_client.return_value = InMemoryRedis()
+        wallet_admin = site._registry[Wallet]
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser(username='admin', password='12345')
+        form_class = wallet_admin.get_form(request, self.wallet, change=True)
+        # Loaded at 100.00, then a 6.00 debit lands before the edit to 150.00 is saved
+        form = form_class({'user': self.user.pk, 'balance': '150.00'}, instance=self.wallet)
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=F('balance') - Decimal('6.00'))
+        self.assertTrue(form.is_valid(), form.errors)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            wallet_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('144.00'))
+        credit = WalletLedgerEntry.objects.filter(user=self.user, kind=WalletLedgerEntry.CREDIT).latest('id')
+        self.assertEqual(credit.amount, Decimal('50.00'))
+        self.assertEqual(get_redis_client.return_value.get(f'wallet_version:{self.user.pk}'), '1')
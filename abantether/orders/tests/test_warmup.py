@@ -0,0 +1,44 @@
+import gc
+import time
+from django.db import connection
+from django.test import TestCase
+from unittest.mock import patch
+from abantether.orders.memory_redis import InMemoryRedis
+from abantether.orders.warmup import memory_usage, warm_up_master, warm_up_worker
+
+
+class WarmupTestCase(TestCase):
+    def test_master_freezes_gc(self):
+        self.addCleanup(gc.unfreeze)
+
+        with patch('abantether.orders.warmup.connections.close_all') as close_all:
+            warm_up_master()
+
+        close_all.assert_called_once()
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    @patch('abantether.orders.warmup.get_redis_client')
+    def test_worker_connects_and_reports(self, get_redis_client):
+        get_redis_client.return_value = InMemoryRedis()
+
+        report = warm_up_worker(time.monotonic(), preloaded=False)
+
+        self.assertIsNotNone(connection.connection)
+        self.assertGreaterEqual(report['startup_seconds'], 0)
+        self.assertGreater(report['rss'], 0)
+
+    @patch('abantether.orders.warmup.get_redis_client')
+    def test_asgi_worker_leaves_database_alone(self, get_redis_client):
+        get_redis_client.return_value = InMemoryRedis()
+
+        with patch.object(connection, 'ensure_connection') as ensure_connection:
+            warm_up_worker(time.monotonic(), asgi=True)
+
+        ensure_connection.assert_not_called()
+
+    def test_memory_usage(self):
+        usage = memory_usage()
+
+        self.assertGreater(usage['rss'], 0)
+        if 'uss' in usage:
+            self.assertLessEqual(usage['uss'], usage['rss'])
@@ -0,0 +1,199 @@
+"""Order status updates for the order event stream, see AsyncOrderEventsView.
+
+Settlement appends every status change to a per-user Redis Stream, which is
+what clients resume from with Last-Event-ID, and announces it on CHANNEL.
+Each event loop holds a single pub/sub subscription for all of its
+subscribers and fans the updates out in memory, so an idle subscriber costs
+a queue and a suspended task rather than a Redis connection.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from typing import List, Optional, Tuple
+from django.conf import settings
+from .connections import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'order_updates:{}'
+CHANNEL = 'order_updates'
+
+
+def event_id_key(event_id: str) -> Tuple[int, int]:
+    """Sort key of a stream entry id ("<ms>-<seq>")"""
+    ms, _, seq = event_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+class OrderUpdateStream:
+    """Per-user history of order status changes"""
+    MAXLEN = 1000
+    READ_COUNT = 100
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def publish(self, updates: List[Tuple[int, int]], status: str) -> None:
+        """Record and announce that orders, given as (order id, user id), moved to status"""
+        if not updates:
+            return
+        users = {}
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for order_id, user_id in updates:
+                pipe.xadd(
+                    STREAM_KEY.format(user_id), {'order': order_id, 'status': status},
+                    maxlen=self.MAXLEN, approximate=True,
+                )
+                users.setdefault(user_id, []).append(order_id)
+            for user_id in users:
+                pipe.expire(STREAM_KEY.format(user_id), int(settings.ORDER_UPDATES_TTL))
+            event_ids = iter(pipe.execute()[:len(updates)])
+
+        # One message per user, however many of their orders the batch held
+        events = {user_id: [] for user_id in users}
+        for order_id, user_id in updates:
+            events[user_id].append([next(event_ids), order_id, status])
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for user_id, user_events in events.items():
+                pipe.publish(CHANNEL, json.dumps({'user': user_id, 'events': user_events}))
+            pipe.execute()
+
+    async def last_event_id(self, user_id: int) -> str:
+        last = await self.redis_client.xrevrange(STREAM_KEY.format(user_id), count=1)
+        return last[0][0] if last else '0-0'
+
+    async def read(self, user_id: int, after: str) -> List[list]:
+        """Events of the user after the given event id, oldest first"""
+        events = []
+        while True:
+            entries = await self.redis_client.xrange(
+                STREAM_KEY.format(user_id), min=f'({after}', max='+', count=self.READ_COUNT,
+            )
+            events += [[entry_id, int(fields['order']), fields['status']] for entry_id, fields in entries]
+            if len(entries) < self.READ_COUNT:
+                return events
+            after = entries[-1][0]
+
+
+class OrderUpdateHub:
+    """Fan out published order updates to the subscribers of one event loop.
+
+    Subscribers get lists of [event id, order id, status]. When the hub may
+    have missed updates, because its subscription was re-established or the
+    subscriber fell QUEUE_SIZE messages behind, the subscriber gets RESYNC
+    instead and re-reads its stream.
+    """
+    RESYNC = 'resync'
+    QUEUE_SIZE = 100
+    RECONNECT_DELAY = 1.0
+    # Reads wait this long at most; a read without its own timeout would fail
+    # after the pool's socket timeout on a quiet channel and force a resync
+    POLL_TIMEOUT = 1.0
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.subscribers = {}
+        self._listener = None
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(user_id, None)
+        # Give the pub/sub connection back once nobody is listening
+        if not self.subscribers and self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    # Anything published while we were not subscribed is only in the streams
+                    for queues in self.subscribers.values():
+                        for queue in queues:
+                            self._offer(queue, self.RESYNC)
+                    while True:
+                        message = await pubsub.get_message(timeout=self.POLL_TIMEOUT)
+                        if message is not None and message['type'] == 'message':
+                            self.dispatch(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Order update listener disconnected", exc_info=True)
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+    def dispatch(self, data: str) -> None:
+        message = json.loads(data)
+        for queue in self.subscribers.get(message['user'], ()):
+            self._offer(queue, message['events'])
+
+    def _offer(self, queue: asyncio.Queue, item) -> None:
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # A slow subscriber re-reads its stream instead of buffering without bound
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self.RESYNC)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_order_update_hub() -> OrderUpdateHub:
+    """Hub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = OrderUpdateHub(get_async_redis_client())
+    return hub
+
+
+async def order_events(user_id: int, last_event_id: Optional[str], heartbeat: float = None):
+    """Yield a user's order updates as Server-Sent Events.
+
+    With last_event_id the events after it are replayed first; otherwise only
+    updates from now on are sent. A comment is sent every heartbeat seconds
+    so proxies keep idle connections open.
+    """
+    heartbeat = heartbeat or settings.ORDER_EVENTS_HEARTBEAT
+    hub = get_order_update_hub()
+    stream = OrderUpdateStream(hub.redis_client)
+    # Subscribe before reading the stream, so nothing published in between is missed
+    queue = hub.subscribe(user_id)
+    try:
+        if last_event_id:
+            pending = OrderUpdateHub.RESYNC
+        else:
+            pending = None
+            last_event_id = await stream.last_event_id(user_id)
+        yield f"retry: {int(settings.ORDER_EVENTS_RETRY * 1000)}\n\n"
+        while True:
+            if pending is None:
+                try:
+                    pending = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+            if pending == OrderUpdateHub.RESYNC:
+                pending = await stream.read(user_id, last_event_id)
+            for event_id, order_id, status in pending:
+                # Events can arrive both from the stream and the channel
+                if event_id_key(event_id) <= event_id_key(last_event_id):
+                    continue
+                last_event_id = event_id
+                data = json.dumps({'id': order_id, 'status': status})
+                yield f"id: {event_id}\nevent: order\ndata: {data}\n\n"
+            pending = None
+    finally:
+        hub.unsubscribe(user_id, queue)
@@ -0,0 +1,82 @@
+"""Warm-up for preloaded gunicorn workers, see config/gunicorn.py.
+
+With preload the master imports the app and calls ``warm_up_master`` before
+forking: the URLconf, and with it every view and serializer module, is
+imported and resolved once and shared by every worker copy-on-write, and ``gc.freeze`` keeps the collector from
+touching (and so copying) those pages in the workers. Each worker then calls
+``warm_up_worker`` to open its own connections before taking requests.
+
+Under ASGI, Django runs the sync code of each request on a thread of that
+request's own, so a database connection opened by the worker would never
+serve a request; ASGI workers only warm the process-wide Redis pool.
+"""
+import gc
+import resource
+import sys
+import time
+from django.db import connections
+from django.urls import get_resolver
+from . import metrics
+from .connections import get_redis_client
+
+
+def warm_up_app() -> None:
+    """Import the URLconf and build the URL resolvers"""
+    # Importing the URLconf imports every view and serializer module. Serializer
+    # fields are built per instance, so there is nothing of theirs to warm.
+    get_resolver().reverse_dict
+
+
+def warm_up_master() -> None:
+    warm_up_app()
+    # Nothing above may leave a connection behind to be shared by the workers
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+
+
+def warm_up_worker(started: float, preloaded: bool = True, asgi: bool = False) -> dict:
+    """Open this worker's connections and report its startup time and memory.
+
+    started is the time.monotonic() of the fork. Database connections are
+    per thread, so they are only opened for WSGI workers, where this thread
+    serves the requests.
+    """
+    if not preloaded:
+        warm_up_app()
+    if not asgi:
+        for alias in connections:
+            connections[alias].ensure_connection()
+    get_redis_client().ping()
+
+    report = {'startup_seconds': time.monotonic() - started, **memory_usage()}
+    metrics.WORKER_STARTUP_SECONDS.set(report['startup_seconds'])
+    for kind in ('rss', 'pss', 'uss'):
+        if kind in report:
+            metrics.WORKER_MEMORY_BYTES.labels(kind).set(report[kind])
+    return report
+
+
+def memory_usage() -> dict:
+    """Resident memory of this process in bytes.
+
+    uss counts the pages only this process uses and pss splits shared pages
+    between their users, so they show how much a worker really shares with
+    the master. Both need Linux; elsewhere only the peak rss is known.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line and line[0].isupper())
+    except OSError:
+        # ru_maxrss is in bytes on macOS and kB elsewhere
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': max_rss if sys.platform == 'darwin' else max_rss * 1024}
+
+    def kb(name):
+        return int(fields.get(name, '0 kB').split()[0]) * 1024
+
+    return {
+        'rss': kb('Rss'),
+        'pss': kb('Pss'),
+        'uss': kb('Private_Clean') + kb('Private_Dirty'),
+    }
@@ -1,8 +1,15 @@
 from django.conf import settings
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework.routers import SimpleRouter
 
+from abantether.orders.api.async_views import AsyncOrderDetailView
+from abantether.orders.api.async_views import AsyncOrderEventsView
+from abantether.orders.api.async_views import AsyncOrderExportView
+from abantether.orders.api.async_views import AsyncOrderListView
 from abantether.orders.api.views import OrderViewSet
+from abantether.orders.api.views import RedisPoolStatsView
+from abantether.orders.api.views import WalletView
 from abantether.users.api.views import UserViewSet
 
 router = DefaultRouter() if settings.DEBUG else SimpleRouter()
@@ -11,4 +18,15 @@ router.register("users", UserViewSet)
 router.register(r'orders', OrderViewSet, basename='order')
 
 app_name = "api"
-urlpatterns = router.urls
+urlpatterns = [
+    path("redis-pool/", RedisPoolStatsView.as_view(), name="redis-pool"),
+    path("wallet/", WalletView.as_view(), name="wallet"),
+    # Async versions of the order list, create and retrieve endpoints (serve with config.asgi)
+    path("async/orders/", AsyncOrderListView.as_view(), name="async-order-list"),
+    path("async/orders/<int:pk>/", AsyncOrderDetailView.as_view(), name="async-order-detail"),
+    # Order status changes as Server-Sent Events
+    path("async/orders/events/", AsyncOrderEventsView.as_view(), name="async-order-events"),
+    # Streamed CSV / JSON lines export of the order history; before the router's orders/<pk>/
+    path("orders/export/", AsyncOrderExportView.as_view(), name="order-export"),
+    *router.urls,
+]
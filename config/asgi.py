@@ -0,0 +1,24 @@
+# ruff: noqa
+"""
+ASGI config for AbanTether project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under an ASGI server the async order views (``/api/async/orders/``) wait on
+Postgres and Redis without holding a worker, while the sync views keep
+running in threads.
+
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+
+# This allows easy placement of apps within the interior
+# abantether directory.
+BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
+sys.path.append(str(BASE_DIR / "abantether"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+application = get_asgi_application()
@@ -0,0 +1,52 @@
+# ruff: noqa
+"""
+Gunicorn configuration for AbanTether.
+
+Used by compose/production/django/start via ``gunicorn -c config/gunicorn.py``.
+"""
+
+import os
+import time
+
+bind = "0.0.0.0:5000"
+chdir = "/app"
+# Serve config.asgi: each worker runs an event loop for the async views
+worker_class = "uvicorn_worker.UvicornWorker"
+# Load and warm up the app once in the master; workers share it copy-on-write.
+# Set GUNICORN_PRELOAD=false to load it in every worker instead (e.g. for --reload)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from abantether.orders.warmup import warm_up_master
+
+        warm_up_master()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    from abantether.orders.warmup import warm_up_worker
+
+    report = warm_up_worker(
+        worker.forked_at,
+        preloaded=worker.cfg.preload_app,
+        asgi="uvicorn" in worker.cfg.worker_class_str.lower(),
+    )
+    worker.log.info(
+        "Worker %s ready in %.3fs: rss %.1f MiB, pss %.1f MiB, uss %.1f MiB",
+        worker.pid,
+        report["startup_seconds"],
+        *(report.get(kind, 0) / 2**20 for kind in ("rss", "pss", "uss")),
+    )
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges from the shared Prometheus metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -56,6 +56,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+# https://docs.djangoproject.com/en/dev/ref/settings/#asgi-application
+ASGI_APPLICATION = "config.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -263,6 +265,13 @@ LOGGING = {
 }
 
 REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+# Per-process connection pool used by abantether.orders.connections
+REDIS_MAX_CONNECTIONS = env.int("REDIS_MAX_CONNECTIONS", default=20)
+# Seconds to wait for a free pooled connection before failing
+REDIS_POOL_TIMEOUT = env.float("REDIS_POOL_TIMEOUT", default=5)
+# Must stay above the settlement worker's blocking read (5s)
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", default=10)
+REDIS_HEALTH_CHECK_INTERVAL = env.int("REDIS_HEALTH_CHECK_INTERVAL", default=30)
 
 
 # django-allauth
@@ -309,6 +318,51 @@ SPECTACULAR_SETTINGS = {
 }
 # Your stuff...
 # ------------------------------------------------------------------------------
-REDIS_HOST = 'redis'
-REDIS_PORT = 6379
-REDIS_DB = 0
+# Coin prices, see abantether.orders.prices.CoinPriceService
+COIN_PRICE_PROVIDER = env(
+    "COIN_PRICE_PROVIDER",
+    default="abantether.orders.prices.StaticPriceProvider",
+)
+# Seconds a process may reuse a price when it is not receiving price ticks
+COIN_PRICE_LOCAL_TTL = env.float("COIN_PRICE_LOCAL_TTL", default=1.0)
+# Prices older than this many seconds are never served
+COIN_PRICE_MAX_STALENESS = env.float("COIN_PRICE_MAX_STALENESS", default=30.0)
+# Seconds a coin the provider has no price for is remembered as unknown
+COIN_PRICE_MISSING_TTL = env.float("COIN_PRICE_MISSING_TTL", default=5.0)
+# Subscribe each process to price ticks so its cache is invalidated on updates
+COIN_PRICE_TICK_LISTENER = env.bool("COIN_PRICE_TICK_LISTENER", default=True)
+# Bearer token Prometheus uses to scrape /metrics (staff users may always read it)
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+# Coins are spread over this many settlement streams, each owned by one worker
+SETTLEMENT_PARTITIONS = env.int("SETTLEMENT_PARTITIONS", default=64)
+# Seconds a settlement worker keeps its partitions without renewing its lease
+SETTLEMENT_LEASE_TTL = env.float("SETTLEMENT_LEASE_TTL", default=15.0)
+# A pending batch is flushed once its value reaches MIN_EXCHANGE_ORDER_VALUE, its
+# oldest order is SETTLEMENT_FLUSH_MAX_AGE seconds old or it holds
+# SETTLEMENT_FLUSH_MAX_ORDERS orders, whichever comes first
+SETTLEMENT_FLUSH_MAX_AGE = env.float("SETTLEMENT_FLUSH_MAX_AGE", default=300.0)
+SETTLEMENT_FLUSH_MAX_ORDERS = env.int("SETTLEMENT_FLUSH_MAX_ORDERS", default=5000)
+# Per-coin overrides, e.g. {"ABAN": {"min_value": "50.00", "max_age": 60, "max_orders": 1000}}
+SETTLEMENT_FLUSH_POLICIES = {}
+# Seconds between checks of the flush deadlines by each settlement worker
+SETTLEMENT_FLUSH_INTERVAL = env.float("SETTLEMENT_FLUSH_INTERVAL", default=1.0)
+# Pending orders older than this many seconds that are missing from Redis are
+# enqueued again, and settlement batches still pending are failed; keep it
+# above every coin's flush max_age and the exchange timeout
+SETTLEMENT_SWEEP_AGE = env.float("SETTLEMENT_SWEEP_AGE", default=600.0)
+# Seconds between sweeps for such orders by each settlement worker
+SETTLEMENT_SWEEP_INTERVAL = env.float("SETTLEMENT_SWEEP_INTERVAL", default=60.0)
+# Responses to order requests with an Idempotency-Key are replayed for this many seconds
+IDEMPOTENCY_KEY_TTL = env.float("IDEMPOTENCY_KEY_TTL", default=86400.0)
+# Seconds a retry waits for the in-flight request with the same key before giving up
+IDEMPOTENCY_WAIT_TIMEOUT = env.float("IDEMPOTENCY_WAIT_TIMEOUT", default=10.0)
+# Seconds a cached wallet balance is served; debits invalidate it right away
+WALLET_CACHE_TTL = env.float("WALLET_CACHE_TTL", default=30.0)
+# Seconds a user's order status updates are kept for clients resuming the event stream
+ORDER_UPDATES_TTL = env.float("ORDER_UPDATES_TTL", default=86400.0)
+# Seconds between keep-alive comments on idle order event streams
+ORDER_EVENTS_HEARTBEAT = env.float("ORDER_EVENTS_HEARTBEAT", default=15.0)
+# Seconds clients wait before reconnecting to a dropped order event stream
+ORDER_EVENTS_RETRY = env.float("ORDER_EVENTS_RETRY", default=3.0)
+# Monthly order partitions are created this many months ahead (PostgreSQL)
+ORDER_PARTITIONS_AHEAD = env.int("ORDER_PARTITIONS_AHEAD", default=3)
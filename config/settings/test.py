@@ -36,3 +36,5 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 MEDIA_URL = "http://media.testserver"
 # Your stuff...
 # ------------------------------------------------------------------------------
+# Tests drive price ticks explicitly instead of through a listener thread
+COIN_PRICE_TICK_LISTENER = False